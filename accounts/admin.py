@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.translation import gettext_lazy as _
 from .forms import UserCreationForm, UserChangeForm
-from .models import User
+from .models import User, BlacklistedToken
 
 
 class UserAdmin(UserAdmin):
@@ -29,5 +29,13 @@ class UserAdmin(UserAdmin):
     search_fields = ("email",)
     ordering = ("email",)
 
+class BlacklistedTokenAdmin(admin.ModelAdmin):
+    list_display = ("jti", "user", "rotated", "expires_at")
+    list_filter = ("rotated",)
+    search_fields = ("jti", "user__email",)
+    raw_id_fields = ("user",)
+    ordering = ("-created_at",)
+
 
 admin.site.register(User, UserAdmin)
+admin.site.register(BlacklistedToken, BlacklistedTokenAdmin)
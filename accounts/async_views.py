@@ -0,0 +1,176 @@
+"""
+Async variants of the authentication views, served instead of the DRF views
+of accounts.views when ASYNC_VIEWS is enabled and the project runs under an
+ASGI server. They give the same responses and cookies, and wait on the
+database and cache without holding a worker.
+"""
+import json
+from functools import wraps
+from django.conf import settings
+from django.contrib.auth import aauthenticate, get_user_model
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework.exceptions import APIException, NotAuthenticated, Throttled, ValidationError
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
+from .authentication import CustomJWTAuthentication, ais_user_revoked, get_csrf_token
+from .permissions import aget_group_names
+from .serializers import CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer, set_user_claims
+from .throttling import LoginRateThrottle
+from .tokens import averify_refresh_token, ablacklist_token
+from .views import set_auth_cookie, set_csrf_cookie
+
+
+User = get_user_model()
+
+def get_data(request):
+    "Returns the JSON or form data of a request, as DRF's parsers would."
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            raise ValidationError({'detail': 'JSON parse error.'})
+    return request.POST
+
+def error_response(detail, status):
+    response = JsonResponse({'detail': str(detail)}, status=status)
+    if status == 401:
+        response['WWW-Authenticate'] = CustomJWTAuthentication().authenticate_header(None)
+    return response
+
+def invalid_token_response(exc):
+    # As rest_framework_simplejwt.exceptions.InvalidToken
+    return JsonResponse(
+        {'detail': str(exc.args[0]), 'code': 'token_not_valid'},
+        status=401,
+    )
+
+def check_throttle(request, throttle):
+    "Raises Throttled when `throttle` refuses the request, as APIView.check_throttles()."
+    if not throttle.allow_request(request, None):
+        raise Throttled(throttle.wait())
+
+async def authenticate(request):
+    "Returns the user of a request authenticated with CustomJWTAuthentication, or None."
+    result = await CustomJWTAuthentication().aauthenticate(request)
+    return result[0] if result is not None else None
+
+def api_view(view):
+    """
+    Exempts an async view from CSRF checks, as DRF views are, and answers
+    DRF's exceptions as its views do.
+    """
+    @csrf_exempt
+    @require_POST
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except ValidationError as exc:
+            return JsonResponse(exc.detail, status=400, safe=False)
+        except APIException as exc:
+            # As rest_framework.views.exception_handler
+            response = error_response(exc.detail, exc.status_code)
+            if getattr(exc, 'wait', None):
+                response['Retry-After'] = '%d' % exc.wait
+            return response
+    return wrapper
+
+
+@api_view
+async def login(request):
+    "See CustomTokenObtainPairView."
+    check_throttle(request, LoginRateThrottle())
+    serializer = CustomTokenObtainPairSerializer()
+    # Field validation only, the credentials are checked below
+    credentials = serializer.to_internal_value(get_data(request))
+    user = await aauthenticate(request, **credentials)
+    if not api_settings.USER_AUTHENTICATION_RULE(user):
+        return error_response(serializer.error_messages['no_active_account'], 401)
+
+    # Loaded ahead, as get_token() reads them
+    await aget_group_names(user)
+    refresh = serializer.get_token(user)
+    if api_settings.UPDATE_LAST_LOGIN:
+        await User._default_manager.filter(pk=user.pk).aupdate(last_login=timezone.now())
+
+    access_token = str(refresh.access_token)
+    csrf_token = get_csrf_token(request, rotate=True)
+    response = JsonResponse({'access': access_token, 'csrf_token': csrf_token})
+    set_auth_cookie(response, 'access', access_token, settings.AUTH_COOKIE_ACCESS_MAX_AGE)
+    set_auth_cookie(response, 'refresh', str(refresh), settings.AUTH_COOKIE_REFRESH_MAX_AGE)
+    set_csrf_cookie(response, csrf_token)
+    return response
+
+
+@api_view
+async def refresh(request):
+    "See CustomTokenRefreshView and CustomTokenRefreshSerializer."
+    raw_token = request.COOKIES.get('refresh') or get_data(request).get('refresh')
+    if not raw_token:
+        raise ValidationError({'refresh': ['This field is required.']})
+
+    try:
+        refresh = await averify_refresh_token(raw_token)
+        user_id = refresh.get(api_settings.USER_ID_CLAIM)
+        if await ais_user_revoked(user_id):
+            raise TokenError(_("Token is blacklisted"))
+        user = await User._default_manager.filter(**{api_settings.USER_ID_FIELD: user_id}).afirst()
+        if not api_settings.USER_AUTHENTICATION_RULE(user):
+            return error_response(CustomTokenRefreshSerializer().error_messages['no_active_account'], 401)
+        # Loaded ahead, as set_user_claims() reads them
+        await aget_group_names(user)
+        set_user_claims(refresh, user)
+        access_token = str(refresh.access_token)
+        csrf_token = get_csrf_token(request)
+
+        response = JsonResponse({'access': access_token, 'csrf_token': csrf_token})
+        set_auth_cookie(response, 'access', access_token, settings.AUTH_COOKIE_ACCESS_MAX_AGE)
+        set_csrf_cookie(response, csrf_token)
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                await ablacklist_token(refresh, rotated=True)
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            set_auth_cookie(response, 'refresh', str(refresh), settings.AUTH_COOKIE_REFRESH_MAX_AGE)
+    except TokenError as exc:
+        return invalid_token_response(exc)
+    return response
+
+
+@api_view
+async def verify(request):
+    "See CustomTokenVerifyView."
+    token = request.COOKIES.get('access') or get_data(request).get('token')
+    if not token:
+        raise ValidationError({'token': ['This field is required.']})
+    try:
+        UntypedToken(token)
+    except TokenError as exc:
+        return invalid_token_response(exc)
+    return JsonResponse({})
+
+
+@api_view
+async def logout(request):
+    "See LogoutView."
+    if await authenticate(request) is None:
+        return error_response(NotAuthenticated.default_detail, 401)
+
+    refresh_token = request.COOKIES.get('refresh') or get_data(request).get('refresh')
+    if refresh_token:
+        try:
+            await ablacklist_token(await averify_refresh_token(refresh_token))
+        except TokenError:
+            # Already invalid, there is nothing to revoke
+            pass
+
+    response = HttpResponse(status=204)
+    response.delete_cookie('access')
+    response.delete_cookie('refresh')
+    return response
@@ -1,5 +1,116 @@
 from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.middleware.csrf import CSRF_ALLOWED_CHARS, CSRF_SECRET_LENGTH
+from django.utils.crypto import constant_time_compare, get_random_string
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+
+User = get_user_model()
+
+def revoked_user_cache_key(user_id):
+    return f'accounts:revoked-user:{user_id}'
+
+def revoke_user_tokens(user_ids):
+    '''
+    Denies the tokens of the given users on the stateless authentication path.
+    Entries outlive any refresh token issued before the revocation.
+    '''
+    timeout = int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+    cache.set_many({revoked_user_cache_key(user_id): True for user_id in user_ids}, timeout)
+
+def restore_user_tokens(user_ids):
+    '''Lifts the revocation of the given users' tokens.'''
+    cache.delete_many([revoked_user_cache_key(user_id) for user_id in user_ids])
+
+def is_user_revoked(user_id):
+    return cache.get(revoked_user_cache_key(user_id), False)
+
+async def ais_user_revoked(user_id):
+    return await cache.aget(revoked_user_cache_key(user_id), False)
+
+def get_csrf_token(request, rotate=False):
+    '''
+    Returns the token of the csrftoken cookie, or a new one when the request
+    has none or `rotate` is set. It has the format of Django's CSRF secrets,
+    so the cookie stays valid for the admin.
+    '''
+    token = request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+    if rotate or not token or len(token) != CSRF_SECRET_LENGTH:
+        token = get_random_string(CSRF_SECRET_LENGTH, CSRF_ALLOWED_CHARS)
+    return token
+
+def enforce_csrf(request):
+    '''
+    Double-submit CSRF check of requests authenticated with the access
+    cookie: unsafe requests must repeat the csrftoken cookie, which other
+    sites can make browsers send but cannot read, in the X-CSRFToken header.
+    '''
+    if not settings.AUTH_COOKIE_CSRF or request.method in SAFE_METHODS:
+        return
+    cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+    header = request.META.get(settings.CSRF_HEADER_NAME)
+    if not cookie or not header or not constant_time_compare(cookie, header):
+        raise PermissionDenied(_("CSRF Failed: CSRF token missing or incorrect."))
+
+
+class ClaimsUser:
+    '''
+    A user built from the claims embedded in a token at login. Attributes the
+    token does not carry are read from the database user, loaded on first use.
+    '''
+    is_anonymous = False
+    is_authenticated = True
+
+    def __init__(self, token):
+        self.token = token
+
+    def __str__(self):
+        return f'ClaimsUser {self.pk}'
+
+    def __eq__(self, other):
+        if not isinstance(other, (ClaimsUser, User)):
+            return NotImplemented
+        return self.pk == other.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    @cached_property
+    def pk(self):
+        return self.token[api_settings.USER_ID_CLAIM]
+
+    @cached_property
+    def id(self):
+        return self.pk
+
+    @cached_property
+    def is_active(self):
+        return self.token.get('is_active', False)
+
+    @cached_property
+    def is_staff(self):
+        return self.token.get('is_staff', False)
+
+    @cached_property
+    def _group_names(self):
+        # Read by accounts.permissions.get_group_names
+        return frozenset(self.token.get('groups', ()))
+
+    @cached_property
+    def user(self):
+        return User._default_manager.get(**{api_settings.USER_ID_FIELD: self.pk})
+
+    def __getattr__(self, attr):
+        if attr in ('token', 'user'):
+            raise AttributeError(attr)
+        return getattr(self.user, attr)
 
 
 class CustomJWTAuthentication(JWTAuthentication):
@@ -11,13 +122,77 @@ class CustomJWTAuthentication(JWTAuthentication):
                 raw_token = request.COOKIES.get(settings.AUTH_COOKIE)
             else:
                 raw_token = self.get_raw_token(header)
-                
+
             if raw_token is None:
                 return None
 
             validated_token = self.get_validated_token(raw_token)
+            user = self.get_user(validated_token)
+        except:
+            return None
+
+        if header is None:
+            enforce_csrf(request)
+        return user, validated_token
+
+    def get_user(self, validated_token):
+        '''
+        With AUTH_STATELESS_TOKENS enabled, builds the user from the token's
+        claims instead of querying the database. Tokens issued without the
+        claims fall back to the database lookup.
+        '''
+        if not settings.AUTH_STATELESS_TOKENS or 'is_active' not in validated_token:
+            return super().get_user(validated_token)
+
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = ClaimsUser(validated_token)
+        if not user.is_active or is_user_revoked(user.pk):
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+    async def aauthenticate(self, request):
+        '''See authenticate(), for the async views of accounts.async_views.'''
+        try:
+            header = self.get_header(request)
+
+            if header is None:
+                raw_token = request.COOKIES.get(settings.AUTH_COOKIE)
+            else:
+                raw_token = self.get_raw_token(header)
 
-            return self.get_user(validated_token), validated_token
+            if raw_token is None:
+                return None
+
+            validated_token = self.get_validated_token(raw_token)
+            user = await self.aget_user(validated_token)
         except:
             return None
 
+        if header is None:
+            enforce_csrf(request)
+        return user, validated_token
+
+    async def aget_user(self, validated_token):
+        '''See get_user().'''
+        if not settings.AUTH_STATELESS_TOKENS or 'is_active' not in validated_token:
+            try:
+                user_id = validated_token[api_settings.USER_ID_CLAIM]
+            except KeyError:
+                raise InvalidToken(_("Token contained no recognizable user identification"))
+            try:
+                user = await User._default_manager.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except User.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            if not user.is_active:
+                raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+            return user
+
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = ClaimsUser(validated_token)
+        if not user.is_active or await ais_user_revoked(user.pk):
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
@@ -0,0 +1,59 @@
+"""
+RateGuardedModelBackend stops checking the passwords given for an email, or
+from a client address, after too many failed logins, so brute force and
+credential stuffing traffic is refused before it costs a password hash.
+"""
+import hashlib
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+
+UserModel = get_user_model()
+
+def get_failure_keys(request, username):
+    "Returns the cache keys counting the failed logins for `username` and from the request's address."
+    digest = hashlib.sha256(UserModel.normalize_username(username).lower().encode()).hexdigest()
+    keys = {'email': f'accounts:login-failures:email:{digest}'}
+    # The client address, as DRF throttles identify it
+    address = BaseThrottle().get_ident(request) if request is not None else None
+    if address:
+        keys['address'] = f'accounts:login-failures:address:{address}'
+    return keys
+
+
+class RateGuardedModelBackend(ModelBackend):
+    """
+    Refuses logins without checking the password once LOGIN_FAILURE_LIMIT
+    logins for the email, or LOGIN_FAILURE_ADDRESS_LIMIT logins from the
+    address, failed within LOGIN_FAILURE_WINDOW seconds. A successful login
+    resets the count of the email.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return
+
+        keys = get_failure_keys(request, username)
+        limits = {'email': settings.LOGIN_FAILURE_LIMIT, 'address': settings.LOGIN_FAILURE_ADDRESS_LIMIT}
+        failures = cache.get_many(keys.values())
+        if any(failures.get(key, 0) >= limits[name] for name, key in keys.items()):
+            return
+
+        user = super().authenticate(request, username, password, **kwargs)
+        if user is not None:
+            cache.delete(keys['email'])
+            return user
+
+        for key in keys.values():
+            # The window starts at the first failure
+            cache.add(key, 0, settings.LOGIN_FAILURE_WINDOW)
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Expired since it was added
+                pass
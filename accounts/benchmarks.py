@@ -0,0 +1,358 @@
+"""
+Benchmarks run by the `benchmark` management command. Each app may define a
+`benchmarks` module whose functions are registered with `@benchmark`; they
+take the number of runs and return a dict of results. They run against the
+configured database, so setting DATABASE_URL benchmarks PostgreSQL.
+"""
+import asyncio
+import math
+import statistics
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from types import ModuleType
+from unittest import mock
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.handlers.base import BaseHandler
+from django.core.cache import caches
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import AsyncClient, Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from rest_framework.test import APIClient
+from rest_framework.throttling import SimpleRateThrottle
+from . import async_views
+from .throttling import LoginRateThrottle
+from .tokens import BlacklistRefreshToken
+from .views import CustomTokenRefreshView
+
+
+User = get_user_model()
+
+registry = {}
+
+def benchmark(func=None, *, atomic=True):
+    """
+    Registers a benchmark. Benchmarks run in a transaction rolled back after
+    them, unless `atomic` is False: those serve requests from other threads,
+    which only see committed rows, and delete the rows they create.
+    """
+    if func is None:
+        return lambda func: benchmark(func, atomic=atomic)
+    func.atomic = atomic
+    registry[func.__name__] = func
+    return func
+
+def summarize(timings, queries):
+    "Returns the latency statistics of runs lasting `timings` milliseconds, with `queries` in total."
+    timings = sorted(timings)
+    return {
+        'runs': len(timings),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[math.ceil(len(timings) * 0.95) - 1], 3),
+        'queries_per_run': round(queries / len(timings), 2),
+    }
+
+def measure(func, repeat):
+    """
+    Calls `func(run)` for each run and returns its latency in milliseconds,
+    the number of queries per run and the peak memory allocated by a run.
+    Memory is traced on one additional run, `func(repeat)`, as tracing slows
+    down the timed ones.
+    """
+    tracemalloc.start()
+    func(repeat)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings = []
+    with CaptureQueriesContext(connection) as context:
+        for run in range(repeat):
+            start = time.perf_counter()
+            func(run)
+            timings.append((time.perf_counter() - start) * 1000)
+    return {**summarize(timings, len(context.captured_queries)), 'peak_memory_kib': round(peak / 1024, 1)}
+
+def create_users(count, prefix='user', password=None, **extra_fields):
+    "Inserts `count` users sharing one password hash, as hashing dominates otherwise."
+    password = make_password(password)
+    return User.objects.bulk_create([
+        User(email=f'{prefix}{index}@benchmark.local', password=password, **extra_fields)
+        for index in range(count)
+    ])
+
+def api_client(user=None):
+    "Returns an API client authenticated as `user`, if given."
+    client = APIClient(SERVER_NAME='localhost')
+    if user is not None:
+        client.force_authenticate(user=user)
+    return client
+
+def check_status(response, status):
+    # A benchmark of error responses would measure the wrong thing
+    if response.status_code != status:
+        raise AssertionError(f'Expected status {status}, got {response.status_code}: {response.content[:200]!r}')
+    return response
+
+
+@benchmark
+def employee_user_creation(repeat):
+    """Latency of UserManager.create_employee_user against its previous implementation."""
+    Group.objects.get_or_create(name='Employee')
+
+    def previous(run):
+        employee_group = Group.objects.get(name="Employee")
+        user = User.objects.create_user(f'previous{run}@benchmark.local')
+        employee_group.user_set.add(user)
+
+    def current(run):
+        User.objects.create_employee_user(f'current{run}@benchmark.local')
+
+    return {
+        'previous': measure(previous, repeat),
+        'create_employee_user': measure(current, repeat),
+    }
+
+
+@benchmark
+def login(repeat):
+    """Token obtain pair through CustomTokenObtainPairView, with the configured password hasher."""
+    users = create_users(min(repeat, 100), prefix='login', password='benchmark-password', is_active=True)
+    client = api_client()
+
+    def obtain(run):
+        email = users[run % len(users)].email
+        check_status(client.post('/accounts/login/', {'email': email, 'password': 'benchmark-password'}), 200)
+
+    return {'login': measure(obtain, repeat)}
+
+
+@benchmark
+def login_hashers(repeat):
+    """
+    Logins with each PASSWORD_HASHER_POLICIES hasher, as logins per second
+    on one core, and logins refused by RateGuardedModelBackend.
+    """
+    results = {}
+    client = api_client()
+    for policy, hasher in settings.PASSWORD_HASHER_POLICIES.items():
+        with override_settings(PASSWORD_HASHERS=[hasher]):
+            users = create_users(min(repeat, 10), prefix=policy, password='benchmark-password', is_active=True)
+
+            def obtain(run):
+                email = users[run % len(users)].email
+                check_status(client.post('/accounts/login/', {'email': email, 'password': 'benchmark-password'}), 200)
+
+            result = measure(obtain, repeat)
+        results[policy] = {**result, 'logins_per_second': round(1000 / result['mean_ms'], 1)}
+
+    with override_settings(LOGIN_FAILURE_LIMIT=1):
+        [user] = create_users(1, prefix='guarded', password='benchmark-password', is_active=True)
+        client.post('/accounts/login/', {'email': user.email, 'password': 'wrong'})
+        results['guarded'] = measure(
+            lambda run: check_status(
+                client.post('/accounts/login/', {'email': user.email, 'password': 'benchmark-password'}), 401
+            ),
+            repeat,
+        )
+    return results
+
+
+class CacheLatency:
+    "Adds `delay` seconds to the calls of the default cache, as a cache across the network would, and counts them."
+    methods = ('get', 'get_many', 'set', 'add', 'incr', 'delete')
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = 0
+        self.stack = ExitStack()
+
+    def wrap(self, method):
+        def wrapper(*args, **kwargs):
+            time.sleep(self.delay)
+            self.calls += 1
+            return method(*args, **kwargs)
+        return wrapper
+
+    def __enter__(self):
+        backend = caches['default']
+        for name in self.methods:
+            self.stack.enter_context(mock.patch.object(backend, name, self.wrap(getattr(backend, name))))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stack.close()
+
+
+@benchmark
+def login_throttle(repeat):
+    """
+    Login throttle checks for 100 client addresses with 0.5 ms added to each
+    cache call: DRF's SimpleRateThrottle, which reads and writes the cache on
+    each request, and LoginRateThrottle.
+    """
+    class CacheLoginRateThrottle(SimpleRateThrottle):
+        rate = '1000000/min'
+
+        def get_cache_key(self, request, view):
+            return self.cache_format % {'scope': 'login', 'ident': self.get_ident(request)}
+
+    class BucketLoginRateThrottle(LoginRateThrottle):
+        rate = '1000000/min'
+
+    factory = RequestFactory()
+    requests = [factory.post('/accounts/login/', REMOTE_ADDR=f'10.0.0.{index}') for index in range(100)]
+    results = {}
+    for name, throttle_class in (('cache', CacheLoginRateThrottle), ('token_bucket', BucketLoginRateThrottle)):
+        def check(run):
+            if not throttle_class().allow_request(requests[run % len(requests)], None):
+                raise AssertionError('Throttled')
+
+        with CacheLatency(0.0005) as latency:
+            result = measure(check, repeat)
+        results[name] = {**result, 'cache_calls_per_run': round(latency.calls / (repeat + 1), 2)}
+    return results
+
+
+@benchmark
+def api_middleware(repeat):
+    """
+    Requests with session and CSRF cookies to empty views on an API path and
+    on an admin path, through the middleware of MIDDLEWARE with Django's
+    session, authentication, message and CSRF middleware and with those of
+    core.middleware.
+    """
+    stock = {
+        'core.middleware.SessionMiddleware': 'django.contrib.sessions.middleware.SessionMiddleware',
+        'core.middleware.CsrfViewMiddleware': 'django.middleware.csrf.CsrfViewMiddleware',
+        'core.middleware.AuthenticationMiddleware': 'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'core.middleware.MessageMiddleware': 'django.contrib.messages.middleware.MessageMiddleware',
+    }
+    urlconf = ModuleType('api_middleware_urls')
+    urlconf.urlpatterns = [
+        path('accounts/empty/', lambda request: HttpResponse()),
+        path('admin/empty/', lambda request: HttpResponse()),
+    ]
+    factory = RequestFactory(SERVER_NAME='localhost')
+    cookies = 'sessionid=benchmark-session; csrftoken=benchmark-csrf-token-benchmark-c'
+
+    def get(handler, path):
+        check_status(handler.get_response(factory.get(path, HTTP_COOKIE=cookies)), 200)
+
+    results = {}
+    for name, middleware in (
+        ('django', [stock.get(middleware, middleware) for middleware in settings.MIDDLEWARE]),
+        ('api_profile', settings.MIDDLEWARE),
+    ):
+        with override_settings(ROOT_URLCONF=urlconf, MIDDLEWARE=middleware):
+            handler = BaseHandler()
+            handler.load_middleware()
+            results[f'{name}_api_path'] = measure(lambda run: get(handler, '/accounts/empty/'), repeat)
+            results[f'{name}_admin_path'] = measure(lambda run: get(handler, '/admin/empty/'), repeat)
+    return results
+
+
+@benchmark
+def token_refresh(repeat):
+    """Access token refresh through CustomTokenRefreshView, rotating the refresh cookie, and refusal of a revoked token."""
+    [user] = create_users(1, prefix='refresh', is_active=True)
+    client, revoked_client = api_client(), api_client()
+    client.cookies['refresh'] = str(BlacklistRefreshToken.for_user(user))
+    revoked = BlacklistRefreshToken.for_user(user)
+    revoked.blacklist()
+
+    return {
+        'refresh_rotation': measure(lambda run: check_status(client.post('/accounts/refresh/'), 200), repeat),
+        'refresh_revoked': measure(
+            lambda run: check_status(revoked_client.post('/accounts/refresh/', {'refresh': str(revoked)}), 401),
+            repeat,
+        ),
+    }
+
+
+class QueryLatency:
+    "An execute wrapper adding `delay` seconds to every query, as a database across the network would."
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.queries = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        time.sleep(self.delay)
+        with self.lock:
+            self.queries += 1
+        return execute(sql, params, many, context)
+
+
+@benchmark(atomic=False)
+def concurrent_refresh(repeat):
+    """
+    Token refreshes with 5 ms of latency added to each query, 50 at a time:
+    through CustomTokenRefreshView on 8 threads, as a threaded WSGI worker
+    serves them, and through the async view, as an ASGI worker does.
+    """
+    clients, threads = 50, 8
+    [user] = create_users(1, prefix='concurrent', is_active=True)
+    urlconf = ModuleType('concurrent_refresh_urls')
+    urlconf.urlpatterns = [
+        path('sync/refresh/', CustomTokenRefreshView.as_view()),
+        path('async/refresh/', async_views.refresh),
+    ]
+
+    def sync_refresh(token, latency):
+        with connection.execute_wrapper(latency):
+            start = time.perf_counter()
+            check_status(Client().post('/sync/refresh/', {'refresh': token}, content_type='application/json'), 200)
+            return (time.perf_counter() - start) * 1000
+
+    async def async_refresh(token, latency, slots):
+        async with slots:
+            # As the ASGI handler runs each request, with the ORM on a thread of its own
+            async with ThreadSensitiveContext():
+                stack = ExitStack()
+                await sync_to_async(lambda: stack.enter_context(connection.execute_wrapper(latency)))()
+                start = time.perf_counter()
+                response = await AsyncClient().post(
+                    '/async/refresh/', {'refresh': token}, content_type='application/json'
+                )
+                check_status(response, 200)
+                timing = (time.perf_counter() - start) * 1000
+                await sync_to_async(stack.close)()
+                await sync_to_async(connections.close_all)()
+                return timing
+
+    async def serve_async(tokens, latency):
+        slots = asyncio.Semaphore(clients)
+        return await asyncio.gather(*[async_refresh(token, latency, slots) for token in tokens])
+
+    def run(serve):
+        tokens = [str(BlacklistRefreshToken.for_user(user)) for run in range(repeat)]
+        latency = QueryLatency(0.005)
+        start = time.perf_counter()
+        timings = serve(tokens, latency)
+        total = time.perf_counter() - start
+        return {**summarize(timings, latency.queries), 'requests_per_second': round(repeat / total, 1)}
+
+    try:
+        # The async test client's requests are for testserver
+        with override_settings(ROOT_URLCONF=urlconf, ALLOWED_HOSTS=['testserver']):
+            with ThreadPoolExecutor(threads) as executor:
+                sync_result = run(
+                    lambda tokens, latency: list(executor.map(sync_refresh, tokens, [latency] * len(tokens)))
+                )
+                # The threads' connections, opened on their first request
+                list(executor.map(lambda thread: connections.close_all(), range(threads)))
+            # Not async_to_sync(), whose calling thread would run the ORM of every request
+            async_result = run(lambda tokens, latency: asyncio.run(serve_async(tokens, latency)))
+    finally:
+        user.delete()
+    return {'sync_threads': sync_result, 'async': async_result}
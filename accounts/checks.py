@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+@register()
+def check_stateless_tokens_cache(app_configs, **kwargs):
+    '''
+    Revoked users are denied on the stateless authentication path through the
+    cache, so it must be shared by the processes serving requests.
+    '''
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.AUTH_STATELESS_TOKENS and backend == 'django.core.cache.backends.locmem.LocMemCache':
+        return [Warning(
+            "AUTH_STATELESS_TOKENS is enabled with a local memory cache.",
+            hint="Set REDIS_URL, or only the process deactivating a user stops accepting its tokens.",
+            id='accounts.W001',
+        )]
+    return []
@@ -0,0 +1,25 @@
+"""
+Password hashers with their cost tuned for login throughput, selected by the
+PASSWORD_HASHER_POLICY setting. They keep the algorithm names of Django's
+hashers, so existing hashes are verified by them, and hashes made with other
+parameters are rehashed on the next successful login.
+"""
+from django.contrib.auth import hashers
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """
+    Argon2id with the OWASP minimum cost: 19 MiB, two passes and one lane.
+    Django's default of 100 MiB over eight lanes takes every core of a
+    worker for each login.
+    """
+    time_cost = 2
+    memory_cost = 19 * 1024
+    parallelism = 1
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    "Scrypt with the OWASP cost for 16 MiB of memory: N=2^14, r=8 and p=5."
+    work_factor = 2 ** 14
+    block_size = 8
+    parallelism = 5
@@ -0,0 +1,84 @@
+import json
+import platform
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from django.utils.module_loading import autodiscover_modules
+from accounts.benchmarks import registry
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs the registered benchmarks and prints their results as JSON. '
+        'Benchmarks are rolled back, or clean up after themselves.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Benchmarks to run, all by default.')
+        parser.add_argument('--repeat', type=int, default=100, help='Number of runs per benchmark.')
+        parser.add_argument('--output', help='Write the results to this file instead of stdout.')
+        parser.add_argument('--list', action='store_true', help='List the available benchmarks.')
+        parser.add_argument(
+            '--compare', metavar='FILE',
+            help='Print the median latency and query changes against the results in this file.',
+        )
+
+    def handle(self, *args, **options):
+        autodiscover_modules('benchmarks')
+        if options['list']:
+            for name, func in sorted(registry.items()):
+                self.stdout.write(f'{name}: {func.__doc__}')
+            return
+
+        names = options['names'] or sorted(registry)
+        unknown = set(names) - set(registry)
+        if unknown:
+            raise CommandError(f'Unknown benchmark(s): {", ".join(sorted(unknown))}')
+
+        results = {}
+        # Benchmarks repeat requests well beyond the throttle rates
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}):
+            for name in names:
+                func = registry[name]
+                if not func.atomic:
+                    results[name] = func(options['repeat'])
+                    continue
+                with transaction.atomic():
+                    results[name] = func(options['repeat'])
+                    transaction.set_rollback(True)
+
+        output = json.dumps({
+            'environment': {
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'repeat': options['repeat'],
+            },
+            'benchmarks': results,
+        }, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}.'))
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            with open(options['compare']) as file:
+                self.compare(json.load(file)['benchmarks'], results)
+
+    def compare(self, previous, results):
+        for name, cases in results.items():
+            for case, result in cases.items():
+                before = previous.get(name, {}).get(case)
+                if before is None:
+                    self.stdout.write(f'{name}.{case}: new')
+                    continue
+                change = (result['median_ms'] - before['median_ms']) / before['median_ms'] * 100
+                style = self.style.ERROR if change > 10 else self.style.SUCCESS if change < -10 else str
+                self.stdout.write(style(
+                    f'{name}.{case}: median {before["median_ms"]} -> {result["median_ms"]} ms ({change:+.1f}%), '
+                    f'queries {before["queries_per_run"]} -> {result["queries_per_run"]}'
+                ))
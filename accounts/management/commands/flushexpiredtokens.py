@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounts.models import BlacklistedToken
+
+
+class Command(BaseCommand):
+    help = 'Deletes blacklisted refresh tokens that have expired.'
+
+    def handle(self, *args, **options):
+        count, _ = BlacklistedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        self.stdout.write(self.style.SUCCESS(f'{count} expired tokens deleted.'))
@@ -1,9 +1,32 @@
+from django.conf import settings
 from django.contrib.auth.base_user import BaseUserManager
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import transaction
 from django.http import Http404
 
 
+GROUP_IDS_CACHE_KEY = 'accounts:group-ids'
+
+def get_group_id(name):
+    """
+    Returns the id of the group with the given name, or None if it does not
+    exist. The ids of all groups are loaded at once and kept in Django's
+    cache, shared by the processes, for USER_GROUPS_CACHE_TIMEOUT seconds.
+    """
+    group_ids = cache.get(GROUP_IDS_CACHE_KEY)
+    if group_ids is None:
+        group_ids = dict(Group.objects.values_list('name', 'pk'))
+        if settings.USER_GROUPS_CACHE_TIMEOUT:
+            cache.set(GROUP_IDS_CACHE_KEY, group_ids, settings.USER_GROUPS_CACHE_TIMEOUT)
+    return group_ids.get(name)
+
+def clear_group_ids():
+    "Drops the cached group ids, called by accounts.signals when groups change."
+    cache.delete(GROUP_IDS_CACHE_KEY)
+
+
 class UserManager(BaseUserManager):
     """
     Custom user model manager where email is the unique identifiers
@@ -39,12 +62,16 @@ class UserManager(BaseUserManager):
         """
         Create and save a User with the group "Employee".
         """
-        try:
-            employee_group =  Group.objects.get(name="Employee")
-        except Group.DoesNotExist:
+        employee_group_id = get_group_id("Employee")
+        if employee_group_id is None:
             raise Http404("Employee Group is not created yet.")
-        user = self.create_user(email, password, **extra_fields)
-        employee_group.user_set.add(user)
+        with transaction.atomic(using=self.db, savepoint=False):
+            user = self.create_user(email, password, **extra_fields)
+            # A single insert into the through table. The user is new, so
+            # there is no existing membership or cached group names to check.
+            self.model.groups.through.objects.using(self.db).create(
+                user_id=user.pk, group_id=employee_group_id
+            )
         return user
 
     
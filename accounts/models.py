@@ -31,14 +31,32 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
-    def send_mail(self, email_template, sender, context):
-        "Sends an email invitation to the employee User."
+    def get_mail(self, email_template, sender, context):
+        "Builds an email message to the employee User."
         context['employee_name'] = self.employee.get_short_name() 
 
-        mail = get_templated_mail(
+        return get_templated_mail(
             template_name=email_template,
             from_email=sender,
             to=[self.email],
             context=context
         )
+
+    def send_mail(self, email_template, sender, context):
+        "Sends an email invitation to the employee User."
+        mail = self.get_mail(email_template, sender, context)
         return mail.send()
+
+
+class BlacklistedToken(models.Model):
+    "A refresh token revoked before its expiry, see accounts.tokens."
+    jti = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, related_name='blacklisted_tokens')
+    expires_at = models.DateTimeField(db_index=True)
+    # Replaced by refresh rotation rather than revoked, see TokenBlacklist.add
+    rotated = models.BooleanField(default=False)
+    # Read by the incremental sync of accounts.tokens.TokenBlacklist
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.jti
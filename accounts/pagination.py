@@ -0,0 +1,42 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import pagination
+
+
+class CursorPagination(pagination.CursorPagination):
+    '''
+    Keyset pagination over a stable, indexed ordering.
+
+    Viewsets choose their ordering with an `ordering` attribute, which should
+    be an unchanging, unique field so that no page needs an OFFSET scan.
+    Orderings requested through an ordering filter may not be unique, and
+    get the primary key appended as a tiebreaker.
+    '''
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = 'id'
+
+    def get_ordering(self, request, queryset, view):
+        has_ordering_filter = any(
+            hasattr(filter_cls, 'get_ordering')
+            for filter_cls in getattr(view, 'filter_backends', [])
+        )
+        ordering = getattr(view, 'ordering', None)
+        if ordering and not has_ordering_filter:
+            return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+        ordering = super().get_ordering(request, queryset, view)
+        if not any(self.is_unique(queryset.model, field) for field in ordering):
+            # Pages continue from the position of their last row's first
+            # field and an offset past the rows tied with it, which must come
+            # in the same order on every page
+            ordering += ('-pk',) if ordering[0].startswith('-') else ('pk',)
+        return ordering
+
+    def is_unique(self, model, field):
+        name = field.lstrip('-')
+        if name == 'pk':
+            return True
+        try:
+            return model._meta.get_field(name).unique
+        except FieldDoesNotExist:
+            return False
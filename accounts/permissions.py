@@ -1,16 +1,88 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from rest_framework import permissions
 # from rest_framework.permissions import SAFE_METHODS
 
 
+User = get_user_model()
+
+def group_names_cache_key(user_id):
+    return f'accounts:user-groups:{user_id}'
+
+def get_cached_group_names(user_id):
+    '''
+    Returns the group names of a user, going through Django's cache when
+    enabled. Membership changes invalidate the entries of the cache, which
+    only reaches every process when shared, see CACHES.
+    '''
+    timeout = settings.USER_GROUPS_CACHE_TIMEOUT
+    key = group_names_cache_key(user_id)
+    if timeout:
+        group_names = cache.get(key)
+        if group_names is not None:
+            return group_names
+
+    group_names = frozenset(
+        User.groups.through.objects.filter(user_id=user_id).values_list('group__name', flat=True)
+    )
+    if timeout:
+        cache.set(key, group_names, timeout)
+    return group_names
+
+async def aget_cached_group_names(user_id):
+    '''See get_cached_group_names().'''
+    timeout = settings.USER_GROUPS_CACHE_TIMEOUT
+    key = group_names_cache_key(user_id)
+    if timeout:
+        group_names = await cache.aget(key)
+        if group_names is not None:
+            return group_names
+
+    group_names = frozenset([
+        name async for name in
+        User.groups.through.objects.filter(user_id=user_id).values_list('group__name', flat=True)
+    ])
+    if timeout:
+        await cache.aset(key, group_names, timeout)
+    return group_names
+
+def invalidate_group_names(user_ids):
+    '''Drops the cached group names of the given users.'''
+    cache.delete_many([group_names_cache_key(user_id) for user_id in user_ids])
+
+def get_group_names(user):
+    '''
+    Returns the names of the groups the user belongs to. The names are
+    loaded at most once per request and kept on the user object.
+    '''
+    if not user.is_authenticated:
+        return frozenset()
+    group_names = getattr(user, '_group_names', None)
+    if group_names is None:
+        group_names = user._group_names = get_cached_group_names(user.pk)
+    return group_names
+
+async def aget_group_names(user):
+    '''See get_group_names().'''
+    if not user.is_authenticated:
+        return frozenset()
+    group_names = getattr(user, '_group_names', None)
+    if group_names is None:
+        group_names = user._group_names = await aget_cached_group_names(user.pk)
+    return group_names
+
+
 class IsHRorAdmin(permissions.IsAuthenticated):
     '''Allows access to only admin users, and users who are in 'HR' group.'''
     def has_permission(self, request, view):
-        super().has_permission(request, view)
+        if not super().has_permission(request, view):
+            return False
         user = request.user
-        return user.groups.filter(name='HR').exists() or user.is_staff
+        return user.is_staff or 'HR' in get_group_names(user)
 
 class IsEmployeeorAdmin(permissions.IsAuthenticated):
     '''Allows access to only admin users, and the user attached to the object.'''
-    def has_object_permission(self, request, view):
+    def has_object_permission(self, request, view, obj):
         user = request.user
-        return user.is_staff or user == obj.user
\ No newline at end of file
+        return user.is_staff or user == obj.user
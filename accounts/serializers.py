@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 from djoser.serializers import (
     UserCreateSerializer as DjoserUserCreateSerializer,
@@ -6,9 +7,21 @@ from djoser.serializers import (
     SendEmailResetSerializer,
 )
 from djoser.conf import settings
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from .authentication import is_user_revoked
+from .permissions import get_group_names
+from .tokens import BlacklistRefreshToken
 
 
 User = get_user_model()
+
+def set_user_claims(token, user):
+    "Embeds the claims used by CustomJWTAuthentication to authenticate requests without a user lookup."
+    token['is_active'] = user.is_active
+    token['is_staff'] = user.is_staff
+    token['groups'] = sorted(get_group_names(user))
     
 class CustomUserSerializer(DjoserUserSerializer):
     groups = serializers.SlugRelatedField(
@@ -26,6 +39,48 @@ class CreateEmployeeUserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['email',]
 
+class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = BlacklistRefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        set_user_claims(token, user)
+        return token
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = BlacklistRefreshToken
+
+    default_error_messages = {
+        'no_active_account': _("No active account found for the given token")
+    }
+
+    def validate(self, attrs):
+        """
+        Refuses blacklisted tokens and tokens of revoked or inactive users.
+        The claims are rebuilt from the user, so the tokens of a user whose
+        groups or staff status changed stop carrying the old ones. With
+        ROTATE_REFRESH_TOKENS, the token is blacklisted and a new one issued.
+        """
+        refresh = self.token_class(attrs['refresh'])
+        user_id = refresh.get(api_settings.USER_ID_CLAIM)
+        if is_user_revoked(user_id):
+            raise TokenError(_("Token is blacklisted"))
+        user = User._default_manager.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        set_user_claims(refresh, user)
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist(rotated=True)
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
+
 class PasswordResetSerializer(SendEmailResetSerializer):
     def get_user(self, is_active=True):
         try:
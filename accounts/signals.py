@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+from djoser.signals import user_activated
+from .authentication import restore_user_tokens
+from .managers import clear_group_ids
+from .permissions import invalidate_group_names
+
+User = get_user_model()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_user_groups(sender, instance, action, reverse, pk_set, **kwargs):
+    '''Drops cached group names when group memberships change.'''
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_group_names([instance.pk])
+    elif action == 'pre_clear':
+        invalidate_group_names(instance.user_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_group_names(pk_set)
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_group_members(sender, instance, **kwargs):
+    '''Drops cached group names of the members of a renamed or deleted group.'''
+    invalidate_group_names(instance.user_set.values_list('pk', flat=True))
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_group_ids(sender, **kwargs):
+    '''Drops the cached ids used by UserManager.create_employee_user.'''
+    clear_group_ids()
+
+@receiver(user_activated)
+def restore_activated_user_tokens(sender, user, **kwargs):
+    restore_user_tokens([user.pk])
@@ -1,3 +1,463 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, AsyncRequestFactory, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from core.middleware import SessionMiddleware
+from . import async_views
+from .authentication import CustomJWTAuthentication, revoke_user_tokens, restore_user_tokens
+from .checks import check_stateless_tokens_cache
+from .models import BlacklistedToken
+from .permissions import IsHRorAdmin, get_group_names
+from .throttling import TokenBuckets, buckets
+from .tokens import TokenBlacklist, BlacklistRefreshToken, blacklist
 
-# Create your tests here.
+
+User = get_user_model()
+
+
+class GroupNamesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.hr_group = Group.objects.create(name='HR')
+        self.user = User.objects.create_user(email='hr@email.com', is_active=True)
+
+    def get_user(self):
+        # A fresh instance, as loaded by authentication on a new request.
+        return User.objects.get(pk=self.user.pk)
+
+    def test_group_names_are_loaded_once_per_request(self):
+        user = self.get_user()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_group_names(user), frozenset())
+            self.assertEqual(get_group_names(user), frozenset())
+
+    def test_group_names_are_shared_through_the_cache(self):
+        get_group_names(self.get_user())
+        user = self.get_user()
+        with self.assertNumQueries(0):
+            get_group_names(user)
+
+    def test_membership_changes_invalidate_the_cache(self):
+        get_group_names(self.get_user())
+        self.user.groups.add(self.hr_group)
+        self.assertEqual(get_group_names(self.get_user()), frozenset(['HR']))
+
+        self.hr_group.user_set.remove(self.user)
+        self.assertEqual(get_group_names(self.get_user()), frozenset())
+
+        self.hr_group.user_set.add(self.user)
+        get_group_names(self.get_user())
+        self.hr_group.user_set.clear()
+        self.assertEqual(get_group_names(self.get_user()), frozenset())
+
+    def test_group_names_expire(self):
+        get_group_names(self.get_user())
+        # Changed by another process, whose signals leave this cache alone
+        with mock.patch('accounts.signals.invalidate_group_names'):
+            self.user.groups.add(self.hr_group)
+        self.assertEqual(get_group_names(self.get_user()), frozenset())
+        later = time.time() + settings.USER_GROUPS_CACHE_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertEqual(get_group_names(self.get_user()), frozenset(['HR']))
+
+    def test_group_rename_invalidates_the_cache(self):
+        self.user.groups.add(self.hr_group)
+        get_group_names(self.get_user())
+        self.hr_group.name = 'People'
+        self.hr_group.save()
+        self.assertEqual(get_group_names(self.get_user()), frozenset(['People']))
+
+    def test_is_hr_or_admin(self):
+        request = RequestFactory().get('/')
+        request.user = self.get_user()
+        self.assertFalse(IsHRorAdmin().has_permission(request, None))
+
+        self.user.groups.add(self.hr_group)
+        request.user = self.get_user()
+        self.assertTrue(IsHRorAdmin().has_permission(request, None))
+
+
+class StatelessAuthenticationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='hr@email.com', password='password', is_active=True)
+        self.user.groups.add(Group.objects.create(name='HR'))
+        client = APIClient(SERVER_NAME='localhost')
+        response = client.post('/accounts/login/', {'email': 'hr@email.com', 'password': 'password'})
+        self.assertEqual(response.status_code, 200)
+        self.access = response.data['access']
+        self.refresh = client.cookies['refresh'].value
+
+    def authenticate(self):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'JWT {self.access}')
+        return CustomJWTAuthentication().authenticate(request)
+
+    def test_database_lookup_by_default(self):
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate()
+        self.assertEqual(user, self.user)
+
+    @override_settings(AUTH_STATELESS_TOKENS=True)
+    def test_user_is_built_from_claims(self):
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+            self.assertEqual(user, self.user)
+            self.assertTrue(user.is_active)
+            self.assertEqual(get_group_names(user), frozenset(['HR']))
+        # Attributes missing from the claims come from the database user.
+        self.assertEqual(user.email, 'hr@email.com')
+
+    @override_settings(AUTH_STATELESS_TOKENS=True)
+    def test_revoked_user_is_rejected(self):
+        revoke_user_tokens([self.user.pk])
+        self.assertIsNone(self.authenticate())
+        restore_user_tokens([self.user.pk])
+        self.assertIsNotNone(self.authenticate())
+
+    def test_refresh_rebuilds_claims(self):
+        self.user.groups.clear()
+        self.user.is_staff = True
+        self.user.save()
+        client = APIClient(SERVER_NAME='localhost')
+        response = client.post('/accounts/refresh/', {'refresh': self.refresh})
+        self.assertEqual(response.status_code, 200)
+        for token in (AccessToken(response.data['access']), BlacklistRefreshToken(client.cookies['refresh'].value)):
+            self.assertEqual((token['groups'], token['is_staff']), ([], True))
+
+        self.user.is_active = False
+        self.user.save()
+        response = client.post('/accounts/refresh/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_local_cache_is_reported(self):
+        with override_settings(AUTH_STATELESS_TOKENS=True):
+            self.assertEqual([error.id for error in check_stateless_tokens_cache(None)], ['accounts.W001'])
+        self.assertEqual(check_stateless_tokens_cache(None), [])
+
+
+class TokenBlacklistTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        blacklist.reset()
+        self.user = User.objects.create_user(email='hr@email.com', password='password', is_active=True)
+        self.client = APIClient(SERVER_NAME='localhost')
+        response = self.client.post('/accounts/login/', {'email': 'hr@email.com', 'password': 'password'})
+        self.assertEqual(response.status_code, 200)
+        self.refresh = self.client.cookies['refresh'].value
+
+    def refresh_with(self, token):
+        return APIClient(SERVER_NAME='localhost').post('/accounts/refresh/', {'refresh': token})
+
+    def test_refresh_rotates_the_token(self):
+        response = self.client.post('/accounts/refresh/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data), ['access', 'csrf_token'])
+        self.assertNotEqual(self.client.cookies['refresh'].value, self.refresh)
+        self.assertEqual(self.refresh_with(self.client.cookies['refresh'].value).status_code, 200)
+        # The replaced token cannot be used again
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+
+    def test_logout_revokes_the_refresh_token(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/accounts/logout/', HTTP_X_CSRFTOKEN=self.client.cookies['csrftoken'].value)
+            self.assertEqual(response.status_code, 204)
+        self.assertTrue(BlacklistedToken.objects.filter(rotated=False).exists())
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+        # Synced once after the revocation, then answered from memory
+        with self.assertNumQueries(0):
+            self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+
+    def test_revoked_user_cannot_refresh(self):
+        revoke_user_tokens([self.user.pk])
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+
+    @override_settings(TOKEN_BLACKLIST_SYNC_INTERVAL=3600)
+    def test_revocations_reach_other_processes_through_the_cache(self):
+        # Shares the test cache, as processes share the cache of REDIS_URL
+        other = TokenBlacklist()
+        token = BlacklistRefreshToken(self.refresh)
+        self.assertNotIn(token['jti'], other)
+        with self.assertNumQueries(0):
+            self.assertNotIn(BlacklistRefreshToken.for_user(self.user)['jti'], other)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            token.blacklist()
+        self.assertIn(token['jti'], other)
+
+    def test_revocations_reach_other_processes_without_the_cache(self):
+        other = TokenBlacklist()
+        other_cache = LocMemCache('other', {})
+        token = BlacklistRefreshToken(self.refresh)
+        with mock.patch('accounts.tokens.cache', other_cache):
+            self.assertNotIn(token['jti'], other)
+        with self.captureOnCommitCallbacks(execute=True):
+            token.blacklist()
+
+        with mock.patch('accounts.tokens.cache', other_cache):
+            with self.assertNumQueries(0):
+                self.assertNotIn(token['jti'], other)
+            with override_settings(TOKEN_BLACKLIST_SYNC_INTERVAL=0):
+                self.assertIn(token['jti'], other)
+
+    def test_expired_tokens_are_flushed(self):
+        BlacklistedToken.objects.create(jti='expired', expires_at=timezone.now() - timedelta(seconds=1))
+        BlacklistRefreshToken(self.refresh).blacklist()
+        call_command('flushexpiredtokens', stdout=StringIO())
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        blacklist.reset()
+        self.factory = AsyncRequestFactory()
+        self.user = User.objects.create_user(email='hr@email.com', password='password', is_active=True)
+        self.user.groups.add(Group.objects.create(name='HR'))
+
+    def post(self, view, data=None, cookies=None, **kwargs):
+        request = self.factory.post('/', data or {}, content_type='application/json', **kwargs)
+        request.COOKIES.update(cookies or {})
+        return view(request)
+
+    async def test_login_refresh_and_logout(self):
+        response = await self.post(async_views.login, {'email': 'hr@email.com', 'password': 'password'})
+        self.assertEqual(response.status_code, 200)
+        access, refresh = response.cookies['access'].value, response.cookies['refresh'].value
+        csrf_token = response.cookies['csrftoken'].value
+        self.assertEqual(json.loads(response.content), {'access': access, 'csrf_token': csrf_token})
+        self.assertEqual(BlacklistRefreshToken(refresh, verify=False)['groups'], ['HR'])
+        self.assertIsNotNone((await User.objects.aget(pk=self.user.pk)).last_login)
+
+        response = await self.post(async_views.refresh, cookies={'refresh': refresh})
+        self.assertEqual(response.status_code, 200)
+        rotated = response.cookies['refresh'].value
+        self.assertEqual((await self.post(async_views.refresh, {'refresh': refresh})).status_code, 401)
+
+        response = await self.post(
+            async_views.logout, cookies={'refresh': rotated}, headers={'Authorization': f'JWT {access}'}
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual((await self.post(async_views.refresh, {'refresh': rotated})).status_code, 401)
+        self.assertEqual((await self.post(async_views.verify, {'token': access})).status_code, 200)
+
+    async def test_invalid_requests_are_refused(self):
+        response = await self.post(async_views.login, {'email': 'hr@email.com', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 401)
+        response = await self.post(async_views.login, {'email': 'hr@email.com'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', json.loads(response.content))
+        self.assertEqual((await self.post(async_views.verify, {'token': 'invalid'})).status_code, 401)
+        self.assertEqual((await self.post(async_views.logout)).status_code, 401)
+
+
+class LoginTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='hr@email.com', password='password', is_active=True)
+        self.client = APIClient(SERVER_NAME='localhost')
+
+    def login(self, password='password'):
+        return self.client.post('/accounts/login/', {'email': 'hr@email.com', 'password': password})
+
+    @override_settings(PASSWORD_HASHERS=[
+        'accounts.hashers.Argon2PasswordHasher', 'django.contrib.auth.hashers.MD5PasswordHasher',
+    ])
+    def test_password_is_rehashed_on_login(self):
+        self.user.password = make_password('password', hasher='md5')
+        self.user.save()
+        self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('argon2$argon2id$v=19$m=19456,t=2,p=1$'))
+        self.assertEqual(self.login().status_code, 200)
+
+    @override_settings(LOGIN_FAILURE_LIMIT=2)
+    def test_passwords_are_not_checked_after_failed_logins(self):
+        self.assertEqual(self.login('wrong').status_code, 401)
+        self.assertEqual(self.login().status_code, 200)
+        # A successful login resets the count
+        self.assertEqual(self.login('wrong').status_code, 401)
+        self.assertEqual(self.login('wrong').status_code, 401)
+
+        with mock.patch.object(User, 'check_password') as check_password:
+            self.assertEqual(self.login().status_code, 401)
+        check_password.assert_not_called()
+        # Other emails from the address are still checked
+        self.assertEqual(
+            self.client.post('/accounts/login/', {'email': 'other@email.com', 'password': 'password'}).status_code,
+            401,
+        )
+
+    @override_settings(LOGIN_FAILURE_ADDRESS_LIMIT=2)
+    def test_addresses_are_guarded(self):
+        for index in range(2):
+            self.client.post('/accounts/login/', {'email': f'user{index}@email.com', 'password': 'password'})
+        with mock.patch.object(User, 'check_password') as check_password:
+            self.assertEqual(self.login().status_code, 401)
+        check_password.assert_not_called()
+
+    @override_settings(LOGIN_FAILURE_ADDRESS_LIMIT=2)
+    def test_forwarded_addresses_do_not_reset_the_count(self):
+        for index in range(2):
+            self.client.post(
+                '/accounts/login/', {'email': f'user{index}@email.com', 'password': 'password'},
+                HTTP_X_FORWARDED_FOR=f'10.0.0.{index}',
+            )
+        with mock.patch.object(User, 'check_password') as check_password:
+            response = self.client.post(
+                '/accounts/login/', {'email': 'hr@email.com', 'password': 'password'},
+                HTTP_X_FORWARDED_FOR='10.0.0.9',
+            )
+        self.assertEqual(response.status_code, 401)
+        check_password.assert_not_called()
+
+
+class CookieCsrfTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(email='hr@email.com', password='password', is_active=True)
+        self.client = APIClient(SERVER_NAME='localhost')
+        response = self.client.post('/accounts/login/', {'email': 'hr@email.com', 'password': 'password'})
+        self.csrf_token = response.data['csrf_token']
+        self.access = response.data['access']
+
+    def test_login_sets_the_csrf_cookie(self):
+        self.assertEqual(self.client.cookies['csrftoken'].value, self.csrf_token)
+        self.assertFalse(self.client.cookies['csrftoken']['httponly'])
+        response = self.client.post('/accounts/refresh/')
+        self.assertEqual(response.data['csrf_token'], self.csrf_token)
+
+    def test_cookie_authenticated_requests_repeat_the_token(self):
+        self.assertEqual(self.client.get('/accounts/users/me/').status_code, 200)
+        self.assertEqual(self.client.post('/accounts/logout/').status_code, 403)
+        self.assertEqual(self.client.post('/accounts/logout/', HTTP_X_CSRFTOKEN='wrong').status_code, 403)
+        self.assertEqual(self.client.post('/accounts/logout/', HTTP_X_CSRFTOKEN=self.csrf_token).status_code, 204)
+
+    def test_header_authenticated_requests_are_not_checked(self):
+        client = APIClient(SERVER_NAME='localhost', HTTP_AUTHORIZATION=f'JWT {self.access}')
+        self.assertEqual(client.post('/accounts/logout/').status_code, 204)
+
+    def test_api_paths_skip_sessions(self):
+        factory = RequestFactory()
+        middleware = SessionMiddleware(lambda request: HttpResponse())
+        api_request, admin_request = factory.get('/accounts/users/'), factory.get('/admin/')
+        middleware(api_request)
+        middleware(admin_request)
+        self.assertFalse(hasattr(api_request, 'session'))
+        self.assertTrue(hasattr(admin_request, 'session'))
+
+
+class ThrottleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        buckets.reset()
+        User.objects.create_user(email='hr@email.com', password='password', is_active=True)
+
+    def login(self, address='127.0.0.1'):
+        return APIClient(SERVER_NAME='localhost', REMOTE_ADDR=address).post(
+            '/accounts/login/', {'email': 'hr@email.com', 'password': 'password'}
+        )
+
+    def test_logins_are_throttled_per_address(self):
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'login': '2/min'}}):
+            self.assertEqual(self.login().status_code, 200)
+            self.assertEqual(self.login().status_code, 200)
+            response = self.login()
+            self.assertEqual(response.status_code, 429)
+            self.assertLessEqual(int(response['Retry-After']), 30)
+            self.assertEqual(self.login('10.0.0.1').status_code, 200)
+
+    def test_forwarded_addresses_are_not_trusted(self):
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'login': '1/min'}}):
+            self.assertEqual(self.login().status_code, 200)
+            response = APIClient(SERVER_NAME='localhost', HTTP_X_FORWARDED_FOR='10.0.0.9').post(
+                '/accounts/login/', {'email': 'hr@email.com', 'password': 'password'}
+            )
+            self.assertEqual(response.status_code, 429)
+
+    def test_requests_are_counted_without_the_cache(self):
+        with mock.patch('accounts.throttling.cache') as throttle_cache:
+            for run in range(10):
+                self.assertTrue(buckets.take('key', 10, 60)[0])
+            self.assertFalse(buckets.take('key', 10, 60)[0])
+        self.assertEqual(throttle_cache.method_calls, [])
+
+    @override_settings(THROTTLE_SYNC_INTERVAL=0)
+    def test_counts_are_shared_through_the_cache(self):
+        # Share the test cache, as processes share the cache of REDIS_URL
+        first, second = TokenBuckets(), TokenBuckets()
+        self.assertTrue(first.take('key', 2, 3600)[0])
+        self.assertTrue(second.take('key', 2, 3600)[0])
+        # Both processes allowed the rate
+        allowed, wait = second.take('key', 2, 3600)
+        self.assertFalse(allowed)
+        self.assertGreater(wait, 0)
+
+
+class CreateEmployeeUserTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.employee_group = Group.objects.create(name='Employee')
+
+    def test_group_id_is_cached(self):
+        User.objects.create_employee_user(email='first@email.com')
+        with self.assertNumQueries(2):
+            user = User.objects.create_employee_user(email='second@email.com')
+        self.assertEqual(list(user.groups.all()), [self.employee_group])
+        self.assertFalse(user.has_usable_password())
+
+    def test_group_changes_clear_the_cache(self):
+        User.objects.create_employee_user(email='first@email.com')
+        self.employee_group.delete()
+        employee_group = Group.objects.create(name='Employee')
+        user = User.objects.create_employee_user(email='second@email.com')
+        self.assertEqual(list(user.groups.all()), [employee_group])
+
+    def test_group_ids_expire(self):
+        User.objects.create_employee_user(email='first@email.com')
+        # Changed by another process, whose signals leave this cache alone
+        with mock.patch('accounts.signals.clear_group_ids'):
+            self.employee_group.delete()
+            employee_group = Group.objects.create(name='Employee')
+        later = time.time() + settings.USER_GROUPS_CACHE_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            user = User.objects.create_employee_user(email='second@email.com')
+        self.assertEqual(list(user.groups.all()), [employee_group])
+
+
+class BenchmarkCommandTest(TestCase):
+    def test_results_can_be_compared(self):
+        output = os.path.join(tempfile.mkdtemp(), 'results.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        call_command('benchmark', 'login', 'token_refresh', repeat=2, output=output, stdout=StringIO())
+        with open(output) as file:
+            results = json.load(file)
+        self.assertEqual(results['environment']['database'], 'sqlite')
+        self.assertEqual(set(results['benchmarks']), {'login', 'token_refresh'})
+        self.assertEqual(results['benchmarks']['login']['login']['runs'], 2)
+        self.assertIn('peak_memory_kib', results['benchmarks']['login']['login'])
+
+        stdout = StringIO()
+        call_command('benchmark', 'login', repeat=2, compare=output, stdout=stdout)
+        self.assertIn('login.login: median', stdout.getvalue())
+        # Every benchmark is rolled back
+        self.assertFalse(User.objects.exists())
+
+    def test_department_writes(self):
+        # More runs than single digit codes
+        call_command('benchmark', 'department_writes', repeat=40, stdout=StringIO())
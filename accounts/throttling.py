@@ -0,0 +1,152 @@
+"""
+Throttles of the login, password reset and invite endpoints. DRF's throttles
+read and write the cache on every request; these count requests in token
+buckets kept by each process, and add the requests each process allowed to
+a count in the cache every THROTTLE_SYNC_INTERVAL seconds, so a client is
+limited across processes without a cache round-trip per request.
+
+The counts are only shared when the cache is, see CACHES and REDIS_URL in
+core/settings.py. With the local memory cache each process allows the full
+rate on its own.
+"""
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class Bucket:
+    __slots__ = ('tokens', 'updated', 'pending', 'blocked_until', 'num_requests', 'duration')
+
+    def __init__(self, num_requests, duration, now):
+        self.tokens = num_requests
+        self.updated = now
+        # Requests allowed since the last sync
+        self.pending = 0
+        # The end of the period a client used up across processes
+        self.blocked_until = 0
+        self.num_requests = num_requests
+        self.duration = duration
+
+    def refill(self, now):
+        self.tokens = min(self.num_requests, self.tokens + (now - self.updated) * self.num_requests / self.duration)
+        self.updated = now
+
+
+class TokenBuckets:
+    """
+    The token buckets of the clients throttled by this process, by throttle
+    key. The counts in the cache are per period of the rate, so a client is
+    refused everywhere once the processes together allowed the rate within a
+    period, at most THROTTLE_SYNC_INTERVAL seconds late.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.buckets = {}
+            self.synced_at = time.time()
+
+    def take(self, key, num_requests, duration):
+        "Takes a token from the bucket of `key`, returning whether one was left and else the seconds to wait."
+        now = time.time()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None or (bucket.num_requests, bucket.duration) != (num_requests, duration):
+                bucket = self.buckets[key] = Bucket(num_requests, duration, now)
+            bucket.refill(now)
+            if now < bucket.blocked_until:
+                allowed, wait = False, bucket.blocked_until - now
+            elif bucket.tokens >= 1:
+                bucket.tokens -= 1
+                bucket.pending += 1
+                allowed, wait = True, None
+            else:
+                allowed, wait = False, (1 - bucket.tokens) * duration / num_requests
+
+            batch = None
+            if now >= self.synced_at + settings.THROTTLE_SYNC_INTERVAL:
+                self.synced_at = now
+                batch = self.get_batch(now)
+        if batch:
+            self.sync(batch, now)
+        return allowed, wait
+
+    def get_batch(self, now):
+        "Returns the pending counts to add to the cache, dropping the buckets of idle clients."
+        batch = []
+        for key, bucket in list(self.buckets.items()):
+            if bucket.pending:
+                batch.append((key, bucket.pending, bucket.num_requests, bucket.duration))
+                bucket.pending = 0
+            elif now >= bucket.blocked_until and now - bucket.updated >= bucket.duration:
+                del self.buckets[key]
+        return batch
+
+    def sync(self, batch, now):
+        for key, pending, num_requests, duration in batch:
+            period = int(now // duration)
+            shared_key = f'{key}:{period}'
+            cache.add(shared_key, 0, duration)
+            try:
+                total = cache.incr(shared_key, pending)
+            except ValueError:
+                # Expired since it was added, the period is over
+                continue
+            if total >= num_requests:
+                with self.lock:
+                    bucket = self.buckets.get(key)
+                    if bucket is not None:
+                        bucket.tokens = 0
+                        bucket.blocked_until = (period + 1) * duration
+
+
+buckets = TokenBuckets()
+
+
+class BucketRateThrottle(SimpleRateThrottle):
+    "A SimpleRateThrottle counting requests in the process' token buckets."
+
+    def get_rate(self):
+        # Read on each request, as SimpleRateThrottle.THROTTLE_RATES is read on import
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        allowed, self.wait_time = buckets.take(self.key, self.num_requests, self.duration)
+        return allowed
+
+    def wait(self):
+        return self.wait_time
+
+
+class AddressRateThrottle(BucketRateThrottle):
+    "Limits the requests from a client address."
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginRateThrottle(AddressRateThrottle):
+    scope = 'login'
+
+
+class PasswordResetRateThrottle(AddressRateThrottle):
+    scope = 'password_reset'
+
+
+class InviteRateThrottle(BucketRateThrottle):
+    "Limits the invitations sent by a user."
+    scope = 'invite'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': request.user.pk}
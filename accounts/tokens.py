@@ -0,0 +1,248 @@
+"""
+Refresh token revocation. Revoked tokens are stored as BlacklistedToken rows,
+and each process answers blacklist lookups from a bloom filter of them, so
+refreshing a valid token does not query the blacklist. Bloom filter hits are
+confirmed against the database and remembered in a bounded LRU.
+
+Processes learn about tokens revoked elsewhere through a version kept in the
+shared cache: when it changes, the rows created since the last sync are
+loaded. They also sync every TOKEN_BLACKLIST_SYNC_INTERVAL seconds, so a
+revocation the cache missed is seen late rather than never.
+Tokens replaced by refresh rotation are only stored: the unique jti makes
+blacklisting them a second time fail, which rejects the replayed token
+without growing the bloom filters or syncing every process on each refresh.
+"""
+import hashlib
+import math
+import threading
+import uuid
+from asgiref.sync import sync_to_async
+from collections import OrderedDict
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+from .models import BlacklistedToken
+
+
+BLACKLIST_VERSION_KEY = 'accounts:token-blacklist:version'
+
+
+class BloomFilter:
+    "A set of strings answering membership with false positives at `error_rate`."
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(math.ceil(self.size / 8))
+        self.count = 0
+
+    def get_positions(self, key):
+        # Double hashing from one digest, see Kirsch and Mitzenmacher
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big')
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.get_positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.get_positions(key))
+
+
+class TokenBlacklist:
+    """
+    The process-local front of the BlacklistedToken table. The bloom filter
+    is rebuilt from the unexpired rows once it holds more tokens than
+    TOKEN_BLACKLIST_CAPACITY.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.bloom = None
+            self.version = None
+            self.synced_at = None
+            # Confirmed answers for bloom filter hits, by jti
+            self.confirmed = OrderedDict()
+
+    def add_loaded(self, bloom, jtis):
+        for jti in jtis:
+            bloom.add(jti)
+            self.remember(jti, True)
+        self.bloom = bloom
+
+    def remember(self, jti, blacklisted):
+        self.confirmed[jti] = blacklisted
+        self.confirmed.move_to_end(jti)
+        while len(self.confirmed) > settings.TOKEN_BLACKLIST_LRU_SIZE:
+            self.confirmed.popitem(last=False)
+
+    def is_synced(self, version, now):
+        return (
+            self.bloom is not None and self.bloom.count <= self.bloom.capacity and version == self.version
+            and now - self.synced_at < timedelta(seconds=settings.TOKEN_BLACKLIST_SYNC_INTERVAL)
+        )
+
+    def get_sync_rows(self, now):
+        "Returns the bloom filter to load into, new when none is usable, and the jtis to load."
+        rows = BlacklistedToken.objects.filter(expires_at__gt=now, rotated=False).values_list('jti', flat=True)
+        if self.bloom is None or self.bloom.count > self.bloom.capacity:
+            return BloomFilter(settings.TOKEN_BLACKLIST_CAPACITY, settings.TOKEN_BLACKLIST_ERROR_RATE), rows
+        # Rows committed late may have been created before the last sync
+        margin = timedelta(seconds=settings.TOKEN_BLACKLIST_SYNC_MARGIN)
+        return self.bloom, rows.filter(created_at__gte=self.synced_at - margin)
+
+    def load_changes(self):
+        version = cache.get(BLACKLIST_VERSION_KEY)
+        if version is None:
+            # Lost from the cache, start a new one so processes sync once more
+            cache.add(BLACKLIST_VERSION_KEY, uuid.uuid4().hex, None)
+            version = cache.get(BLACKLIST_VERSION_KEY)
+
+        with self.lock:
+            now = timezone.now()
+            if self.is_synced(version, now):
+                return
+            bloom, rows = self.get_sync_rows(now)
+            self.add_loaded(bloom, rows.iterator())
+            self.version = version
+            self.synced_at = now
+
+    async def aload_changes(self):
+        "See load_changes(). The lock is not held across the query, a concurrent sync loads the same rows."
+        version = await cache.aget(BLACKLIST_VERSION_KEY)
+        if version is None:
+            await cache.aadd(BLACKLIST_VERSION_KEY, uuid.uuid4().hex, None)
+            version = await cache.aget(BLACKLIST_VERSION_KEY)
+
+        with self.lock:
+            now = timezone.now()
+            if self.is_synced(version, now):
+                return
+            bloom, rows = self.get_sync_rows(now)
+        jtis = [jti async for jti in rows]
+        with self.lock:
+            self.add_loaded(bloom, jtis)
+            self.version = version
+            self.synced_at = now
+
+    def __contains__(self, jti):
+        self.load_changes()
+        with self.lock:
+            if jti not in self.bloom:
+                return False
+            blacklisted = self.confirmed.get(jti)
+            if blacklisted is not None:
+                self.confirmed.move_to_end(jti)
+                return blacklisted
+
+        blacklisted = BlacklistedToken.objects.filter(jti=jti).exists()
+        with self.lock:
+            self.remember(jti, blacklisted)
+        return blacklisted
+
+    async def acontains(self, jti):
+        "See __contains__()."
+        await self.aload_changes()
+        with self.lock:
+            if jti not in self.bloom:
+                return False
+            blacklisted = self.confirmed.get(jti)
+            if blacklisted is not None:
+                self.confirmed.move_to_end(jti)
+                return blacklisted
+
+        blacklisted = await BlacklistedToken.objects.filter(jti=jti).aexists()
+        with self.lock:
+            self.remember(jti, blacklisted)
+        return blacklisted
+
+    def create_entry(self, jti, user_id, expires_at, rotated):
+        # In a savepoint, so a duplicate leaves an outer transaction usable
+        with transaction.atomic():
+            BlacklistedToken.objects.create(jti=jti, user_id=user_id, expires_at=expires_at, rotated=rotated)
+
+    def add(self, jti, user_id, expires_at, rotated=False):
+        """
+        Blacklists a token, raising TokenError when it already was, so a
+        token is rotated at most once even by concurrent requests.
+        """
+        try:
+            self.create_entry(jti, user_id, expires_at, rotated)
+        except IntegrityError:
+            raise TokenError(_("Token is blacklisted"))
+        if rotated:
+            return
+
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+            self.remember(jti, True)
+        transaction.on_commit(lambda: cache.set(BLACKLIST_VERSION_KEY, uuid.uuid4().hex, None))
+
+    async def aadd(self, jti, user_id, expires_at, rotated=False):
+        "See add(). Async views run in autocommit, so the row is committed when created."
+        try:
+            await sync_to_async(self.create_entry)(jti, user_id, expires_at, rotated)
+        except IntegrityError:
+            raise TokenError(_("Token is blacklisted"))
+        if rotated:
+            return
+
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+            self.remember(jti, True)
+        await cache.aset(BLACKLIST_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+blacklist = TokenBlacklist()
+
+
+class BlacklistRefreshToken(RefreshToken):
+    "A refresh token checked against the blacklist when it is verified."
+
+    def verify(self, *args, **kwargs):
+        super().verify(*args, **kwargs)
+        if self.payload[api_settings.JTI_CLAIM] in blacklist:
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self, rotated=False):
+        blacklist.add(*get_blacklist_entry(self), rotated)
+
+
+def get_blacklist_entry(token):
+    "Returns the jti, user id and expiry a refresh token is blacklisted with."
+    return (
+        token.payload[api_settings.JTI_CLAIM],
+        token.payload.get(api_settings.USER_ID_CLAIM),
+        datetime_from_epoch(token.payload['exp']),
+    )
+
+
+async def averify_refresh_token(raw_token):
+    """
+    Returns the refresh token after the checks BlacklistRefreshToken makes
+    on creation, with the blacklist looked up asynchronously.
+    """
+    token = RefreshToken(raw_token)
+    if await blacklist.acontains(token[api_settings.JTI_CLAIM]):
+        raise TokenError(_("Token is blacklisted"))
+    return token
+
+async def ablacklist_token(token, rotated=False):
+    "See BlacklistRefreshToken.blacklist()."
+    await blacklist.aadd(*get_blacklist_entry(token), rotated)
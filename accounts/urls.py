@@ -1,5 +1,7 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import UserViewSet, CustomTokenObtainPairView, CustomTokenRefreshView, CustomTokenVerifyView, LogoutView
 
 router = DefaultRouter()
@@ -7,10 +9,21 @@ router.register("users", UserViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('login/', CustomTokenObtainPairView.as_view(), name='login'),
-    path('refresh/', CustomTokenRefreshView.as_view(), name='refresh'),
-    path('verify/', CustomTokenVerifyView.as_view(), name='verify'),
-    path('logout/', LogoutView.as_view(), name='logout'),
 ]
 
+if settings.ASYNC_VIEWS:
+    urlpatterns += [
+        path('login/', async_views.login, name='login'),
+        path('refresh/', async_views.refresh, name='refresh'),
+        path('verify/', async_views.verify, name='verify'),
+        path('logout/', async_views.logout, name='logout'),
+    ]
+else:
+    urlpatterns += [
+        path('login/', CustomTokenObtainPairView.as_view(), name='login'),
+        path('refresh/', CustomTokenRefreshView.as_view(), name='refresh'),
+        path('verify/', CustomTokenVerifyView.as_view(), name='verify'),
+        path('logout/', LogoutView.as_view(), name='logout'),
+    ]
+
 
@@ -0,0 +1,166 @@
+"""
+A read-only serialization path for list endpoints. ValuesSerializer renders
+the same output as a ModelSerializer from `values()` rows, with the fields
+mapped to lookups and converters once per class instead of walking the
+serializer's fields for every instance.
+"""
+from collections import defaultdict
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.response import Response
+
+
+def identity(value):
+    return value
+
+# Fields whose output is the database value itself
+IDENTITY_FIELDS = (
+    serializers.CharField, serializers.IntegerField, serializers.BooleanField,
+    serializers.ChoiceField, serializers.ReadOnlyField, serializers.ModelField,
+    serializers.SlugRelatedField, serializers.PrimaryKeyRelatedField,
+)
+
+
+class ValuesSerializer:
+    """
+    Renders `serializer_class` output from values() rows. Supports scalar
+    fields, slug and primary key relations, nested serializers, file fields
+    and fields whose to_representation takes the stored value. Many-related
+    slug fields are loaded with one query per field for all rows.
+    """
+    serializer_class = None
+
+    def __init__(self, queryset, context=None):
+        self.queryset = queryset
+        self.context = context or {}
+
+    @classmethod
+    def get_mapping(cls):
+        # Computed once per class, serializer fields are the same for every request
+        if '_mapping' not in cls.__dict__:
+            cls._mapping = cls.build_mapping(cls.serializer_class(), cls.serializer_class.Meta.model)
+        return cls._mapping
+
+    @classmethod
+    def build_mapping(cls, serializer, model, prefix=''):
+        """
+        Returns (name, kind, lookup, convert) tuples for the readable fields
+        of the serializer, where kind is 'value', 'file', 'many' or 'nested'.
+        `convert` is the model field of file fields and the mapping of nested
+        serializers.
+        """
+        mapping = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or isinstance(field, serializers.SerializerMethodField):
+                raise ImproperlyConfigured(f"{cls.__name__} cannot render {type(field).__name__} {name!r}.")
+            lookup = prefix + field.source.replace('.', '__')
+
+            if isinstance(field, serializers.ManyRelatedField):
+                child = field.child_relation
+                slug = getattr(child, 'slug_field', 'pk')
+                mapping.append((name, 'many', f'{lookup}__{slug}', identity))
+            elif isinstance(field, serializers.BaseSerializer):
+                related_model = model._meta.get_field(field.source).related_model
+                mapping.append((name, 'nested', None, cls.build_mapping(field, related_model, f'{lookup}__')))
+            elif isinstance(field, serializers.SlugRelatedField):
+                mapping.append((name, 'value', f'{lookup}__{field.slug_field}', identity))
+            elif isinstance(field, serializers.FileField):
+                mapping.append((name, 'file', lookup, model._meta.get_field(field.source)))
+            elif isinstance(field, IDENTITY_FIELDS):
+                mapping.append((name, 'value', lookup, identity))
+            else:
+                mapping.append((name, 'value', lookup, field.to_representation))
+        return mapping
+
+    @classmethod
+    def get_lookups(cls, mapping=None):
+        lookups = []
+        for name, kind, lookup, convert in mapping or cls.get_mapping():
+            if kind in ('value', 'file'):
+                lookups.append(lookup)
+            elif kind == 'nested':
+                lookups += cls.get_lookups(convert)
+        return lookups
+
+    @classmethod
+    def get_many_lookups(cls, mapping=None):
+        lookups = []
+        for name, kind, lookup, convert in mapping or cls.get_mapping():
+            if kind == 'many':
+                lookups.append(lookup)
+            elif kind == 'nested':
+                lookups += cls.get_many_lookups(convert)
+        return lookups
+
+    def get_values(self, queryset, *extra):
+        "Returns the values() queryset the rows are read from, with `extra` lookups."
+        lookups = dict.fromkeys(['pk', *self.get_lookups(), *extra])
+        return queryset.prefetch_related(None).values(*lookups)
+
+    def load_many(self, rows):
+        "Loads the many-related values of the rows, keyed by lookup and row pk."
+        pks = [row['pk'] for row in rows]
+        values = {}
+        for lookup in self.get_many_lookups():
+            values[lookup] = defaultdict(list)
+            for pk, value in self.queryset.model._default_manager.filter(pk__in=pks).values_list('pk', lookup):
+                if value is not None:
+                    values[lookup][pk].append(value)
+        return values
+
+    def render(self, row, mapping, many, request):
+        data = {}
+        for name, kind, lookup, convert in mapping:
+            if kind == 'value':
+                value = row[lookup]
+                data[name] = None if value is None else convert(value)
+            elif kind == 'file':
+                # As serializers.FileField renders URLs
+                url = convert.storage.url(row[lookup]) if row[lookup] else None
+                data[name] = request.build_absolute_uri(url) if url and request is not None else url
+            elif kind == 'many':
+                data[name] = many[lookup][row['pk']]
+            else:
+                data[name] = self.render(row, convert, many, request)
+        return data
+
+    def to_representation(self, rows):
+        rows = list(rows)
+        many = self.load_many(rows)
+        request = self.context.get('request')
+        mapping = self.get_mapping()
+        return [self.render(row, mapping, many, request) for row in rows]
+
+    @property
+    def data(self):
+        return self.to_representation(self.get_values(self.queryset))
+
+
+class ValuesListMixin:
+    """
+    Serves a viewset's list action through `values_serializer_class`, a
+    ValuesSerializer, when one is set.
+    """
+    values_serializer_class = None
+
+    def get_values_serializer(self, queryset):
+        return self.values_serializer_class(queryset, context=self.get_serializer_context())
+
+    def list(self, request, *args, **kwargs):
+        if self.values_serializer_class is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_values_serializer(queryset)
+        ordering = []
+        if self.paginator is not None:
+            # Cursor positions are read from the rows
+            ordering = [field.lstrip('-') for field in self.paginator.get_ordering(request, queryset, self)]
+        rows = serializer.get_values(queryset, *ordering)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation(page))
+        return Response(serializer.to_representation(rows))
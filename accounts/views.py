@@ -12,9 +12,15 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAdminUser
 from drf_spectacular.utils import extend_schema
 from djoser.conf import settings as djoser_settings
+from core.metrics import MetricsMixin
+from rest_framework_simplejwt.exceptions import TokenError
+from .authentication import get_csrf_token, revoke_user_tokens
+from .throttling import LoginRateThrottle, PasswordResetRateThrottle
+from .tokens import BlacklistRefreshToken
 
 
-class UserViewSet(DjoserUserViewSet):
+class UserViewSet(MetricsMixin, DjoserUserViewSet):
+    ordering = 'id'
 
     def get_permissions(self):
         if self.action == "create":
@@ -45,9 +51,15 @@ class UserViewSet(DjoserUserViewSet):
 
         return [permission() for permission in self.permission_classes]
 
+    def get_throttles(self):
+        if self.action == "reset_password":
+            return [PasswordResetRateThrottle()]
+        return super().get_throttles()
+
     def perform_destroy(self, instance):
         instance.is_active = False
         instance.save()
+        revoke_user_tokens([instance.pk])
     
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -70,7 +82,33 @@ class UserViewSet(DjoserUserViewSet):
 
 
 
+def set_auth_cookie(response, name, token, max_age):
+    response.set_cookie(
+        name,
+        token,
+        max_age=max_age,
+        path=settings.AUTH_COOKIE_PATH,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=settings.SESSION_COOKIE_HTTPONLY,
+        samesite=settings.AUTH_COOKIE_SAMESITE
+    )
+
+def set_csrf_cookie(response, token):
+    # Read by clients to send it back in the X-CSRFToken header, see accounts.authentication.enforce_csrf
+    response.set_cookie(
+        settings.CSRF_COOKIE_NAME,
+        token,
+        max_age=settings.AUTH_COOKIE_REFRESH_MAX_AGE,
+        domain=settings.CSRF_COOKIE_DOMAIN,
+        path=settings.CSRF_COOKIE_PATH,
+        secure=settings.CSRF_COOKIE_SECURE,
+        httponly=False,
+        samesite=settings.AUTH_COOKIE_SAMESITE
+    )
+
 class CustomTokenObtainPairView(TokenObtainPairView):
+    throttle_classes = [LoginRateThrottle]
+
     def post(self, request, *args, **kwargs):
         response = super().post(request, *args, **kwargs)
 
@@ -78,29 +116,17 @@ class CustomTokenObtainPairView(TokenObtainPairView):
             access_token = response.data.get('access')
             refresh_token = response.data.get('refresh')
 
-            response.set_cookie(
-                'access',
-                access_token,
-                max_age=settings.AUTH_COOKIE_ACCESS_MAX_AGE,
-                path=settings.AUTH_COOKIE_PATH,
-                secure=settings.SESSION_COOKIE_SECURE,
-                httponly=settings.SESSION_COOKIE_HTTPONLY,
-                samesite=settings.AUTH_COOKIE_SAMESITE
-            )
-            response.set_cookie(
-                'refresh',
-                refresh_token,
-                max_age=settings.AUTH_COOKIE_REFRESH_MAX_AGE,
-                path=settings.AUTH_COOKIE_PATH,
-                secure=settings.SESSION_COOKIE_SECURE,
-                httponly=settings.SESSION_COOKIE_HTTPONLY,
-                samesite=settings.AUTH_COOKIE_SAMESITE
-            )
+            # A new CSRF token for each login, returned for clients on other origins
+            csrf_token = get_csrf_token(request, rotate=True)
+
+            set_auth_cookie(response, 'access', access_token, settings.AUTH_COOKIE_ACCESS_MAX_AGE)
+            set_auth_cookie(response, 'refresh', refresh_token, settings.AUTH_COOKIE_REFRESH_MAX_AGE)
+            set_csrf_cookie(response, csrf_token)
 
             # Remove refresh token from response
             del response.data['refresh']
             # Return response with only access token
-            response.data = {'access': access_token}
+            response.data = {'access': access_token, 'csrf_token': csrf_token}
         
         return response
 
@@ -115,16 +141,15 @@ class CustomTokenRefreshView(TokenRefreshView):
 
         if response.status_code == 200:
             access_token = response.data.get('access')
+            csrf_token = get_csrf_token(request)
 
-            response.set_cookie(
-                'access',
-                access_token,
-                max_age=settings.AUTH_COOKIE_ACCESS_MAX_AGE,
-                path=settings.AUTH_COOKIE_PATH,
-                secure=settings.SESSION_COOKIE_SECURE,
-                httponly=settings.SESSION_COOKIE_HTTPONLY,
-                samesite=settings.AUTH_COOKIE_SAMESITE
-            )
+            set_auth_cookie(response, 'access', access_token, settings.AUTH_COOKIE_ACCESS_MAX_AGE)
+            set_csrf_cookie(response, csrf_token)
+
+            # Rotated refresh token, kept out of the response as on login
+            if 'refresh' in response.data:
+                set_auth_cookie(response, 'refresh', response.data['refresh'], settings.AUTH_COOKIE_REFRESH_MAX_AGE)
+            response.data = {'access': access_token, 'csrf_token': csrf_token}
 
         return response
 
@@ -144,6 +169,14 @@ class CustomTokenVerifyView(TokenVerifyView):
 )
 class LogoutView(APIView):
     def post(self, request, *args, **kwargs):
+        refresh_token = request.COOKIES.get('refresh') or request.data.get('refresh')
+        if refresh_token:
+            try:
+                BlacklistRefreshToken(refresh_token).blacklist()
+            except TokenError:
+                # Already invalid, there is nothing to revoke
+                pass
+
         response = Response(status=status.HTTP_204_NO_CONTENT)
         response.delete_cookie('access')
         response.delete_cookie('refresh')
@@ -2,6 +2,9 @@
 ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+With ASYNC_VIEWS enabled, serve it with the uvicorn worker class of gunicorn:
+
+    gunicorn core.asgi:application -k uvicorn.workers.UvicornWorker
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -0,0 +1,260 @@
+"""
+Per-endpoint request metrics. MetricsMiddleware records the latency, database
+queries and database time of every request, labelled by view and action,
+MetricsMixin adds the time DRF views spend serializing and rendering, and
+MetricsView exposes the totals in the Prometheus text format.
+
+Metrics are kept per process, so each worker reports its own totals, as
+Prometheus expects when scraping workers separately.
+"""
+import heapq
+import logging
+import threading
+import time
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from drf_spectacular.utils import extend_schema
+from rest_framework.permissions import IsAdminUser
+from rest_framework.views import APIView
+
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetrics:
+    "Measurements of one request, set on the request as `request.metrics`."
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        # The slowest queries, as a heap of (duration, sql)
+        self.top_queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        # A database execute wrapper, see connection.execute_wrapper()
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.db_time += duration
+            if settings.METRICS_SLOW_REQUEST_QUERIES:
+                item = (duration, sql)
+                if len(self.top_queries) < settings.METRICS_SLOW_REQUEST_QUERIES:
+                    heapq.heappush(self.top_queries, item)
+                else:
+                    heapq.heappushpop(self.top_queries, item)
+
+
+class MetricsRegistry:
+    "Request totals of the process, by view, method and status."
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.series = {}
+
+    def record(self, labels, duration, metrics):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = {
+                    'requests': 0, 'duration': 0.0, 'queries': 0, 'db_time': 0.0, 'serialization_time': 0.0,
+                    'buckets': [0] * len(settings.METRICS_LATENCY_BUCKETS),
+                }
+            series['requests'] += 1
+            series['duration'] += duration
+            series['queries'] += metrics.queries
+            series['db_time'] += metrics.db_time
+            series['serialization_time'] += metrics.serialization_time
+            for index, bound in enumerate(settings.METRICS_LATENCY_BUCKETS):
+                if duration <= bound:
+                    series['buckets'][index] += 1
+
+    def render(self):
+        "Returns the totals in the Prometheus text exposition format."
+        with self.lock:
+            series = {labels: {**values, 'buckets': list(values['buckets'])} for labels, values in self.series.items()}
+
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+
+        def format_labels(labels, **extra):
+            names = dict(zip(('view', 'method', 'status'), labels), **extra)
+            return ','.join(f'{name}="{escape(str(value))}"' for name, value in names.items())
+
+        family('http_requests_total', 'counter', 'Requests handled.', [
+            f'http_requests_total{{{format_labels(labels)}}} {values["requests"]}'
+            for labels, values in series.items()
+        ])
+        duration_samples = []
+        for labels, values in series.items():
+            for bound, count in zip(settings.METRICS_LATENCY_BUCKETS, values['buckets']):
+                duration_samples.append(
+                    f'http_request_duration_seconds_bucket{{{format_labels(labels, le=bound)}}} {count}'
+                )
+            duration_samples += [
+                f'http_request_duration_seconds_bucket{{{format_labels(labels, le="+Inf")}}} {values["requests"]}',
+                f'http_request_duration_seconds_sum{{{format_labels(labels)}}} {format_value(values["duration"])}',
+                f'http_request_duration_seconds_count{{{format_labels(labels)}}} {values["requests"]}',
+            ]
+        family('http_request_duration_seconds', 'histogram', 'Request latency.', duration_samples)
+        for name, key, help_text in (
+            ('http_request_db_queries_total', 'queries', 'Database queries made by requests.'),
+            ('http_request_db_duration_seconds_total', 'db_time', 'Time requests spent in database queries.'),
+            (
+                'http_request_serialization_duration_seconds_total', 'serialization_time',
+                'Time DRF views spent serializing and rendering responses.',
+            ),
+        ):
+            family(name, 'counter', help_text, [
+                f'{name}{{{format_labels(labels)}}} {format_value(values[key])}'
+                for labels, values in series.items()
+            ])
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_value(value):
+    return f'{value:.6f}' if isinstance(value, float) else str(value)
+
+
+registry = MetricsRegistry()
+
+
+def get_view_label(view_func, method):
+    "Returns the label of a view: the viewset and action, the view class or the function name."
+    cls = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__qualname__}'
+    actions = getattr(view_func, 'actions', None)
+    if actions:
+        return f'{cls.__name__}.{actions.get(method.lower(), method.lower())}'
+    return f'{cls.__name__}.{method.lower()}'
+
+
+class MetricsMiddleware:
+    """
+    Records the metrics of every request in the registry, and logs requests
+    slower than METRICS_SLOW_REQUEST_THRESHOLD seconds with their slowest
+    queries. Place it first so the latency covers the other middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        request.metrics = metrics = RequestMetrics()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            self.wrap_connections(stack, metrics)
+            response = self.get_response(request)
+        self.record(request, response, metrics, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+
+        request.metrics = metrics = RequestMetrics()
+        start = time.perf_counter()
+        # The async ORM runs queries in the request's thread for sync code,
+        # whose connections are the ones to wrap
+        stack = ExitStack()
+        await sync_to_async(self.wrap_connections)(stack, metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.record(request, response, metrics, time.perf_counter() - start)
+        return response
+
+    def wrap_connections(self, stack, metrics):
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(metrics))
+
+    def record(self, request, response, metrics, duration):
+        resolver_match = getattr(request, 'resolver_match', None)
+        view = get_view_label(resolver_match.func, request.method) if resolver_match else 'unmatched'
+        registry.record((view, request.method, response.status_code), duration, metrics)
+        threshold = settings.METRICS_SLOW_REQUEST_THRESHOLD
+        if threshold is not None and duration >= threshold:
+            queries = ''.join(
+                f'\n  {query_duration * 1000:.1f} ms: {sql}'
+                for query_duration, sql in sorted(metrics.top_queries, reverse=True)
+            )
+            logger.warning(
+                f'Slow request {request.method} {request.path} ({view}): {duration * 1000:.1f} ms, '
+                f'{metrics.queries} queries in {metrics.db_time * 1000:.1f} ms, '
+                f'serialization {metrics.serialization_time * 1000:.1f} ms{queries}'
+            )
+
+
+class MetricsMixin:
+    """
+    Adds the time a DRF view spends in serializer to_representation and in
+    rendering its response to the request metrics.
+    """
+
+    def time_serialization(self, func):
+        metrics = getattr(self.request, 'metrics', None)
+        if metrics is None:
+            return func
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.serialization_time += time.perf_counter() - start
+        return timed
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        serializer.to_representation = self.time_serialization(serializer.to_representation)
+        return serializer
+
+    def get_values_serializer(self, *args, **kwargs):
+        # Only reached on viewsets using accounts.values.ValuesListMixin
+        serializer = super().get_values_serializer(*args, **kwargs)
+        serializer.to_representation = self.time_serialization(serializer.to_representation)
+        return serializer
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        renderer = getattr(response, 'accepted_renderer', None)
+        if renderer is not None:
+            renderer.render = self.time_serialization(renderer.render)
+        return response
+
+
+@extend_schema(exclude=True)
+class MetricsView(APIView):
+    "The request metrics of this process in the Prometheus text format."
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,81 @@
+"""
+Middleware replacing Django's and WhiteNoise's in MIDDLEWARE. Session,
+authentication, message and CSRF middleware are skipped for the paths of
+API_PATH_PREFIXES: their views authenticate with JWTs, see
+accounts.authentication, and use neither sessions nor messages.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import middleware as auth_middleware
+from django.contrib.messages import middleware as messages_middleware
+from django.contrib.sessions import middleware as sessions_middleware
+from django.middleware import csrf
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """
+    WhiteNoise's middleware, also usable in async mode. WhiteNoise only
+    supports sync mode, which makes Django run every request below it in a
+    thread under ASGI, async views included.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+def is_api_request(request):
+    return request.path_info.startswith(settings.API_PATH_PREFIXES)
+
+
+class APIPathMixin:
+    "Passes the requests of API paths straight to the next middleware."
+
+    def __call__(self, request):
+        if is_api_request(request):
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class SessionMiddleware(APIPathMixin, sessions_middleware.SessionMiddleware):
+    pass
+
+
+class AuthenticationMiddleware(APIPathMixin, auth_middleware.AuthenticationMiddleware):
+    pass
+
+
+class MessageMiddleware(APIPathMixin, messages_middleware.MessageMiddleware):
+    pass
+
+
+class CsrfViewMiddleware(APIPathMixin, csrf.CsrfViewMiddleware):
+    """
+    Django's CSRF checks for the admin and other session authenticated
+    views. Requests authenticated with the access cookie are checked by
+    accounts.authentication.enforce_csrf instead.
+    """
+
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        # Called for every request, whether __call__ skipped the middleware or not
+        if is_api_request(request):
+            return None
+        return super().process_view(request, callback, callback_args, callback_kwargs)
@@ -40,17 +40,22 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.WhiteNoiseMiddleware',
+    'core.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
+    'core.middleware.CsrfViewMiddleware',
+    'core.middleware.AuthenticationMiddleware',
+    'core.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Paths of the JWT authenticated API, skipped by the session, authentication,
+# message and CSRF middleware, see core.middleware
+API_PATH_PREFIXES = ('/accounts/', '/onboarding/', '/metrics')
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
@@ -87,6 +92,15 @@ DATABASES = {
     'default': dj_database_url.config(default=os.environ.get('DATABASE_URL'), conn_max_age=600)
 }
 
+# The cache shared by the processes serving the site, through which they see
+# each other's token revocations, throttle counts, group changes and response
+# invalidations. Set REDIS_URL (redis://host:6379/0) wherever more than one
+# process serves requests. The local memory default only reaches its own process.
+CACHES = {
+    'default': env.cache('REDIS_URL', default='locmemcache://'),
+}
+LOCAL_CACHE = CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache'
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -105,6 +119,27 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Hashers of new passwords: 'argon2' (accounts.hashers, about ten times the
+# logins per core of 'pbkdf2'), 'scrypt' or 'pbkdf2', Django's default. Hashes
+# of the other hashers are still accepted, and rehashed on login.
+PASSWORD_HASHER_POLICY = env('PASSWORD_HASHER_POLICY', default='argon2')
+PASSWORD_HASHER_POLICIES = {
+    'argon2': 'accounts.hashers.Argon2PasswordHasher',
+    'scrypt': 'accounts.hashers.ScryptPasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [PASSWORD_HASHER_POLICIES[PASSWORD_HASHER_POLICY]] + [
+    hasher for policy, hasher in PASSWORD_HASHER_POLICIES.items() if policy != PASSWORD_HASHER_POLICY
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+AUTHENTICATION_BACKENDS = ['accounts.backends.RateGuardedModelBackend']
+
+# Failed logins allowed per email, and per client address, within
+# LOGIN_FAILURE_WINDOW seconds before passwords are no longer checked
+LOGIN_FAILURE_LIMIT = 10
+LOGIN_FAILURE_ADDRESS_LIMIT = 100
+LOGIN_FAILURE_WINDOW = 60 * 5
+
 
 LANGUAGE_CODE = 'en-us'
 
@@ -124,7 +159,7 @@ MEDIA_ROOT = BASE_DIR / 'media'
 if not DEBUG:
     STORAGES = {
         'default': {
-            'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage',
+            'BACKEND': 'core.storages.CachedS3Storage',
         },
         'staticfiles': {
             'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
@@ -146,6 +181,23 @@ AUTH_COOKIE_REFRESH_MAX_AGE = 60 * 60 * 24
 SESSION_COOKIE_SECURE = True
 AUTH_COOKIE_PATH = '/'
 AUTH_COOKIE_SAMESITE = None
+# Require unsafe requests authenticated with the access cookie to repeat the
+# csrftoken cookie, also returned by login and refresh, in the X-CSRFToken header
+AUTH_COOKIE_CSRF = env.bool('AUTH_COOKIE_CSRF', default=True)
+
+# Authenticate requests from the claims embedded in the JWT instead of a user lookup
+AUTH_STATELESS_TOKENS = env.bool('AUTH_STATELESS_TOKENS', default=False)
+
+# Serve the login, refresh, verify, logout and invite endpoints from the async
+# views of accounts.async_views and onboarding.async_views. Enable when
+# running under an ASGI server, see core/asgi.py.
+ASYNC_VIEWS = env.bool('ASYNC_VIEWS', default=False)
+
+# Seconds a user's group names, read by permission checks, and the group ids
+# read by UserManager.create_employee_user are cached, 0 disables the cache.
+# Changes reach other processes through a shared cache only, so a local cache
+# keeps them briefly.
+USER_GROUPS_CACHE_TIMEOUT = 30 if LOCAL_CACHE else 60 * 5
 
 # Email settings for Google smtp
 # EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -168,6 +220,35 @@ AWS_SES_FROM_EMAIL = os.environ.get('AWS_SES_FROM_EMAIL')
 USE_SES_V2 = True
 DEFAULT_FROM_EMAIL = 'ReelService'
 
+# Queued invitation delivery, see the `sendinvitations` command
+INVITATION_BATCH_SIZE = 50
+INVITATION_MAX_ATTEMPTS = 5
+# Seconds before the first retry, doubled on every further attempt
+INVITATION_RETRY_DELAY = 60
+
+# Rows validated and written per transaction by the bulk employee import
+EMPLOYEE_IMPORT_CHUNK_SIZE = 500
+
+# Rows fetched per database round trip by the streamed employee export
+EMPLOYEE_EXPORT_CHUNK_SIZE = 2000
+
+# Most employees a bulk reassignment or deactivation may change at once
+EMPLOYEE_BULK_UPDATE_LIMIT = 5000
+
+# Seconds responses are kept by onboarding.caching.CachedResponseMixin. Writes
+# invalidate them earlier by bumping their model's version, which other
+# processes only see through a shared cache, so a local cache keeps them briefly.
+RESPONSE_CACHE_TIMEOUT = 60 if LOCAL_CACHE else 60 * 60 * 24
+
+# Profile pictures, see onboarding.pictures. Uploads larger than
+# PROFILE_PICTURE_MAX_SIZE bytes are refused and presigned uploads expire
+# after PROFILE_PICTURE_UPLOAD_EXPIRE seconds.
+PROFILE_PICTURE_MAX_SIZE = 5 * 1024 * 1024
+PROFILE_PICTURE_CONTENT_TYPES = ['image/jpeg', 'image/png', 'image/webp']
+PROFILE_PICTURE_UPLOAD_EXPIRE = 60 * 10
+# Square thumbnail sizes in pixels by name
+PROFILE_PICTURE_THUMBNAIL_SIZES = {'small': 64, 'medium': 256}
+
 ## S3 config
 AWS_STORAGE_BUCKET_NAME = os.environ.get('AWS_STORAGE_BUCKET_NAME')
 AWS_S3_SIGNATURE_NAME = os.environ.get('AWS_S3_SIGNATURE_NAME')
@@ -175,6 +256,21 @@ AWS_S3_FILE_OVERWRITE = False
 AWS_DEFAULT_ACL = None
 AWS_S3_VERITY = True
 
+# Signed URLs are reused for STORAGE_URL_CACHE_TIMEOUT seconds, at most half
+# their AWS_QUERYSTRING_EXPIRE lifetime, see core.storages. Each process keeps
+# up to STORAGE_URL_CACHE_SIZE of them.
+STORAGE_URL_CACHE_TIMEOUT = 60 * 15
+STORAGE_URL_CACHE_SIZE = 10000
+
+# Request metrics, see core.metrics and the admin-only /metrics endpoint.
+# Requests slower than METRICS_SLOW_REQUEST_THRESHOLD seconds are logged with
+# their METRICS_SLOW_REQUEST_QUERIES slowest queries, None disables the log.
+METRICS_ENABLED = env.bool('METRICS_ENABLED', default=True)
+METRICS_SLOW_REQUEST_THRESHOLD = env.float('METRICS_SLOW_REQUEST_THRESHOLD', default=1.0)
+METRICS_SLOW_REQUEST_QUERIES = 5
+# Upper bounds in seconds of the latency histogram buckets
+METRICS_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
 # Email Template settings
 DOMAIN = os.environ.get('DOMAIN')
 SITE_NAME = 'ReelService'
@@ -199,14 +295,47 @@ REST_FRAMEWORK = {
         'accounts.authentication.CustomJWTAuthentication',
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_PAGINATION_CLASS': 'accounts.pagination.CursorPagination',
+    # Proxies in front of the app, clients are identified by the address the
+    # last of them forwarded. Never unset: DRF would then identify clients by
+    # the whole X-Forwarded-For header, which they choose. 1 on Render.
+    'NUM_PROXIES': env.int('NUM_PROXIES', default=1 if RENDER_EXTERNAL_HOSTNAME else 0),
+    # Scopes of accounts.throttling. Login and password reset are limited per
+    # client address, which offices share, invites per user.
+    'DEFAULT_THROTTLE_RATES': {
+        'login': '60/min',
+        'password_reset': '10/hour',
+        'invite': '120/hour',
+    },
 }
 
+# Seconds between the syncs of the throttle counts of a process to the cache,
+# which limit clients across processes when the cache is shared
+THROTTLE_SYNC_INTERVAL = 1.0
+
 # djangorestframework-simplejwt settings
 SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('JWT',),
     'UPDATE_LAST_LOGIN': True,
+    'TOKEN_OBTAIN_SERIALIZER': 'accounts.serializers.CustomTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.CustomTokenRefreshSerializer',
+    'ROTATE_REFRESH_TOKENS': True,
+    'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# Refresh token blacklist, see accounts.tokens. Each process keeps a bloom
+# filter sized for TOKEN_BLACKLIST_CAPACITY revoked tokens with false
+# positives at TOKEN_BLACKLIST_ERROR_RATE, and the answers of up to
+# TOKEN_BLACKLIST_LRU_SIZE of its hits. Incremental syncs reload the rows of
+# the last TOKEN_BLACKLIST_SYNC_MARGIN seconds again.
+TOKEN_BLACKLIST_CAPACITY = 100000
+TOKEN_BLACKLIST_ERROR_RATE = 0.001
+TOKEN_BLACKLIST_LRU_SIZE = 10000
+TOKEN_BLACKLIST_SYNC_MARGIN = 60
+# Seconds after which a process syncs even when the cached version did not
+# change, bounding how late it sees revocations if the cache missed them
+TOKEN_BLACKLIST_SYNC_INTERVAL = 5
+
 # djoser settings
 DJOSER = {
     "PASSWORD_RESET_CONFIRM_URL": 'password-reset/{uid}/{token}',
@@ -0,0 +1,51 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from storages.backends.s3boto3 import S3Boto3Storage
+
+
+class CachedURLMixin:
+    """
+    Keeps the signed URLs of a storage in a process-local LRU cache, keyed by
+    storage name, so list responses do not sign every URL again. Entries
+    expire after STORAGE_URL_CACHE_TIMEOUT seconds, capped at half the
+    signature lifetime so a cached URL is always valid for a while longer.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._url_cache = OrderedDict()
+        self._url_cache_lock = threading.Lock()
+
+    @property
+    def url_cache_timeout(self):
+        return min(settings.STORAGE_URL_CACHE_TIMEOUT, self.querystring_expire // 2)
+
+    def url(self, name, parameters=None, expire=None, http_method=None):
+        if parameters or expire or http_method or not self.querystring_auth:
+            return super().url(name, parameters, expire, http_method)
+
+        now = time.monotonic()
+        with self._url_cache_lock:
+            entry = self._url_cache.get(name)
+            if entry is not None and entry[1] > now:
+                self._url_cache.move_to_end(name)
+                return entry[0]
+
+        url = super().url(name)
+        with self._url_cache_lock:
+            self._url_cache[name] = (url, now + self.url_cache_timeout)
+            self._url_cache.move_to_end(name)
+            while len(self._url_cache) > settings.STORAGE_URL_CACHE_SIZE:
+                self._url_cache.popitem(last=False)
+        return url
+
+    def delete(self, name):
+        super().delete(name)
+        with self._url_cache_lock:
+            self._url_cache.pop(name, None)
+
+
+class CachedS3Storage(CachedURLMixin, S3Boto3Storage):
+    pass
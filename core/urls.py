@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
+from core.metrics import MetricsView
 from drf_spectacular.views import (
 	SpectacularAPIView,
 	SpectacularSwaggerView,
@@ -12,6 +13,7 @@ urlpatterns = [
 	path("api/schema/swagger-ui/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
     path('api/schema/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
     path('admin/', admin.site.urls),
+    path('metrics', MetricsView.as_view(), name='metrics'),
     path('accounts/', include('accounts.urls')),
     path('onboarding/', include('onboarding.urls')),
 ]
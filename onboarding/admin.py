@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Employee, Job, Department, EmployeeType
+from .models import Employee, Job, Department, EmployeeType, Invitation, HeadcountSummary
 
 
 class EmployeeAdmin(admin.ModelAdmin):
@@ -8,12 +8,25 @@ class EmployeeAdmin(admin.ModelAdmin):
     ordering = ('user', 'department')
 
 class DepartmentAdmin(admin.ModelAdmin):
-    list_display = ('name', 'code', 'head')
+    list_display = ('name', 'code', 'head', 'parent')
     search_fields = ('name', 'head')
+    list_select_related = ('head', 'parent')
     ordering = ('name',)
 
+class InvitationAdmin(admin.ModelAdmin):
+    list_display = ('user', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    ordering = ('-created_at',)
+
+class HeadcountSummaryAdmin(admin.ModelAdmin):
+    list_display = ('dimension', 'key', 'count')
+    list_filter = ('dimension',)
+    ordering = ('dimension', 'key')
+
 
 admin.site.register(Employee, EmployeeAdmin)
 admin.site.register(Job)
 admin.site.register(Department, DepartmentAdmin)
 admin.site.register(EmployeeType)
+admin.site.register(Invitation, InvitationAdmin)
+admin.site.register(HeadcountSummary, HeadcountSummaryAdmin)
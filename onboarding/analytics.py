@@ -0,0 +1,137 @@
+"""
+Headcount analytics for the HR dashboards. HeadcountSummary holds one count
+per dimension and key, so dashboards read a row per group instead of every
+employee. Summaries are updated incrementally from Employee signals and the
+bulk operations of onboarding.bulk, and rebuilt from scratch with the
+`refreshheadcount` command.
+"""
+from collections import Counter, defaultdict
+from functools import reduce
+from operator import or_
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.db.models.functions import TruncMonth
+from .models import Employee, Department, EmployeeType, HeadcountSummary
+
+
+# Employee fields the summaries are computed from
+SNAPSHOT_FIELDS = (
+    'is_active', 'department_id', 'employee_type_id', 'gender', 'nationality',
+    'employment_date', 'resignation_date',
+)
+
+def month_key(value):
+    # Dates may still be ISO strings on instances that were not reloaded
+    return str(value)[:7]
+
+def take_snapshot(employee):
+    "Returns the snapshot fields of an employee, or None when some are deferred."
+    values = employee.__dict__
+    if not all(name in values for name in SNAPSHOT_FIELDS):
+        return None
+    return {name: values[name] for name in SNAPSHOT_FIELDS}
+
+def get_contributions(values):
+    "Returns the (dimension, key) pairs an employee with the given values counts towards."
+    contributions = [(HeadcountSummary.HIRES, month_key(values['employment_date']))]
+    if values['resignation_date'] is not None:
+        contributions.append((HeadcountSummary.LEAVERS, month_key(values['resignation_date'])))
+    if values['is_active']:
+        contributions += [
+            (HeadcountSummary.DEPARTMENT, str(values['department_id'])),
+            (HeadcountSummary.EMPLOYEE_TYPE, str(values['employee_type_id'])),
+            (HeadcountSummary.GENDER, values['gender']),
+            (HeadcountSummary.NATIONALITY, str(values['nationality'])),
+        ]
+    return contributions
+
+def get_deltas(old_rows, new_rows):
+    "Returns the count changes of employees going from `old_rows` to `new_rows` values."
+    deltas = Counter()
+    for values in old_rows:
+        deltas.subtract(get_contributions(values))
+    for values in new_rows:
+        deltas.update(get_contributions(values))
+    return {key: delta for key, delta in deltas.items() if delta}
+
+def apply_deltas(deltas):
+    "Adds the deltas to the summaries with one insert and one update."
+    if not deltas:
+        return
+    HeadcountSummary.objects.bulk_create(
+        [HeadcountSummary(dimension=dimension, key=key) for dimension, key in deltas],
+        ignore_conflicts=True,
+    )
+    HeadcountSummary.objects.filter(
+        reduce(or_, (Q(dimension=dimension, key=key) for dimension, key in deltas))
+    ).update(count=F('count') + Case(
+        *(When(dimension=dimension, key=key, then=Value(delta)) for (dimension, key), delta in deltas.items()),
+        default=Value(0),
+    ))
+
+def apply_changes(rows, changes):
+    "Returns snapshot rows with the field changes of a bulk update applied."
+    changes = {
+        Employee._meta.get_field(name).attname: getattr(value, 'pk', value)
+        for name, value in changes.items()
+    }
+    return [{**values, **changes} for values in rows]
+
+def count_employees():
+    "Counts the employees of every dimension with one aggregate query each."
+    active = Employee.objects.filter(is_active=True)
+    querysets = {
+        HeadcountSummary.DEPARTMENT: active.values_list('department_id'),
+        HeadcountSummary.EMPLOYEE_TYPE: active.values_list('employee_type_id'),
+        HeadcountSummary.GENDER: active.values_list('gender'),
+        HeadcountSummary.NATIONALITY: active.values_list('nationality'),
+        HeadcountSummary.HIRES: Employee.objects.annotate(
+            month=TruncMonth('employment_date')
+        ).values_list('month'),
+        HeadcountSummary.LEAVERS: Employee.objects.filter(resignation_date__isnull=False).annotate(
+            month=TruncMonth('resignation_date')
+        ).values_list('month'),
+    }
+    counts = {}
+    for dimension, queryset in querysets.items():
+        format_key = month_key if dimension in (HeadcountSummary.HIRES, HeadcountSummary.LEAVERS) else str
+        counts[dimension] = {
+            format_key(key): count for key, count in queryset.annotate(count=Count('pk')).order_by()
+        }
+    return counts
+
+def refresh_headcount():
+    "Rebuilds the summaries from the employees table."
+    summaries = [
+        HeadcountSummary(dimension=dimension, key=key, count=count)
+        for dimension, keys in count_employees().items()
+        for key, count in keys.items()
+    ]
+    with transaction.atomic():
+        HeadcountSummary.objects.all().delete()
+        HeadcountSummary.objects.bulk_create(summaries)
+    return len(summaries)
+
+def get_headcount(live=False):
+    """
+    Returns the employee counts of every dimension, with departments and
+    employee types keyed by code. Read from the summaries, or computed from
+    the employees table when `live` is set.
+    """
+    if live:
+        counts = count_employees()
+    else:
+        counts = defaultdict(dict)
+        summaries = HeadcountSummary.objects.exclude(count=0).values_list('dimension', 'key', 'count')
+        for dimension, key, count in summaries.order_by('dimension', 'key'):
+            counts[dimension][key] = count
+
+    for dimension, model in ((HeadcountSummary.DEPARTMENT, Department), (HeadcountSummary.EMPLOYEE_TYPE, EmployeeType)):
+        keys = counts.get(dimension, {})
+        codes = dict(model.objects.filter(pk__in=keys).values_list('pk', 'code')) if keys else {}
+        counts[dimension] = {codes.get(int(key), key): count for key, count in keys.items()}
+
+    return {
+        'headcount': sum(counts[HeadcountSummary.DEPARTMENT].values()),
+        **{dimension: counts.get(dimension, {}) for dimension, _ in HeadcountSummary.DIMENSION_CHOICES},
+    }
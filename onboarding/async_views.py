@@ -0,0 +1,45 @@
+"""
+Async variant of the employee invite action, served instead of
+EmployeeViewSet.invite when ASYNC_VIEWS is enabled, see accounts.async_views.
+"""
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import NotAuthenticated, PermissionDenied, ValidationError
+from accounts.async_views import api_view, authenticate, check_throttle, error_response, get_data
+from accounts.permissions import IsHRorAdmin, aget_group_names
+from accounts.throttling import InviteRateThrottle
+from .serializers import SendInviteSerializer
+from .signals import send_invite_mail
+
+
+User = get_user_model()
+
+
+@api_view
+async def invite(request):
+    "See EmployeeViewSet.invite."
+    request.user = await authenticate(request)
+    if request.user is None:
+        return error_response(NotAuthenticated.default_detail, status.HTTP_401_UNAUTHORIZED)
+    # Loaded ahead, as the permission reads them
+    await aget_group_names(request.user)
+    if not IsHRorAdmin().has_permission(request, None):
+        return error_response(PermissionDenied.default_detail, status.HTTP_403_FORBIDDEN)
+    check_throttle(request, InviteRateThrottle())
+
+    serializer = SendInviteSerializer(data=get_data(request))
+    serializer.is_valid(raise_exception=True)
+    try:
+        user = await User._default_manager.aget(email=serializer.validated_data['email'])
+    except User.DoesNotExist:
+        raise ValidationError(serializer.error_messages['email_not_found'])
+
+    if not user.is_active:
+        [(receiver, invitation)] = await send_invite_mail.asend(sender=invite, user=user, request=request)
+        return JsonResponse(
+            data={'message': 'Invitation queued for delivery', 'invitation': invitation.pk},
+            status=status.HTTP_202_ACCEPTED
+        )
+    else:
+        return JsonResponse(data={'message': 'User is already active'}, status=status.HTTP_400_BAD_REQUEST)
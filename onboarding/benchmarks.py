@@ -0,0 +1,220 @@
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from storages.backends.s3boto3 import S3Boto3Storage
+from accounts.benchmarks import benchmark, measure, api_client, check_status
+from core.storages import CachedS3Storage
+from .models import Employee, Job, Department, EmployeeType
+from .orgchart import get_org_chart
+from .serializers import EmployeeSerializer, EmployeeValuesSerializer
+
+
+User = get_user_model()
+
+def get_code(prefix, index):
+    "Returns a code unique to `index` that fits the five characters of department and employee type codes."
+    digits = ''
+    while True:
+        index, digit = divmod(index, 36)
+        digits = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'[digit] + digits
+        if not index:
+            return prefix + digits
+
+def create_reference_data(jobs=1, departments=1, employee_types=1):
+    "Returns the jobs, departments and employee types employees are spread over, creating them as needed."
+    Group.objects.get_or_create(name='Employee')
+    return (
+        [Job.objects.get_or_create(title=f'Benchmark {index}')[0] for index in range(jobs)],
+        [
+            Department.objects.get_or_create(code=get_code('B', index), defaults={'name': f'Benchmark {index}'})[0]
+            for index in range(departments)
+        ],
+        [
+            EmployeeType.objects.get_or_create(code=get_code('B', index), defaults={'name': f'Benchmark {index}'})[0]
+            for index in range(employee_types)
+        ],
+    )
+
+def create_employees(count, jobs=1, departments=1, employee_types=1):
+    """
+    Inserts `count` employees with their users, spread over the given number
+    of jobs, departments and employee types, returning their numbers.
+    """
+    jobs, departments, employee_types = create_reference_data(jobs, departments, employee_types)
+    start = User.objects.filter(email__endswith='@benchmark.local').count()
+    users = User.objects.bulk_create([
+        User(email=f'employee{index}@benchmark.local') for index in range(start, start + count)
+    ])
+    Employee.objects.bulk_create([
+        Employee(
+            user=user, first_name='john', middle_name='james', last_name='doe', gender='Male',
+            d_o_b='1990-01-01', marital_status='Single', religion='Others', nationality='NG',
+            phone_number=f'+23490{start + index:08d}', address='1 Main Street',
+            job=jobs[index % len(jobs)], department=departments[index % len(departments)],
+            employee_type=employee_types[index % len(employee_types)],
+        )
+        for index, user in enumerate(users)
+    ])
+    return list(Employee.objects.filter(user__in=users).values_list('employee_number', flat=True))
+
+def create_admin():
+    return User.objects.create_user('admin@benchmark.local', is_staff=True, is_active=True)
+
+
+@benchmark
+def employee_number_lookup(repeat):
+    """Employee number resolution by primary key against the employee_number unique index."""
+    numbers = create_employees(max(repeat, 100))
+    batch = numbers[:100]
+
+    return {
+        'employee_number_index': measure(
+            lambda run: Employee.objects.get(employee_number=numbers[run % len(numbers)]), repeat
+        ),
+        'get_by_number': measure(
+            lambda run: Employee.objects.get_by_number(numbers[run % len(numbers)]), repeat
+        ),
+        'employee_number_index_batch_100': measure(
+            lambda run: list(Employee.objects.filter(employee_number__in=batch)), repeat
+        ),
+        'get_by_numbers_100': measure(lambda run: Employee.objects.get_by_numbers(batch), repeat),
+    }
+
+
+@benchmark
+def employee_list_signed_urls(repeat):
+    """Serialization of 1,000 employees with profile pictures, with and without the signed URL cache."""
+    numbers = create_employees(1000)
+    employees = list(Employee.objects.filter(employee_number__in=numbers))
+    for employee in employees:
+        employee.profile_picture.name = f'profile_pictures/{employee.pk}.jpg'
+        employee.profile_picture_thumbnails = {
+            'small': f'profile_pictures/thumbnails/{employee.pk}_small.jpg',
+            'medium': f'profile_pictures/thumbnails/{employee.pk}_medium.jpg',
+        }
+    Employee.objects.bulk_update(employees, ['profile_picture', 'profile_picture_thumbnails'])
+    queryset = Employee.objects.filter(employee_number__in=numbers).for_serializer(EmployeeSerializer)
+
+    # Signing is local, the dummy credentials never reach AWS
+    options = {
+        'bucket_name': 'benchmark', 'access_key': 'benchmark', 'secret_key': 'benchmark',
+        'region_name': 'us-east-1', 'signature_version': 's3v4',
+    }
+    field = Employee._meta.get_field('profile_picture')
+    results = {}
+    for name, storage in (('s3_storage', S3Boto3Storage(**options)), ('cached_s3_storage', CachedS3Storage(**options))):
+        with mock.patch.object(field, 'storage', storage):
+            # Loaded per storage, as instances keep the storage of their files
+            employees = list(queryset.all())
+            results[name] = measure(lambda run: EmployeeSerializer(employees, many=True).data, repeat)
+    return results
+
+
+@benchmark
+def employee_list_values_serializer(repeat):
+    """Serialization of 1,000 employees from model instances and from values() rows."""
+    numbers = create_employees(1000)
+    queryset = Employee.objects.filter(employee_number__in=numbers)
+
+    return {
+        'model_serializer': measure(
+            lambda run: EmployeeSerializer(queryset.for_serializer(EmployeeSerializer), many=True).data, repeat
+        ),
+        'values_serializer': measure(lambda run: EmployeeValuesSerializer(queryset).data, repeat),
+    }
+
+
+@benchmark
+def employee_api(repeat):
+    """Employee list, retrieve and create requests against 1,000 employees in 10 departments."""
+    numbers = create_employees(1000, jobs=10, departments=10, employee_types=3)
+    client = api_client(create_admin())
+
+    def create(run):
+        payload = {
+            'user': {'email': f'new{run}@benchmark.local'}, 'send_invite': False,
+            'first_name': 'jane', 'middle_name': 'mary', 'last_name': 'doe', 'gender': 'Female',
+            'd_o_b': '1992-02-02', 'marital_status': 'Single', 'religion': 'Others', 'nationality': 'GH',
+            'phone_number': f'+23370{run:08d}', 'address': '2 Main Street',
+            'job': 'Benchmark 0', 'department': get_code('B', 0), 'employee_type': get_code('B', 0),
+        }
+        check_status(client.post('/onboarding/employees/', payload, format='json'), 201)
+
+    return {
+        'list_page_10': measure(
+            lambda run: check_status(client.get('/onboarding/employees/', {'page_size': 10}), 200), repeat
+        ),
+        'list_page_100': measure(
+            lambda run: check_status(client.get('/onboarding/employees/', {'page_size': 100}), 200), repeat
+        ),
+        'retrieve': measure(
+            lambda run: check_status(client.get(f'/onboarding/employees/{numbers[run % len(numbers)]}/'), 200),
+            repeat,
+        ),
+        'create': measure(create, repeat),
+    }
+
+
+@benchmark
+def employee_invite(repeat):
+    """Invitation requests for employees who have not activated their accounts."""
+    numbers = create_employees(repeat + 1)
+    emails = list(
+        Employee.objects.filter(employee_number__in=numbers).order_by('pk').values_list('user__email', flat=True)
+    )
+    client = api_client(create_admin())
+
+    return {
+        'invite': measure(
+            lambda run: check_status(client.post('/onboarding/employees/invite/', {'email': emails[run]}), 202),
+            repeat,
+        ),
+    }
+
+
+@benchmark
+def department_writes(repeat):
+    """Department create and update requests, which also invalidate the cached department responses."""
+    # Heads are one to one, an employee per department updated
+    numbers = create_employees(max(100, repeat + 1))
+    client = api_client(create_admin())
+
+    def create(run):
+        payload = {'name': f'Department {run}', 'code': get_code('D', run), 'head': None}
+        check_status(client.post('/onboarding/departments/', payload, format='json'), 201)
+
+    def update(run):
+        payload = {'head': numbers[run % len(numbers)]}
+        code = get_code('D', run % repeat)
+        check_status(client.patch(f'/onboarding/departments/{code}/', payload, format='json'), 200)
+
+    return {
+        'create': measure(create, repeat),
+        'update': measure(update, repeat),
+    }
+
+
+@benchmark
+def org_chart(repeat):
+    """The org chart of 1000 departments in a tree of depth 3, against walking the tree one department at a time."""
+    create_employees(2000, departments=1000)
+    departments = list(Department.objects.filter(name__startswith='Benchmark ').order_by('pk'))
+    # Each department is placed below one created before it, ten per parent
+    for index, department in enumerate(departments[1:], 1):
+        department.parent = departments[(index - 1) // 10]
+        department.save()
+
+    def walk(department):
+        return {
+            'code': department.code,
+            'head': department.head.employee_number if department.head else None,
+            'members': department.employee_set.filter(is_active=True).count(),
+            'children': [walk(child) for child in department.children.filter(is_active=True)],
+        }
+
+    return {
+        'materialized_path': measure(lambda run: get_org_chart(), repeat),
+        'materialized_path_subtree': measure(lambda run: get_org_chart(departments[1]), repeat),
+        # Two queries per department, a few runs stay within the queries Django records
+        'recursive': measure(lambda run: walk(departments[0]), min(repeat, 2)),
+    }
@@ -0,0 +1,193 @@
+import codecs
+import csv
+import json
+from itertools import islice
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction, IntegrityError
+from django.http import Http404
+from django.utils import timezone
+from accounts.authentication import revoke_user_tokens
+from accounts.managers import get_group_id
+from .analytics import SNAPSHOT_FIELDS, apply_changes, apply_deltas, get_deltas, take_snapshot
+from .caching import bump_model_version
+from .mail import build_invitation
+from .models import Employee, Job, Department, EmployeeType, Invitation
+from .serializers import EmployeeImportRowSerializer
+from .signals import employees_bulk_updated
+
+
+User = get_user_model()
+
+def iter_rows(upload):
+    """
+    Yields the rows of a CSV or JSON Lines upload as dicts, reading the file
+    line by line. Lines that cannot be parsed are yielded as ValueErrors.
+    """
+    lines = codecs.iterdecode(upload, 'utf-8-sig')
+    if upload.name.lower().endswith('.csv'):
+        for row in csv.DictReader(lines):
+            # Blank cells are treated as missing values
+            yield {key: value for key, value in row.items() if key and value}
+        return
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            row = ValueError(f'Invalid JSON: {exc}')
+        if not isinstance(row, (dict, ValueError)):
+            row = ValueError('Expected a JSON object.')
+        yield row
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+def get_import_context():
+    "Loads the relations an import resolves by slug, once per import."
+    return {
+        'jobs': {job.title: job for job in Job.objects.all()},
+        'departments': {department.code: department for department in Department.objects.all()},
+        'employee_types': {employee_type.code: employee_type for employee_type in EmployeeType.objects.all()},
+    }
+
+def validate_chunk(rows, context, seen):
+    """
+    Validates a chunk of rows, returning the valid rows and the errors of the
+    others. `seen` holds the emails and phone numbers of earlier chunks.
+    """
+    valid, errors = [], []
+    for number, row in rows:
+        if isinstance(row, ValueError):
+            errors.append({'row': number, 'errors': {'non_field_errors': [str(row)]}})
+            continue
+        serializer = EmployeeImportRowSerializer(data=row, context=context)
+        if serializer.is_valid():
+            valid.append((number, serializer.validated_data))
+        else:
+            errors.append({'row': number, 'errors': serializer.errors})
+
+    existing_emails = set(User.objects.filter(
+        email__in=[data['email'] for _, data in valid]
+    ).values_list('email', flat=True))
+    existing_phone_numbers = set(Employee.objects.filter(
+        phone_number__in=[data['phone_number'] for _, data in valid]
+    ).values_list('phone_number', flat=True))
+
+    unique = []
+    for number, data in valid:
+        row_errors = {}
+        if data['email'] in existing_emails or data['email'] in seen['emails']:
+            row_errors['email'] = ['User with this email address already exists.']
+        if data['phone_number'] in existing_phone_numbers or data['phone_number'] in seen['phone_numbers']:
+            row_errors['phone_number'] = ['Employee with this phone number already exists.']
+        seen['emails'].add(data['email'])
+        seen['phone_numbers'].add(data['phone_number'])
+        if row_errors:
+            errors.append({'row': number, 'errors': row_errors})
+        else:
+            unique.append((number, data))
+    return unique, errors
+
+def create_chunk(rows, group_id, request=None):
+    """
+    Creates the users, group memberships and employees of validated rows with
+    one insert per table, and queues invitations when a request is given.
+    """
+    users = []
+    for _, data in rows:
+        user = User(email=data.pop('email'))
+        user.set_unusable_password()
+        users.append(user)
+
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user_id=user.pk, group_id=group_id) for user in users
+        ])
+        employees = Employee.objects.bulk_create([
+            Employee(user=user, **data) for user, (_, data) in zip(users, rows)
+        ])
+        # bulk_create sends no post_save signals
+        apply_deltas(get_deltas([], map(take_snapshot, employees)))
+        if request is not None:
+            Invitation.objects.bulk_create([build_invitation(user, request) for user in users])
+    return employees
+
+def import_employees(upload, request=None):
+    """
+    Imports employees from a CSV or JSON Lines upload in chunks of
+    EMPLOYEE_IMPORT_CHUNK_SIZE rows, each written in its own transaction.
+    Invitations are queued when a request is given. Returns a report of the
+    rows created and the errors of the rows that were not.
+    """
+    group_id = get_group_id("Employee")
+    if group_id is None:
+        raise Http404("Employee Group is not created yet.")
+
+    context = get_import_context()
+    seen = {'emails': set(), 'phone_numbers': set()}
+    report = {'created': 0, 'errors': []}
+    rows = enumerate(iter_rows(upload), start=1)
+    for chunk in chunked(rows, settings.EMPLOYEE_IMPORT_CHUNK_SIZE):
+        valid, errors = validate_chunk(chunk, context, seen)
+        report['errors'] += errors
+        if not valid:
+            continue
+        try:
+            create_chunk(valid, group_id, request)
+        except IntegrityError as exc:
+            report['errors'] += [
+                {'row': number, 'errors': {'non_field_errors': [str(exc)]}} for number, _ in valid
+            ]
+        else:
+            report['created'] += len(valid)
+    if report['created']:
+        # bulk_create sends no post_save signals
+        bump_model_version(Employee)
+    report['errors'].sort(key=lambda error: error['row'])
+    return report
+
+def update_employees(employees, changes, user, user_changes=None):
+    """
+    Applies `changes` to the employees, given as the (pk, user_id,
+    employee_number) rows of BulkEmployeeSerializer, and `user_changes` to
+    their users, with one UPDATE per table in a single transaction. Sends
+    employees_bulk_updated once for the whole batch instead of per-row
+    signals. Returns the number of employees updated.
+    """
+    employee_ids = [pk for pk, _, _ in employees]
+    user_ids = [user_id for _, user_id, _ in employees]
+    with transaction.atomic():
+        old_rows = list(Employee.objects.select_for_update().filter(pk__in=employee_ids).values(*SNAPSHOT_FIELDS))
+        # update() bypasses auto_now, which conditional GETs rely on
+        updated = Employee.objects.filter(pk__in=employee_ids).update(**changes, updated_at=timezone.now())
+        apply_deltas(get_deltas(old_rows, apply_changes(old_rows, changes)))
+        if user_changes:
+            User.objects.filter(pk__in=user_ids).update(**user_changes)
+        employees_bulk_updated.send(
+            sender=Employee,
+            user=user,
+            employee_numbers=[employee_number for _, _, employee_number in employees],
+            changes={**changes, **{f'user.{name}': value for name, value in (user_changes or {}).items()}},
+        )
+    bump_model_version(Employee)
+    if user_changes and user_changes.get('is_active') is False:
+        revoke_user_tokens(user_ids)
+    return updated
+
+def reassign_employees(employees, user, **relations):
+    "Moves employees to another job, department and/or employee type."
+    return update_employees(employees, relations, user)
+
+def deactivate_employees(employees, user, resignation_date):
+    "Deactivates leavers and their users, revoking their tokens."
+    return update_employees(
+        employees,
+        {'resignation_date': resignation_date, 'is_active': False},
+        user,
+        user_changes={'is_active': False},
+    )
@@ -0,0 +1,123 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from rest_framework.response import Response
+from accounts.permissions import get_cached_group_names
+from .models import Employee
+from .pictures import get_storage
+
+
+def model_version_key(model):
+    return f'onboarding:version:{model._meta.label_lower}'
+
+def get_version_timeout():
+    # Versions bumped by other processes are only seen through a shared
+    # cache. A local one drops them with the responses, so neither a response
+    # nor its ETag outlives RESPONSE_CACHE_TIMEOUT there.
+    return settings.RESPONSE_CACHE_TIMEOUT if settings.LOCAL_CACHE else None
+
+def get_model_version(model):
+    "Returns the current version of a model's table, bumped on every write."
+    key = model_version_key(model)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock, so a counter evicted from the cache never
+        # comes back with a version older responses were cached under.
+        cache.add(key, time.time_ns(), get_version_timeout())
+        version = cache.get(key)
+    return version
+
+def bump_model_version(*models):
+    "Invalidates the responses cached for the given models."
+    for model in models:
+        key = model_version_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), get_version_timeout())
+
+def get_signing_period():
+    """
+    Returns the current period of the profile picture URLs, which change when
+    the storage signs them, or None when it does not. Periods last half the
+    signature lifetime, as long as core.storages caches a signed URL, so a
+    record is revalidated before the URLs it was served with expire.
+    """
+    storage = get_storage()
+    if not getattr(storage, 'querystring_auth', False):
+        return None
+    return int(time.time() // max(1, storage.querystring_expire // 2))
+
+def employee_etag(timestamps, user_id, is_active, group_names):
+    """
+    Returns the ETag of an employee record from the updated_at of the
+    employee and its relations, the user's state and the signing period of
+    its picture URLs. No Last-Modified is derived from the timestamps, as
+    the other parts do not move them.
+    """
+    state = (*timestamps, user_id, is_active, sorted(group_names), get_signing_period())
+    return quote_etag(hashlib.md5(str(state).encode()).hexdigest())
+
+def get_employee_etag(**lookup):
+    "Returns the ETag of the employee matching `lookup` without loading it."
+    row = Employee.objects.filter(**lookup).values_list(
+        'updated_at', 'job__updated_at', 'department__updated_at', 'employee_type__updated_at',
+        'user_id', 'user__is_active',
+    ).first()
+    if row is None:
+        return None
+    *timestamps, user_id, is_active = row
+    return employee_etag(timestamps, user_id, is_active, get_cached_group_names(user_id))
+
+def get_instance_etag(employee):
+    "Returns the ETag of an employee loaded for EmployeeSerializer."
+    timestamps = [
+        employee.updated_at, employee.job.updated_at,
+        employee.department.updated_at, employee.employee_type.updated_at,
+    ]
+    group_names = [group.name for group in employee.user.groups.all()]
+    return employee_etag(timestamps, employee.user_id, employee.user.is_active, group_names)
+
+class CachedResponseMixin:
+    """
+    Caches the list and retrieve responses of a viewset under the version of
+    its models, and answers requests whose If-None-Match matches the response's
+    ETag with 304 Not Modified. Signals bump the version on every write, see
+    onboarding.signals.
+    """
+
+    # Models the responses are built from, the viewset's model by default
+    cache_models = None
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        models = self.cache_models or [self.queryset.model]
+        versions = ':'.join(str(get_model_version(model)) for model in models)
+        key = hashlib.md5(
+            f'{self.queryset.model._meta.label_lower}:{versions}:{request.build_absolute_uri()}'.encode()
+        ).hexdigest()
+        etag = quote_etag(key)
+
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        cache_key = f'onboarding:response:{key}'
+        data = cache.get(cache_key)
+        if data is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cache.set(cache_key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
@@ -0,0 +1,68 @@
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework import filters, serializers
+from .models import Employee
+
+
+class EmployeeFilterSerializer(serializers.Serializer):
+    department = serializers.CharField(required=False, help_text=_("Department code."))
+    job = serializers.CharField(required=False, help_text=_("Job title."))
+    employee_type = serializers.CharField(required=False, help_text=_("Employee type code."))
+    is_active = serializers.BooleanField(required=False)
+    is_leave = serializers.BooleanField(required=False)
+    employment_date_after = serializers.DateField(required=False)
+    employment_date_before = serializers.DateField(required=False)
+    search = serializers.CharField(
+        required=False,
+        help_text=_("Employee number, or the start of a first or last name."),
+    )
+
+
+class EmployeeFilter(filters.BaseFilterBackend):
+    """
+    Filters employees by the query parameters of EmployeeFilterSerializer.
+
+    Every filter maps to an index on Employee. Name searches are prefix
+    matches on the capitalized names as stored by CapitalizeCharField, so
+    they can use the name indexes instead of scanning the table.
+    """
+    lookups = {
+        'department': 'department__code',
+        'job': 'job__title',
+        'employee_type': 'employee_type__code',
+        'is_active': 'is_active',
+        'is_leave': 'is_leave',
+        'employment_date_after': 'employment_date__gte',
+        'employment_date_before': 'employment_date__lte',
+    }
+
+    def filter_queryset(self, request, queryset, view):
+        serializer = EmployeeFilterSerializer(data=request.query_params.dict())
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        queryset = queryset.filter(**{
+            lookup: params[name] for name, lookup in self.lookups.items() if name in params
+        })
+        for term in params.get('search', '').split():
+            if term.upper().startswith(f'{Employee.COMPANY_ABBR}-'):
+                queryset = queryset.filter(employee_number__startswith=term.upper())
+            else:
+                name = term.capitalize()
+                queryset = queryset.filter(Q(first_name__startswith=name) | Q(last_name__startswith=name))
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        parameters = []
+        for name, field in EmployeeFilterSerializer().fields.items():
+            schema = {'type': 'boolean' if isinstance(field, serializers.BooleanField) else 'string'}
+            if isinstance(field, serializers.DateField):
+                schema['format'] = 'date'
+            parameters.append({
+                'name': name,
+                'required': False,
+                'in': 'query',
+                'description': str(field.help_text or ''),
+                'schema': schema,
+            })
+        return parameters
@@ -0,0 +1,73 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import get_connection
+from django.db import transaction
+from django.utils import timezone
+from .models import Invitation
+from .utils import encode_uid
+
+
+logger = logging.getLogger(__name__)
+
+def build_invitation(user, request):
+    "Returns an unsaved invitation email to the employee User."
+    uid = encode_uid(user.pk)
+    token = default_token_generator.make_token(user)
+    context = {
+        'site_name': settings.SITE_NAME,
+        'protocol': 'https' if request.is_secure() else 'http',
+        'domain': settings.DOMAIN,
+        'url': f'employee-invitation/{uid}/{token}',
+    }
+    return Invitation(
+        user=user,
+        template_name='invite',
+        from_email=settings.AWS_SES_FROM_EMAIL or '',
+        context=context,
+    )
+
+def deliver_invitations(batch_size):
+    """
+    Sends a batch of due invitations over a single email connection and
+    returns the invitations attempted. Failed invitations are retried
+    with exponential backoff until INVITATION_MAX_ATTEMPTS is reached.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        invitations = list(
+            Invitation.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('user__employee')
+            .filter(status=Invitation.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if not invitations:
+            return invitations
+
+        with get_connection() as connection:
+            for invitation in invitations:
+                invitation.attempts += 1
+                invitation.updated_at = now
+                try:
+                    if not connection.send_messages([invitation.get_mail()]):
+                        raise RuntimeError('The email backend did not send the message.')
+                except Exception as exc:
+                    logger.warning(f'Failed to send invitation {invitation.pk}: {exc}')
+                    invitation.last_error = str(exc)
+                    if invitation.attempts >= settings.INVITATION_MAX_ATTEMPTS:
+                        invitation.status = Invitation.FAILED
+                    else:
+                        delay = settings.INVITATION_RETRY_DELAY * 2 ** (invitation.attempts - 1)
+                        invitation.next_attempt_at = now + timedelta(seconds=delay)
+                else:
+                    invitation.status = Invitation.SENT
+                    invitation.sent_at = now
+                    invitation.last_error = ''
+
+        Invitation.objects.bulk_update(
+            invitations,
+            ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at', 'updated_at'],
+        )
+    return invitations
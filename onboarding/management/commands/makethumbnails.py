@@ -0,0 +1,45 @@
+import time
+from django.core.management.base import BaseCommand
+from onboarding.pictures import make_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Generates the thumbnails of uploaded profile pictures in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=20,
+            help='Number of pictures processed per transaction.',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep polling for new pictures instead of exiting once drained.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Seconds to wait between polls when no picture is waiting.',
+        )
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help='First retry every picture without thumbnails, as pictures stored before thumbnails or whose thumbnails failed.',
+        )
+
+    def report(self, employees):
+        made = sum(bool(employee.profile_picture_thumbnails) for employee in employees)
+        self.stdout.write(self.style.SUCCESS(f'Thumbnails made for {made} of {len(employees)} picture(s).'))
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            after = 0
+            while employees := make_thumbnails(options['batch_size'], after=after):
+                self.report(employees)
+                after = employees[-1].pk
+
+        while True:
+            employees = make_thumbnails(options['batch_size'])
+            if employees:
+                self.report(employees)
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
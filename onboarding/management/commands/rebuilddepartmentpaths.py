@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from onboarding.models import Department
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the materialized paths of departments, run once after adding the path column.'
+
+    def handle(self, *args, **options):
+        count = Department.objects.rebuild_paths()
+        self.stdout.write(self.style.SUCCESS(f'{count} department paths rebuilt.'))
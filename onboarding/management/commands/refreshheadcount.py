@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from onboarding.analytics import refresh_headcount
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the headcount summaries from the employees table.'
+
+    def handle(self, *args, **options):
+        count = refresh_headcount()
+        self.stdout.write(self.style.SUCCESS(f'{count} headcount summaries refreshed.'))
@@ -0,0 +1,34 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from onboarding.mail import deliver_invitations
+from onboarding.models import Invitation
+
+
+class Command(BaseCommand):
+    help = 'Sends queued invitation emails in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.INVITATION_BATCH_SIZE,
+            help='Number of invitations sent over each email connection.',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep polling for queued invitations instead of exiting once drained.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Seconds to wait between polls when the queue is empty.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            invitations = deliver_invitations(options['batch_size'])
+            if invitations:
+                sent = sum(invitation.status == Invitation.SENT for invitation in invitations)
+                self.stdout.write(self.style.SUCCESS(f'{sent} of {len(invitations)} invitation(s) sent.'))
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
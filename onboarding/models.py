@@ -1,10 +1,13 @@
-from django.db import models
+import re
+from django.db import models, transaction
 from django.db.models import F, Func, Value
-from django.db.models.functions import Concat, ExtractYear, LPad, Cast
+from django.db.models.functions import Concat, ExtractYear, LPad, Cast, Substr
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
 from datetime import date
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 from django_countries.fields import CountryField
 
@@ -25,6 +28,64 @@ class CapitalizeCharField(models.CharField):
         value = super().get_prep_value(value)
         return value.capitalize() if value is not None else value
 
+# Employee numbers encode the employment year and the zero padded id,
+# see Employee.employee_number
+employee_number_regex = re.compile(r'RBS-(?P<year>[0-9]{4})-(?P<id>[0-9]{4})')
+
+def parse_employee_number(number):
+    """
+    Returns the primary key encoded in an employee number, or None when the
+    number is malformed. LPad truncates ids above 9999, so the key must be
+    checked against the stored number.
+    """
+    match = employee_number_regex.fullmatch(number)
+    return int(match['id']) if match else None
+
+class EmployeeQuerySet(models.QuerySet):
+    def get_by_numbers(self, numbers):
+        """
+        Returns the employees with the given numbers, keyed by number. They
+        are looked up by the primary keys the numbers encode and checked
+        against the stored numbers, so a mismatched year never resolves.
+        Numbers not found that way are looked up on employee_number.
+        """
+        numbers = set(numbers)
+        pks = {pk for pk in map(parse_employee_number, numbers) if pk is not None}
+        employees = {
+            employee.employee_number: employee
+            for employee in self.filter(pk__in=pks, employee_number__in=numbers)
+        }
+        missing = numbers - employees.keys()
+        if missing:
+            employees.update(
+                (employee.employee_number, employee)
+                for employee in self.filter(employee_number__in=missing)
+            )
+        return employees
+
+    def get_by_number(self, number):
+        "Returns the employee with the given number, see get_by_numbers."
+        try:
+            return self.get_by_numbers([number])[number]
+        except KeyError:
+            raise self.model.DoesNotExist(f"Employee {number} does not exist.")
+
+    def for_serializer(self, serializer_class):
+        """
+        Eager loads the relations declared by the serializer's Meta
+        `select_related` and `prefetch_related` options.
+        """
+        meta = getattr(serializer_class, 'Meta', None)
+        select_related = getattr(meta, 'select_related', ())
+        prefetch_related = getattr(meta, 'prefetch_related', ())
+        queryset = self
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
+
 class Employee(models.Model):
     # Choices for gender field
     GENDER_CHOICES = (
@@ -52,6 +113,9 @@ class Employee(models.Model):
     # Company Abbrreviation
     COMPANY_ABBR = 'RBS'
 
+    # Storage directory of profile pictures, see onboarding.pictures
+    PROFILE_PICTURE_DIR = 'profile_pictures/'
+
     user = models.OneToOneField(User, on_delete=models.CASCADE)
 
     # Personal Details
@@ -63,7 +127,9 @@ class Employee(models.Model):
     marital_status = models.CharField(choices=MARITAL_STATUS_CHOICES, max_length=8)
     religion = models.CharField(choices=RELIGION_CHOICES, max_length=9)
     nationality = CountryField()
-    profile_picture = models.ImageField(upload_to="profile_pictures/", null=True, blank=True)
+    profile_picture = models.ImageField(upload_to=PROFILE_PICTURE_DIR, null=True, blank=True)
+    # Storage names of the thumbnails by size name, null while they are made
+    profile_picture_thumbnails = models.JSONField(default=dict, null=True, blank=True, editable=False)
 
     # Contact Details
     phone_number = models.CharField(max_length=20, unique=True, validators=[phone_number_validator])
@@ -108,6 +174,28 @@ class Employee(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = EmployeeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Filters of onboarding.filters.EmployeeFilter
+            models.Index(fields=['department', 'is_active'], name='employee_department_active_idx'),
+            models.Index(fields=['job', 'is_active'], name='employee_job_active_idx'),
+            models.Index(fields=['employee_type', 'is_active'], name='employee_type_active_idx'),
+            models.Index(fields=['employment_date'], name='employee_employment_date_idx'),
+            # Prefix searches. The pattern operator classes let PostgreSQL use
+            # these for LIKE 'prefix%' and are ignored by other databases.
+            models.Index(fields=['first_name'], opclasses=['varchar_pattern_ops'], name='employee_first_name_prefix_idx'),
+            models.Index(fields=['last_name'], opclasses=['varchar_pattern_ops'], name='employee_last_name_prefix_idx'),
+            models.Index(fields=['employee_number'], opclasses=['varchar_pattern_ops'], name='employee_number_prefix_idx'),
+            # Profile pictures waiting for thumbnails, see onboarding.pictures
+            models.Index(
+                fields=['updated_at'],
+                condition=models.Q(profile_picture_thumbnails__isnull=True),
+                name='employee_thumbnails_todo_idx',
+            ),
+        ]
+
     # @property
     # def employee_number(self):
     #     "Returns the employee's number."
@@ -150,11 +238,56 @@ class Job(models.Model):
         return self.title
 
 
+class DepartmentQuerySet(models.QuerySet):
+    def subtree(self, department):
+        "Returns the department and the departments below it, with one indexed prefix query."
+        path = department.ensure_path()
+        if not path:
+            raise ValueError("Unsaved departments have no subtree.")
+        return self.filter(path__startswith=path)
+
+    def rebuild_paths(self):
+        """
+        Computes the path of every department from the parent links, and
+        stores the ones that differ. Returns the number of departments updated.
+        Departments stored before paths existed have empty ones, see the
+        `rebuilddepartmentpaths` command.
+        """
+        rows = self.model._default_manager.values_list('pk', 'parent_id', 'path')
+        parents, stored = {}, {}
+        for pk, parent_id, path in rows:
+            parents[pk], stored[pk] = parent_id, path
+
+        paths = {}
+        for pk in parents:
+            # Walk up to the first department with a computed path, then down
+            chain = []
+            while pk is not None and pk not in paths:
+                if len(chain) > len(parents):
+                    raise ValueError(f"Department {chain[-1]} is below itself.")
+                chain.append(pk)
+                pk = parents[pk]
+            path = '/' if pk is None else paths[pk]
+            for pk in reversed(chain):
+                path = paths[pk] = f'{path}{pk}/'
+
+        changed = [self.model(pk=pk, path=path) for pk, path in paths.items() if path != stored[pk]]
+        self.model._default_manager.bulk_update(changed, ['path'], batch_size=500)
+        return len(changed)
+
+
 class Department(models.Model):
     name = models.CharField(max_length=50, unique=True)
     code = models.CharField(max_length=5, unique=True)
     description = models.TextField(blank=True, max_length=200)
     head = models.OneToOneField(Employee, on_delete=models.CASCADE, null=True, blank=True, related_name='department_head')
+    parent = models.ForeignKey('self', on_delete=models.PROTECT, null=True, blank=True, related_name='children')
+    # Materialized path of the primary keys from the root department down to
+    # this one, as in "/1/4/9/", kept up to date by save(). The departments
+    # below a department are the ones whose path starts with its path. Rows
+    # stored before the column have empty paths, rebuilt when first needed or
+    # by the `rebuilddepartmentpaths` command.
+    path = models.CharField(max_length=255, editable=False, default='')
     is_active = models.BooleanField(
         _("active"),
         default=True,
@@ -166,9 +299,69 @@ class Department(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = DepartmentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Subtree queries, see DepartmentQuerySet.subtree
+            models.Index(fields=['path'], opclasses=['varchar_pattern_ops'], name='department_path_prefix_idx'),
+        ]
+
     def __str__(self):
         return self.code
 
+    def ensure_path(self):
+        "Returns the path of this department, rebuilding the paths first when it was never computed."
+        if not self.path and self.pk is not None:
+            Department.objects.rebuild_paths()
+            self.path = Department.objects.filter(pk=self.pk).values_list('path', flat=True).get()
+        return self.path
+
+    def is_descendant_of(self, department):
+        "Returns whether this department is `department` or below it."
+        if department.pk is None:
+            return False
+        return self.ensure_path().startswith(department.ensure_path())
+
+    def clean(self):
+        super().clean()
+        if self.parent is not None and self.pk is not None and self.parent.is_descendant_of(self):
+            raise ValidationError({'parent': _("A department cannot be placed below itself.")})
+
+    def get_path(self):
+        "Returns the path of this department under its parent, as stored in the database."
+        if self.parent_id is None:
+            return f'/{self.pk}/'
+        # Read rather than taken from self.parent, which may have moved since it was loaded
+        parent = Department(pk=self.parent_id)
+        parent.path = Department.objects.filter(pk=self.parent_id).values_list('path', flat=True).get()
+        return f'{parent.ensure_path()}{self.pk}/'
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'parent' not in update_fields:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            if self.pk is None:
+                super().save(*args, **kwargs)
+                # The path ends with the primary key, only known once inserted
+                self.path = self.get_path()
+                Department.objects.filter(pk=self.pk).update(path=self.path)
+                return
+            old_path = Department.objects.filter(pk=self.pk).values_list('path', flat=True).first()
+            self.path = self.get_path()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'path'}
+            super().save(*args, **kwargs)
+            if old_path == '':
+                # Stored before paths existed, so are the departments below
+                Department.objects.rebuild_paths()
+            elif old_path and old_path != self.path:
+                # Moves the departments below along with one UPDATE
+                Department.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(self.path), Substr('path', len(old_path) + 1)),
+                )
+
 
 class EmployeeType(models.Model):
     name = models.CharField(max_length=50, unique=True)
@@ -188,3 +381,82 @@ class EmployeeType(models.Model):
     def __str__(self):
         return self.code
 
+
+class Invitation(models.Model):
+    """An invitation email queued for delivery by the `sendinvitations` command."""
+    PENDING = "Pending"
+    SENT = "Sent"
+    FAILED = "Failed"
+
+    # Choices for status field
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='invitations')
+    template_name = models.CharField(max_length=50)
+    from_email = models.CharField(max_length=254, blank=True)
+    context = models.JSONField(default=dict)
+    status = models.CharField(choices=STATUS_CHOICES, max_length=7, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def get_mail(self):
+        "Builds the email message of this invitation."
+        return self.user.get_mail(
+            email_template=self.template_name,
+            sender=self.from_email,
+            context=dict(self.context),
+        )
+
+    def __str__(self):
+        return f'{self.user} ({self.status})'
+
+
+class HeadcountSummary(models.Model):
+    """
+    The number of employees per key of a dashboard dimension, maintained by
+    onboarding.analytics.
+    """
+    DEPARTMENT = "department"
+    EMPLOYEE_TYPE = "employee_type"
+    GENDER = "gender"
+    NATIONALITY = "nationality"
+    HIRES = "hires"
+    LEAVERS = "leavers"
+
+    # Choices for dimension field
+    DIMENSION_CHOICES = (
+        (DEPARTMENT, "Active employees per department"),
+        (EMPLOYEE_TYPE, "Active employees per employee type"),
+        (GENDER, "Active employees per gender"),
+        (NATIONALITY, "Active employees per nationality"),
+        (HIRES, "Hires per month"),
+        (LEAVERS, "Leavers per month"),
+    )
+
+    dimension = models.CharField(choices=DIMENSION_CHOICES, max_length=13)
+    # Department or employee type id, gender, country code or YYYY-MM month
+    key = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key'], name='headcount_dimension_key_unique'),
+        ]
+        verbose_name_plural = "headcount summaries"
+
+    def __str__(self):
+        return f'{self.dimension} {self.key}: {self.count}'
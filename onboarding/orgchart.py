@@ -0,0 +1,63 @@
+"""
+Org chart of the department hierarchy. Departments store the materialized
+path of their ancestors (see Department.path), so the chart is built from one
+prefix query for the departments and their heads and one grouped query for
+the member counts, whatever the depth of the tree.
+"""
+from django.db.models import Count
+from .models import Employee, Department
+
+
+def get_org_chart(root=None):
+    """
+    Returns the trees of active departments, only the one of `root` when
+    given, with their heads and the active employees of each department and
+    of its subtree. Departments below an inactive department are roots.
+    """
+    departments = Department.objects.filter(is_active=True)
+    if root is not None:
+        departments = departments.subtree(root)
+    rows = departments.values(
+        'pk', 'code', 'name', 'parent_id',
+        'head__employee_number', 'head__first_name', 'head__last_name',
+    )
+    counts = dict(
+        Employee.objects.filter(is_active=True, department__in=departments.values('pk'))
+        .values_list('department_id').annotate(count=Count('pk')).order_by()
+    )
+
+    nodes = {}
+    parents = {}
+    for row in rows:
+        head = None
+        if row['head__employee_number'] is not None:
+            head = {
+                'employee_number': row['head__employee_number'],
+                'first_name': row['head__first_name'],
+                'last_name': row['head__last_name'],
+            }
+        members = counts.get(row['pk'], 0)
+        node = nodes[row['pk']] = {
+            'code': row['code'],
+            'name': row['name'],
+            'head': head,
+            'members': members,
+            'total_members': members,
+            'children': [],
+        }
+        parents[row['pk']] = row['parent_id']
+
+    roots = []
+    for pk, node in nodes.items():
+        parent = nodes.get(parents[pk])
+        (parent['children'] if parent else roots).append(node)
+
+    def add_totals(node):
+        for child in node['children']:
+            node['total_members'] += add_totals(child)
+        node['children'].sort(key=lambda child: child['code'])
+        return node['total_members']
+
+    for node in roots:
+        add_totals(node)
+    return sorted(roots, key=lambda node: node['code'])
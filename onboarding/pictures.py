@@ -0,0 +1,124 @@
+"""
+Profile picture uploads. Clients upload straight to S3 with a presigned POST
+and confirm the upload afterwards, so the file never goes through a worker.
+Storages that cannot presign, such as FileSystemStorage in development and
+tests, are uploaded to through the API instead. Thumbnails are generated
+afterwards by the `makethumbnails` command.
+
+Pictures stored before thumbnails existed, and pictures whose thumbnails
+failed, have empty thumbnails. Run `makethumbnails --backfill` once after
+deploying, and again after fixing whatever made thumbnails fail.
+"""
+import logging
+import os
+import uuid
+from io import BytesIO
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+from storages.backends.s3boto3 import S3Boto3Storage
+from .models import Employee
+
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_SALT = 'onboarding.pictures.upload'
+
+def get_storage():
+    return Employee._meta.get_field('profile_picture').storage
+
+def create_upload(employee, filename, content_type):
+    """
+    Reserves a storage key for a new profile picture of the employee and
+    returns how to upload it. `token` is signed and confirms the upload.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    key = f'{Employee.PROFILE_PICTURE_DIR}{uuid.uuid4().hex}{extension}'
+    token = signing.dumps({'employee': employee.pk, 'key': key, 'content_type': content_type}, salt=UPLOAD_SALT)
+    upload = {'key': key, 'token': token, 'url': None, 'fields': {}}
+
+    storage = get_storage()
+    if isinstance(storage, S3Boto3Storage):
+        post = storage.bucket.meta.client.generate_presigned_post(
+            Bucket=storage.bucket_name,
+            Key=storage._normalize_name(key),
+            Fields={'Content-Type': content_type},
+            Conditions=[
+                {'Content-Type': content_type},
+                ['content-length-range', 1, settings.PROFILE_PICTURE_MAX_SIZE],
+            ],
+            ExpiresIn=settings.PROFILE_PICTURE_UPLOAD_EXPIRE,
+        )
+        upload.update(url=post['url'], fields=post['fields'])
+    return upload
+
+def read_upload_token(employee, token):
+    "Returns the key and content type of an upload reserved for the employee."
+    data = signing.loads(token, salt=UPLOAD_SALT, max_age=settings.PROFILE_PICTURE_UPLOAD_EXPIRE)
+    if data['employee'] != employee.pk:
+        raise signing.BadSignature('The upload was reserved for another employee.')
+    return data['key'], data['content_type']
+
+def save_upload(key, file):
+    "Stores a file uploaded through the API, for storages that cannot presign."
+    return get_storage().save(key, file)
+
+def confirm_upload(employee, key):
+    """
+    Sets an uploaded file as the employee's profile picture, queueing it
+    for thumbnailing, and deletes the previous picture and thumbnails.
+    """
+    previous = [employee.profile_picture.name, *(employee.profile_picture_thumbnails or {}).values()]
+    employee.profile_picture.name = key
+    employee.profile_picture_thumbnails = None
+    employee.save(update_fields=['profile_picture', 'profile_picture_thumbnails', 'updated_at'])
+
+    storage = get_storage()
+    for name in filter(None, previous):
+        transaction.on_commit(lambda name=name: storage.delete(name))
+
+def render_thumbnails(file):
+    "Returns JPEG thumbnails of an image file, keyed by the names of PROFILE_PICTURE_THUMBNAIL_SIZES."
+    with Image.open(file) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        thumbnails = {}
+        for name, size in settings.PROFILE_PICTURE_THUMBNAIL_SIZES.items():
+            buffer = BytesIO()
+            ImageOps.fit(image, (size, size)).save(buffer, 'JPEG', quality=85, optimize=True)
+            thumbnails[name] = buffer.getvalue()
+    return thumbnails
+
+def make_thumbnails(batch_size, after=None):
+    """
+    Generates the thumbnails of a batch of profile pictures waiting for them
+    and returns the employees processed. Files that are not images, or that
+    fail, get empty thumbnails. With `after`, a primary key, the batch is
+    instead the pictures above it with empty thumbnails, in key order.
+    """
+    storage = get_storage()
+    queryset = Employee.objects.select_for_update(skip_locked=True).filter(profile_picture__gt='')
+    if after is None:
+        queryset = queryset.filter(profile_picture_thumbnails__isnull=True).order_by('updated_at')
+    else:
+        queryset = queryset.filter(pk__gt=after, profile_picture_thumbnails={}).order_by('pk')
+    with transaction.atomic():
+        employees = list(queryset.only('profile_picture', 'profile_picture_thumbnails')[:batch_size])
+        for employee in employees:
+            stem = os.path.splitext(os.path.basename(employee.profile_picture.name))[0]
+            try:
+                with storage.open(employee.profile_picture.name) as file:
+                    thumbnails = render_thumbnails(file)
+            except Exception as exc:
+                logger.warning(f'Failed to make thumbnails of {employee.profile_picture.name}: {exc}')
+                thumbnails = {}
+            employee.profile_picture_thumbnails = {
+                name: storage.save(f'{Employee.PROFILE_PICTURE_DIR}thumbnails/{stem}_{name}.jpg', ContentFile(content))
+                for name, content in thumbnails.items()
+            }
+            employee.updated_at = timezone.now()
+
+        Employee.objects.bulk_update(employees, ['profile_picture_thumbnails', 'updated_at'])
+    return employees
@@ -0,0 +1,46 @@
+import csv
+import json
+from rest_framework.renderers import BaseRenderer
+
+
+class Echo:
+    """A file-like object whose write returns the value written, for csv.writer."""
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def stream(self, columns, rows):
+        "Yields a header line followed by one line per row."
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow(row)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Used for non-streamed responses such as errors.
+        if isinstance(data, dict):
+            data = [data]
+        columns = list(data[0]) if data else []
+        return ''.join(self.stream(columns, ([row.get(column) for column in columns] for row in data)))
+
+
+class JSONLinesRenderer(BaseRenderer):
+    media_type = 'application/jsonl'
+    format = 'jsonl'
+    charset = 'utf-8'
+
+    def stream(self, columns, rows):
+        "Yields one JSON object per row."
+        for row in rows:
+            yield json.dumps(dict(zip(columns, row)), default=str) + '\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Used for non-streamed responses such as errors.
+        if isinstance(data, dict):
+            data = [data]
+        return ''.join(json.dumps(row, default=str) + '\n' for row in data)
@@ -1,17 +1,34 @@
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.core import signing
 from datetime import date
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
-from .models import Employee, Job, Department, EmployeeType
+from .models import Employee, Job, Department, EmployeeType, Invitation, phone_number_validator
+from .pictures import read_upload_token
 from .signals import send_invite_mail
 from accounts.serializers import CustomUserSerializer, CreateEmployeeUserSerializer
+from accounts.values import ValuesSerializer
 
 
 User = get_user_model()
 
+class ThumbnailsField(serializers.Field):
+    "Renders the thumbnails of a profile picture as URLs by size name, null while they are made."
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        storage = Employee._meta.get_field('profile_picture').storage
+        return {name: storage.url(thumbnail) for name, thumbnail in value.items()}
+
+
 class EmployeeSerializer(serializers.ModelSerializer):
     user = CustomUserSerializer(read_only=True)
+    # Uploaded through the picture action, see onboarding.pictures
+    profile_picture = serializers.ImageField(read_only=True)
+    profile_picture_thumbnails = ThumbnailsField()
     job = serializers.SlugRelatedField(queryset=Job.objects.all(), slug_field="title")
     department = serializers.SlugRelatedField(queryset=Department.objects.all(), slug_field="code")
     employee_type = serializers.SlugRelatedField(queryset=EmployeeType.objects.all(), slug_field="code")
@@ -20,12 +37,20 @@ class EmployeeSerializer(serializers.ModelSerializer):
         model = Employee
         fields = '__all__'
         read_only_fields = ['resignation_date','is_leave','is_active','created_at','updated_at']
+        # Relations rendered by this serializer, see EmployeeQuerySet.for_serializer
+        select_related = ['user', 'job', 'department', 'employee_type']
+        prefetch_related = ['user__groups']
     
 
+class EmployeeValuesSerializer(ValuesSerializer):
+    serializer_class = EmployeeSerializer
+
 
 class CreateEmployeeSerializer(EmployeeSerializer):
     user = CreateEmployeeUserSerializer(required=True)
     send_invite = serializers.BooleanField(default=True, write_only=True)
+    # Id of the queued invitation, omitted when no invite is sent
+    invitation = serializers.IntegerField(source='invitation_id', read_only=True)
 
     class Meta:
         model = Employee
@@ -44,11 +69,67 @@ class CreateEmployeeSerializer(EmployeeSerializer):
             return exc
 
         if send_invite:
-            send_invite_mail.send(
+            [(receiver, invitation)] = send_invite_mail.send(
                 sender=self.__class__, user=user, request=request,
             )
+            employee.invitation_id = invitation.pk
         return employee
 
+class EmployeeImportSerializer(serializers.Serializer):
+    default_error_messages = {
+        "invalid_format": _("Upload a CSV (.csv) or JSON Lines (.jsonl) file.")
+    }
+    file = serializers.FileField()
+    send_invite = serializers.BooleanField(default=False)
+
+    def validate_file(self, value):
+        if not value.name.lower().endswith(('.csv', '.jsonl')):
+            self.fail("invalid_format")
+        return value
+
+
+class EmployeeImportRowSerializer(serializers.ModelSerializer):
+    """
+    Validates one row of an employee import. Relations are resolved from the
+    `jobs`, `departments` and `employee_types` maps passed in the context,
+    and uniqueness is checked per chunk by `onboarding.bulk`.
+    """
+    default_error_messages = {
+        "does_not_exist": _("Object with {slug_name}={value} does not exist.")
+    }
+    email = serializers.EmailField()
+    job = serializers.CharField()
+    department = serializers.CharField()
+    employee_type = serializers.CharField()
+
+    class Meta:
+        model = Employee
+        fields = [
+            'email', 'first_name', 'middle_name', 'last_name', 'gender', 'd_o_b',
+            'marital_status', 'religion', 'nationality', 'phone_number', 'address',
+            'job', 'department', 'employee_type', 'employment_date',
+        ]
+        extra_kwargs = {'phone_number': {'validators': [phone_number_validator]}}
+
+    def resolve(self, map_name, slug_name, value):
+        try:
+            return self.context[map_name][value]
+        except KeyError:
+            self.fail("does_not_exist", slug_name=slug_name, value=value)
+
+    def validate_email(self, value):
+        return User.objects.normalize_email(value)
+
+    def validate_job(self, value):
+        return self.resolve('jobs', 'title', value)
+
+    def validate_department(self, value):
+        return self.resolve('departments', 'code', value)
+
+    def validate_employee_type(self, value):
+        return self.resolve('employee_types', 'code', value)
+
+
 class DeleteEmployeeSerializer(serializers.Serializer):
     email = serializers.EmailField()
     resignation_date = serializers.DateField(default=date.today())
@@ -65,6 +146,81 @@ class DeleteEmployeeSerializer(serializers.Serializer):
             self.fail("invalid_email")
 
 
+class BulkEmployeeSerializer(serializers.Serializer):
+    default_error_messages = {
+        "not_found": _("Employees with these numbers do not exist: {numbers}.")
+    }
+    employee_numbers = serializers.ListField(
+        child=serializers.CharField(), allow_empty=False, max_length=settings.EMPLOYEE_BULK_UPDATE_LIMIT
+    )
+
+    def validate_employee_numbers(self, value):
+        "Resolves the numbers to (pk, user_id, employee_number) rows by primary key."
+        employees = Employee.objects.only('user_id', 'employee_number').get_by_numbers(value)
+        missing = set(value) - employees.keys()
+        if missing:
+            self.fail("not_found", numbers=', '.join(sorted(missing)))
+        return [(employee.pk, employee.user_id, number) for number, employee in employees.items()]
+
+
+class BulkReassignSerializer(BulkEmployeeSerializer):
+    default_error_messages = {
+        "no_changes": _("Provide a job, department or employee type to assign.")
+    }
+    job = serializers.SlugRelatedField(queryset=Job.objects.all(), slug_field="title", required=False)
+    department = serializers.SlugRelatedField(queryset=Department.objects.all(), slug_field="code", required=False)
+    employee_type = serializers.SlugRelatedField(queryset=EmployeeType.objects.all(), slug_field="code", required=False)
+
+    def validate(self, attrs):
+        if len(attrs) == 1:
+            self.fail("no_changes")
+        return attrs
+
+
+class BulkDeactivateSerializer(BulkEmployeeSerializer):
+    resignation_date = serializers.DateField(default=date.today)
+
+
+class ProfilePictureUploadSerializer(serializers.Serializer):
+    default_error_messages = {
+        "invalid_content_type": _("Upload one of these image types: {content_types}.")
+    }
+    filename = serializers.CharField(max_length=100)
+    content_type = serializers.CharField()
+
+    def validate_content_type(self, value):
+        if value not in settings.PROFILE_PICTURE_CONTENT_TYPES:
+            self.fail("invalid_content_type", content_types=', '.join(settings.PROFILE_PICTURE_CONTENT_TYPES))
+        return value
+
+
+class ProfilePictureConfirmSerializer(serializers.Serializer):
+    "Confirms an upload reserved for the employee the serializer is given."
+    default_error_messages = {
+        "invalid_token": _("The upload token is invalid or has expired.")
+    }
+    token = serializers.CharField()
+
+    def validate_token(self, value):
+        "Returns the key and content type of the upload, see onboarding.pictures."
+        try:
+            return read_upload_token(self.instance, value)
+        except signing.BadSignature:
+            self.fail("invalid_token")
+
+
+class ProfilePictureFileSerializer(ProfilePictureConfirmSerializer):
+    default_error_messages = {
+        "too_large": _("Upload a file of at most {max_size} bytes.")
+    }
+    file = serializers.ImageField()
+
+    def validate_file(self, value):
+        if value.size > settings.PROFILE_PICTURE_MAX_SIZE:
+            self.fail("too_large", max_size=settings.PROFILE_PICTURE_MAX_SIZE)
+        return value
+
+
 class JobSerializer(serializers.ModelSerializer):
     class Meta:
         model = Job
@@ -72,13 +228,42 @@ class JobSerializer(serializers.ModelSerializer):
         read_only_fields = ['is_active']
 
 
+class JobValuesSerializer(ValuesSerializer):
+    serializer_class = JobSerializer
+
+
+class EmployeeNumberRelatedField(serializers.SlugRelatedField):
+    "An employee relation resolved by primary key, see EmployeeQuerySet.get_by_numbers."
+    def __init__(self, **kwargs):
+        kwargs.setdefault('slug_field', 'employee_number')
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            self.fail('invalid')
+        try:
+            return self.get_queryset().get_by_number(data)
+        except Employee.DoesNotExist:
+            self.fail('does_not_exist', slug_name=self.slug_field, value=data)
+
+
 class DepartmentSerializer(serializers.ModelSerializer):
-    head = serializers.SlugRelatedField(queryset=Employee.objects.all(), slug_field="employee_number", allow_null=True)
+    head = EmployeeNumberRelatedField(queryset=Employee.objects.all(), allow_null=True)
+    parent = serializers.SlugRelatedField(slug_field='code', queryset=Department.objects.all(), allow_null=True, required=False)
     class Meta:
         model = Department
-        fields = '__all__'
+        exclude = ['path']
         read_only_fields = ['is_active']
 
+    def validate_parent(self, value):
+        if value is not None and self.instance is not None and value.is_descendant_of(self.instance):
+            raise serializers.ValidationError(_("A department cannot be placed below itself."))
+        return value
+
+
+class DepartmentValuesSerializer(ValuesSerializer):
+    serializer_class = DepartmentSerializer
+
 
 class EmployeeTypeSerializer(serializers.ModelSerializer):
     class Meta:
@@ -87,6 +272,10 @@ class EmployeeTypeSerializer(serializers.ModelSerializer):
         read_only_fields = ['is_active']
 
 
+class EmployeeTypeValuesSerializer(ValuesSerializer):
+    serializer_class = EmployeeTypeSerializer
+
+
 class SendInviteSerializer(serializers.Serializer):
     default_error_messages = {
         "email_not_found": 'User with given email does not exists.'
@@ -103,4 +292,37 @@ class SendInviteSerializer(serializers.Serializer):
         except User.DoesNotExist:
             pass
         
-        self.fail("email_not_found")
\ No newline at end of file
+        self.fail("email_not_found")
+
+
+class InvitationSerializer(serializers.ModelSerializer):
+    user = serializers.SlugRelatedField(read_only=True, slug_field='email')
+
+    class Meta:
+        model = Invitation
+        fields = ['id', 'user', 'status', 'attempts', 'last_error', 'sent_at', 'created_at']
+
+
+class OrgChartHeadSerializer(serializers.Serializer):
+    employee_number = serializers.CharField()
+    first_name = serializers.CharField()
+    last_name = serializers.CharField()
+
+
+class OrgChartSerializer(serializers.Serializer):
+    code = serializers.CharField()
+    name = serializers.CharField()
+    head = OrgChartHeadSerializer(allow_null=True)
+    members = serializers.IntegerField(help_text=_("Active employees of the department itself."))
+    total_members = serializers.IntegerField(help_text=_("Active employees of the department and the departments below it."))
+    children = serializers.ListField(child=serializers.DictField(), help_text=_("The departments below, in the same shape."))
+
+
+class HeadcountSerializer(serializers.Serializer):
+    headcount = serializers.IntegerField(help_text=_("Number of active employees."))
+    department = serializers.DictField(child=serializers.IntegerField(), help_text=_("Active employees per department code."))
+    employee_type = serializers.DictField(child=serializers.IntegerField(), help_text=_("Active employees per employee type code."))
+    gender = serializers.DictField(child=serializers.IntegerField(), help_text=_("Active employees per gender."))
+    nationality = serializers.DictField(child=serializers.IntegerField(), help_text=_("Active employees per country code."))
+    hires = serializers.DictField(child=serializers.IntegerField(), help_text=_("Hires per YYYY-MM month."))
+    leavers = serializers.DictField(child=serializers.IntegerField(), help_text=_("Leavers per YYYY-MM month."))
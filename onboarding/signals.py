@@ -1,7 +1,13 @@
+import json
+from django.contrib.admin.models import LogEntry, CHANGE
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
 from django.dispatch import Signal, receiver
-from django.conf import settings
-from django.contrib.auth.tokens import default_token_generator
-from .utils import encode_uid
+from accounts.authentication import revoke_user_tokens
+from .analytics import take_snapshot, get_deltas, apply_deltas, SNAPSHOT_FIELDS
+from .caching import bump_model_version
+from .mail import build_invitation
+from .models import Employee, Job, Department, EmployeeType
 
 # Send invitation mail.
 send_invite_mail = Signal()
@@ -9,24 +15,64 @@ send_invite_mail = Signal()
 # Deactivate Employee User
 deactivate_employee_user = Signal()
 
+# Employees changed together by onboarding.bulk.update_employees
+employees_bulk_updated = Signal()
+
 @receiver(send_invite_mail)
 def send_invitation_mail(sender, user, request, **kwargs):
-    uid = encode_uid(user.pk)
-    token = default_token_generator.make_token(user)
-    context = {
-        'site_name': settings.SITE_NAME,
-        'protocol': 'https' if request.is_secure() else 'http',
-        'domain': settings.DOMAIN,
-        'url': f'employee-invitation/{uid}/{token}',
-    }
-    sender = settings.AWS_SES_FROM_EMAIL
-
-    response = user.send_mail(email_template='invite', sender=sender, context=context)
-    return response
+    # Delivered by the `sendinvitations` command
+    invitation = build_invitation(user, request)
+    invitation.save()
+    return invitation
 
 @receiver(deactivate_employee_user)
 def deactivate_employee_user(sender, user, **kwargs):
     user.is_active = False
     user.save()
+    revoke_user_tokens([user.pk])
+
+@receiver(employees_bulk_updated)
+def log_employees_bulk_update(sender, user, employee_numbers, changes, **kwargs):
+    "Records a bulk update as one admin log entry."
+    LogEntry.objects.create(
+        user_id=user.pk,
+        content_type=ContentType.objects.get_for_model(sender),
+        object_repr=f'{len(employee_numbers)} employees',
+        action_flag=CHANGE,
+        change_message=json.dumps({'changes': changes, 'employee_numbers': employee_numbers}, default=str),
+    )
+
+@receiver(post_save, sender=Employee)
+@receiver(post_save, sender=Job)
+@receiver(post_save, sender=Department)
+@receiver(post_save, sender=EmployeeType)
+@receiver(post_delete, sender=Employee)
+@receiver(post_delete, sender=Job)
+@receiver(post_delete, sender=Department)
+@receiver(post_delete, sender=EmployeeType)
+def invalidate_cached_responses(sender, **kwargs):
+    """Invalidates the responses cached by CachedResponseMixin."""
+    bump_model_version(sender)
+
+@receiver(post_init, sender=Employee)
+def snapshot_headcount_fields(sender, instance, **kwargs):
+    # Values the headcount summaries were last counted with
+    instance._headcount_snapshot = take_snapshot(instance)
+
+@receiver(pre_save, sender=Employee)
+def load_headcount_fields(sender, instance, **kwargs):
+    # Instances loaded with deferred fields are snapshotted from the database
+    if instance._headcount_snapshot is None and not instance._state.adding:
+        instance._headcount_snapshot = sender.objects.filter(pk=instance.pk).values(*SNAPSHOT_FIELDS).first()
 
+@receiver(post_save, sender=Employee)
+def update_headcount(sender, instance, created, **kwargs):
+    old = None if created else instance._headcount_snapshot
+    new = {name: instance.__dict__.get(name, (old or {}).get(name)) for name in SNAPSHOT_FIELDS}
+    apply_deltas(get_deltas([old] if old else [], [new]))
+    instance._headcount_snapshot = new
 
+@receiver(post_delete, sender=Employee)
+def remove_from_headcount(sender, instance, **kwargs):
+    if instance._headcount_snapshot is not None:
+        apply_deltas(get_deltas([instance._headcount_snapshot], []))
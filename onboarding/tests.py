@@ -1,3 +1,888 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+import json
+import shutil
+import tempfile
+import time
+from datetime import date
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.models import Group
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+from asgiref.sync import sync_to_async
+from PIL import Image
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+from storages.backends.s3boto3 import S3Boto3Storage
+from core.metrics import registry
+from core.storages import CachedS3Storage
+from accounts.authentication import is_user_revoked
+from . import async_views
+from .analytics import get_headcount
+from .serializers import (
+    EmployeeSerializer, EmployeeValuesSerializer, DepartmentSerializer, DepartmentValuesSerializer,
+)
+from .mail import deliver_invitations
+from .models import Employee, Job, Department, EmployeeType, Invitation, HeadcountSummary
 
-# Create your tests here.
+
+User = get_user_model()
+
+
+class EmployeeTestMixin:
+    """Creates the reference data shared by employee tests."""
+
+    def setUp(self):
+        # Cached versions and group names outlive the rolled back rows
+        cache.clear()
+        self.employee_group = Group.objects.create(name='Employee')
+        self.hr_group = Group.objects.create(name='HR')
+        self.job = Job.objects.create(title='Engineer')
+        self.department = Department.objects.create(name='Engineering', code='ENG')
+        self.employee_type = EmployeeType.objects.create(name='Full-Time Employees', code='FTE')
+        self.admin = User.objects.create_user(email='admin@email.com', password='password', is_staff=True, is_active=True)
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(user=self.admin)
+
+    def create_employee(self, index, **extra_fields):
+        user = User.objects.create_employee_user(email=f'employee{index}@email.com')
+        fields = {
+            'first_name': 'john',
+            'middle_name': 'james',
+            'last_name': 'doe',
+            'gender': 'Male',
+            'd_o_b': '1990-01-01',
+            'marital_status': 'Single',
+            'religion': 'Others',
+            'nationality': 'NG',
+            'phone_number': f'+23480{index:08d}',
+            'address': '1 Main Street',
+            'job': self.job,
+            'department': self.department,
+            'employee_type': self.employee_type,
+        }
+        fields.update(extra_fields)
+        return Employee.objects.create(user=user, **fields)
+
+
+class EmployeeQueryCountTest(EmployeeTestMixin, TestCase):
+    def count_list_queries(self, page_size):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/onboarding/employees/', {'page_size': page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(context.captured_queries)
+
+    def test_list_query_count_is_constant(self):
+        for index in range(12):
+            self.create_employee(index)
+
+        self.assertEqual(self.count_list_queries(2), self.count_list_queries(12))
+
+    def test_retrieve_loads_relations_up_front(self):
+        employee = self.create_employee(0)
+        employee.refresh_from_db()
+        url = f'/onboarding/employees/{employee.employee_number}/'
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['job'], 'Engineer')
+        self.assertEqual(response.data['user']['groups'], ['Employee'])
+        # The employee with its relations, and the groups prefetch.
+        self.assertEqual(len(context.captured_queries), 2)
+
+
+class EmployeePaginationTest(EmployeeTestMixin, TestCase):
+    def test_list_is_cursor_paginated_by_employee_number(self):
+        for index in range(5):
+            self.create_employee(index)
+
+        response = self.client.get('/onboarding/employees/', {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        numbers = [employee['employee_number'] for employee in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            numbers += [employee['employee_number'] for employee in response.data['results']]
+
+        self.assertEqual(numbers, sorted(Employee.objects.values_list('employee_number', flat=True)))
+
+    def test_page_size_is_capped(self):
+        self.create_employee(0)
+        response = self.client.get('/onboarding/employees/', {'page_size': 10000})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class InvitationTest(EmployeeTestMixin, TestCase):
+    def test_invite_is_queued_and_delivered(self):
+        employee = self.create_employee(0)
+        response = self.client.post('/onboarding/employees/invite/', {'email': employee.user.email})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(mail.outbox), 0)
+
+        invitation_id = response.data['invitation']
+        response = self.client.get(f'/onboarding/invitations/{invitation_id}/')
+        self.assertEqual(response.data['status'], Invitation.PENDING)
+
+        self.assertEqual(len(deliver_invitations(batch_size=10)), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [employee.user.email])
+        response = self.client.get(f'/onboarding/invitations/{invitation_id}/')
+        self.assertEqual(response.data['status'], Invitation.SENT)
+
+    @override_settings(INVITATION_MAX_ATTEMPTS=2, INVITATION_RETRY_DELAY=0)
+    def test_failed_delivery_is_retried(self):
+        employee = self.create_employee(0)
+        self.client.post('/onboarding/employees/invite/', {'email': employee.user.email})
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('timeout')):
+            deliver_invitations(batch_size=10)
+            invitation = Invitation.objects.get()
+            self.assertEqual((invitation.status, invitation.attempts), (Invitation.PENDING, 1))
+
+            deliver_invitations(batch_size=10)
+            invitation.refresh_from_db()
+            self.assertEqual((invitation.status, invitation.attempts), (Invitation.FAILED, 2))
+            self.assertEqual(invitation.last_error, 'timeout')
+
+    async def test_async_invite(self):
+        employee = await sync_to_async(self.create_employee)(0)
+        access = str(RefreshToken.for_user(self.admin).access_token)
+        request = AsyncRequestFactory().post(
+            '/onboarding/employees/invite/', {'email': employee.user.email},
+            content_type='application/json', headers={'Authorization': f'JWT {access}'}, SERVER_NAME='localhost',
+        )
+        response = await async_views.invite(request)
+        self.assertEqual(response.status_code, 202)
+        invitation = await Invitation.objects.aget()
+        self.assertEqual(json.loads(response.content)['invitation'], invitation.pk)
+        self.assertEqual(invitation.status, Invitation.PENDING)
+
+
+class EmployeeImportTest(EmployeeTestMixin, TestCase):
+    header = 'email,first_name,middle_name,last_name,gender,d_o_b,marital_status,religion,nationality,phone_number,address,job,department,employee_type\n'
+
+    def csv_row(self, index, **values):
+        row = {
+            'email': f'import{index}@email.com', 'first_name': 'jane', 'middle_name': 'ann',
+            'last_name': 'doe', 'gender': 'Female', 'd_o_b': '1990-01-01', 'marital_status': 'Single',
+            'religion': 'Others', 'nationality': 'NG', 'phone_number': f'+23490{index:08d}',
+            'address': '1 Main Street', 'job': 'Engineer', 'department': 'ENG', 'employee_type': 'FTE',
+        }
+        row.update(values)
+        return ','.join(row.values()) + '\n'
+
+    def upload(self, name, content, **data):
+        upload = SimpleUploadedFile(name, content.encode())
+        return self.client.post('/onboarding/employees/bulk/', {'file': upload, **data}, format='multipart')
+
+    @override_settings(EMPLOYEE_IMPORT_CHUNK_SIZE=2)
+    def test_csv_import(self):
+        content = self.header + ''.join([
+            self.csv_row(0),
+            self.csv_row(1, department='NOPE'),
+            self.csv_row(2),
+            self.csv_row(3, email='import0@email.com'),
+            self.csv_row(4),
+        ])
+        response = self.upload('employees.csv', content, send_invite=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 4])
+        self.assertIn('department', response.data['errors'][0]['errors'])
+        self.assertIn('email', response.data['errors'][1]['errors'])
+
+        employee = Employee.objects.get(user__email='import2@email.com')
+        self.assertEqual(employee.first_name, 'Jane')
+        self.assertEqual(list(employee.user.groups.values_list('name', flat=True)), ['Employee'])
+        self.assertFalse(employee.user.has_usable_password())
+        self.assertEqual(Invitation.objects.count(), 3)
+
+    def test_jsonl_import(self):
+        content = '\n'.join([
+            '{"email": "import0@email.com", "first_name": "jane", "middle_name": "ann", "last_name": "doe", '
+            '"gender": "Female", "d_o_b": "1990-01-01", "marital_status": "Single", "religion": "Others", '
+            '"nationality": "NG", "phone_number": "+2349000000000", "address": "1 Main Street", '
+            '"job": "Engineer", "department": "ENG", "employee_type": "FTE"}',
+            'not json',
+        ])
+        response = self.upload('employees.jsonl', content)
+
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'][0]['row'], 2)
+        self.assertEqual(Invitation.objects.count(), 0)
+
+    def test_rejects_unknown_format(self):
+        response = self.upload('employees.xml', '<employees/>')
+        self.assertEqual(response.status_code, 400)
+
+
+class EmployeeBulkUpdateTest(EmployeeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.employees = [self.create_employee(index) for index in range(3)]
+        self.numbers = [employee.employee_number for employee in self.employees]
+
+    def test_reassign(self):
+        finance = Department.objects.create(name='Finance', code='FIN')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                '/onboarding/employees/reassign/',
+                {'employee_numbers': self.numbers, 'department': 'FIN'},
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'updated': 3})
+        self.assertEqual(Employee.objects.filter(department=finance).count(), 3)
+        updates = [query for query in context.captured_queries if query['sql'].startswith('UPDATE "onboarding_employee"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(LogEntry.objects.count(), 1)
+
+    def test_reassign_requires_a_change(self):
+        response = self.client.post(
+            '/onboarding/employees/reassign/', {'employee_numbers': self.numbers}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_employee_number(self):
+        response = self.client.post(
+            '/onboarding/employees/reassign/',
+            {'employee_numbers': [self.numbers[0], 'RBS-1999-9999'], 'job': 'Engineer'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('RBS-1999-9999', str(response.data['employee_numbers']))
+
+    def test_deactivate(self):
+        response = self.client.post(
+            '/onboarding/employees/deactivate/',
+            {'employee_numbers': self.numbers[:2], 'resignation_date': '2024-06-30'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'updated': 2})
+        leavers = Employee.objects.filter(is_active=False).select_related('user')
+        self.assertEqual(len(leavers), 2)
+        for employee in leavers:
+            self.assertEqual(employee.resignation_date, date(2024, 6, 30))
+            self.assertFalse(employee.user.is_active)
+            self.assertTrue(is_user_revoked(employee.user_id))
+        self.assertTrue(Employee.objects.get(pk=self.employees[2].pk).is_active)
+        entry = LogEntry.objects.get()
+        self.assertEqual(entry.object_repr, '2 employees')
+
+
+class EmployeeNumberLookupTest(EmployeeTestMixin, TestCase):
+    def test_lookup_by_primary_key(self):
+        employee = self.create_employee(1)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(Employee.objects.get_by_number(employee.employee_number), employee)
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertIn('"id" IN', context.captured_queries[0]['sql'])
+
+    def test_year_is_checked(self):
+        employee = self.create_employee(1, employment_date=date(2020, 1, 1))
+        with self.assertRaises(Employee.DoesNotExist):
+            Employee.objects.get_by_number(employee.employee_number.replace('2020', '2021'))
+
+    def test_truncated_number(self):
+        # LPad keeps the first four digits of ids above 9999
+        employee = self.create_employee(1, id=12345, employment_date=date(2020, 1, 1))
+        self.assertEqual(employee.employee_number, 'RBS-2020-1234')
+        self.assertEqual(Employee.objects.get_by_number('RBS-2020-1234'), employee)
+
+    def test_batch(self):
+        employees = [self.create_employee(index) for index in range(3)]
+        numbers = [employee.employee_number for employee in employees]
+        resolved = Employee.objects.get_by_numbers(numbers + ['RBS-1999-0001', 'invalid'])
+        self.assertEqual(resolved, dict(zip(numbers, employees)))
+
+    def test_department_head(self):
+        employee = self.create_employee(1)
+        response = self.client.patch(
+            '/onboarding/departments/ENG/', {'head': employee.employee_number}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Department.objects.get(code='ENG').head, employee)
+        response = self.client.patch('/onboarding/departments/ENG/', {'head': 'RBS-1999-0001'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class HeadcountTest(EmployeeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.employees = [
+            self.create_employee(index, employment_date=date(2024, 1 + index, 1)) for index in range(3)
+        ]
+        self.finance = Department.objects.create(name='Finance', code='FIN')
+
+    def assertSummariesMatch(self):
+        self.assertEqual(get_headcount(), get_headcount(live=True))
+
+    def test_incremental_updates(self):
+        headcount = get_headcount()
+        self.assertEqual(headcount['headcount'], 3)
+        self.assertEqual(headcount['department'], {'ENG': 3})
+        self.assertEqual(headcount['hires'], {'2024-01': 1, '2024-02': 1, '2024-03': 1})
+
+        employee = self.employees[0]
+        employee.department = self.finance
+        employee.gender = 'Female'
+        employee.save()
+        self.assertSummariesMatch()
+
+        employee = Employee.objects.only('user_id').get(pk=self.employees[1].pk)
+        employee.deactivate_employee(date(2024, 6, 30))
+        self.assertSummariesMatch()
+        self.assertEqual(get_headcount()['leavers'], {'2024-06': 1})
+
+        self.employees[2].delete()
+        self.assertSummariesMatch()
+        self.assertEqual(get_headcount()['headcount'], 1)
+
+    def test_bulk_updates(self):
+        numbers = [employee.employee_number for employee in self.employees]
+        self.client.post('/onboarding/employees/reassign/', {'employee_numbers': numbers[:2], 'department': 'FIN'}, format='json')
+        self.client.post('/onboarding/employees/deactivate/', {'employee_numbers': numbers[1:]}, format='json')
+        self.assertSummariesMatch()
+        self.assertEqual(get_headcount()['department'], {'FIN': 1})
+
+    def test_refresh(self):
+        HeadcountSummary.objects.update(count=0)
+        call_command('refreshheadcount', stdout=open('/dev/null', 'w'))
+        self.assertSummariesMatch()
+        self.assertEqual(get_headcount()['headcount'], 3)
+
+    def test_endpoint(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/onboarding/analytics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['headcount'], 3)
+        self.assertEqual(response.data['employee_type'], {'FTE': 3})
+        self.assertEqual(response.data['nationality'], {'NG': 3})
+        self.assertEqual(len(context.captured_queries), 3)
+
+    def test_requires_hr(self):
+        self.client.force_authenticate(user=self.employees[0].user)
+        self.assertEqual(self.client.get('/onboarding/analytics/').status_code, 403)
+
+
+class ProfilePictureTest(EmployeeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        # A local stand-in for the S3 storage, which cannot presign here
+        self.storage = FileSystemStorage(location=self.media_root, base_url='/media/')
+        patcher = mock.patch.object(Employee._meta.get_field('profile_picture'), 'storage', self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.employee = self.create_employee(1)
+        self.url = f'/onboarding/employees/{self.employee.employee_number}/picture/'
+
+    def make_image(self, name='picture.png', size=(400, 300)):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def upload(self, client=None):
+        client = client or self.client
+        response = client.post(self.url, {'filename': 'picture.png', 'content_type': 'image/png'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        upload = response.data
+        response = client.post(upload['url'], {**upload['fields'], 'file': self.make_image()}, format='multipart')
+        self.assertEqual(response.status_code, 204)
+        return upload
+
+    def test_upload_and_thumbnails(self):
+        upload = self.upload()
+        self.assertTrue(upload['url'].endswith(f'{self.url}upload/'))
+        response = self.client.post(f'{self.url}confirm/', {'token': upload['token']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data['profile_picture_thumbnails'])
+
+        call_command('makethumbnails', stdout=open('/dev/null', 'w'))
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.profile_picture.name, upload['key'])
+        self.assertEqual(set(self.employee.profile_picture_thumbnails), {'small', 'medium'})
+        with Image.open(f'{self.media_root}/{self.employee.profile_picture_thumbnails["small"]}') as thumbnail:
+            self.assertEqual(thumbnail.size, (64, 64))
+
+        response = self.client.get(f'/onboarding/employees/{self.employee.employee_number}/')
+        self.assertTrue(response.data['profile_picture_thumbnails']['medium'].startswith('/media/profile_pictures/thumbnails/'))
+
+    def test_backfill(self):
+        name = self.storage.save('profile_pictures/picture.png', self.make_image())
+        broken = self.create_employee(2, profile_picture=self.storage.save('profile_pictures/broken.png', ContentFile(b'')))
+        Employee.objects.filter(pk=self.employee.pk).update(profile_picture=name)
+        # Waits for thumbnails on new uploads only
+        call_command('makethumbnails', stdout=open('/dev/null', 'w'))
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.profile_picture_thumbnails, {})
+
+        call_command('makethumbnails', '--backfill', '--batch-size=1', stdout=open('/dev/null', 'w'))
+        self.employee.refresh_from_db()
+        self.assertEqual(set(self.employee.profile_picture_thumbnails), {'small', 'medium'})
+        broken.refresh_from_db()
+        self.assertEqual(broken.profile_picture_thumbnails, {})
+
+    def test_replacing_deletes_previous_files(self):
+        first = self.upload()
+        self.client.post(f'{self.url}confirm/', {'token': first['token']}, format='json')
+        call_command('makethumbnails', stdout=open('/dev/null', 'w'))
+        second = self.upload()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'{self.url}confirm/', {'token': second['token']}, format='json')
+        self.assertFalse(self.storage.exists(first['key']))
+        self.assertTrue(self.storage.exists(second['key']))
+
+    def test_own_picture(self):
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(user=self.employee.user)
+        self.upload(client)
+        other = self.create_employee(2)
+        response = client.post(
+            f'/onboarding/employees/{other.employee_number}/picture/',
+            {'filename': 'picture.png', 'content_type': 'image/png'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_uploads(self):
+        response = self.client.post(self.url, {'filename': 'picture.gif', 'content_type': 'image/gif'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        upload = self.client.post(self.url, {'filename': 'picture.png', 'content_type': 'image/png'}, format='json').data
+        response = self.client.post(f'{self.url}confirm/', {'token': upload['token']}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        other = self.create_employee(2)
+        response = self.client.post(
+            f'/onboarding/employees/{other.employee_number}/picture/confirm/', {'token': upload['token']}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+        with self.settings(PROFILE_PICTURE_MAX_SIZE=10):
+            response = self.client.post(upload['url'], {**upload['fields'], 'file': self.make_image()}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+
+class CachedS3StorageTest(TestCase):
+    def setUp(self):
+        self.storage = CachedS3Storage(bucket_name='test', access_key='test', secret_key='test', region_name='us-east-1')
+        patcher = mock.patch.object(
+            S3Boto3Storage, 'url', autospec=True, side_effect=lambda storage, name, *args: f'signed:{name}'
+        )
+        self.url = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_urls_are_reused(self):
+        self.assertEqual(self.storage.url('a.jpg'), 'signed:a.jpg')
+        self.assertEqual(self.storage.url('a.jpg'), 'signed:a.jpg')
+        self.assertEqual(self.url.call_count, 1)
+        self.storage.url('a.jpg', expire=60)
+        self.assertEqual(self.url.call_count, 2)
+
+    def test_urls_expire_before_their_signature(self):
+        self.assertLess(self.storage.url_cache_timeout, self.storage.querystring_expire)
+        self.storage.url('a.jpg')
+        with mock.patch('core.storages.time.monotonic', return_value=time.monotonic() + self.storage.url_cache_timeout):
+            self.storage.url('a.jpg')
+        self.assertEqual(self.url.call_count, 2)
+
+    @override_settings(STORAGE_URL_CACHE_SIZE=2)
+    def test_least_recently_used_are_evicted(self):
+        for name in ('a.jpg', 'b.jpg', 'a.jpg', 'c.jpg', 'a.jpg', 'b.jpg'):
+            self.storage.url(name)
+        self.assertEqual(self.url.call_count, 4)
+
+
+class ValuesSerializerTest(EmployeeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        storage = FileSystemStorage(location=tempfile.gettempdir(), base_url='/media/')
+        patcher = mock.patch.object(Employee._meta.get_field('profile_picture'), 'storage', storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assertSameOutput(self, serializer_class, values_serializer_class, queryset):
+        context = {'request': APIRequestFactory().get('/', SERVER_NAME='localhost')}
+        expected = serializer_class(queryset.order_by('pk'), many=True, context=context).data
+        data = values_serializer_class(queryset.order_by('pk'), context=context).data
+        self.assertEqual(json.loads(json.dumps(data)), json.loads(json.dumps(expected, default=str)))
+
+    def test_employees(self):
+        employee = self.create_employee(1, nationality='GH', resignation_date=date(2024, 6, 30))
+        employee.user.groups.add(self.hr_group)
+        employee.profile_picture.name = 'profile_pictures/picture.jpg'
+        employee.profile_picture_thumbnails = {'small': 'profile_pictures/thumbnails/picture_small.jpg'}
+        employee.save()
+        self.create_employee(2)
+        with self.assertNumQueries(2):
+            EmployeeValuesSerializer(Employee.objects.all()).data
+        self.assertSameOutput(EmployeeSerializer, EmployeeValuesSerializer, Employee.objects.all())
+
+    def test_departments(self):
+        Department.objects.create(name='Finance', code='FIN', head=self.create_employee(1))
+        self.assertSameOutput(DepartmentSerializer, DepartmentValuesSerializer, Department.objects.all())
+
+    def test_list_endpoint(self):
+        for index in range(3):
+            self.create_employee(index)
+        response = self.client.get('/onboarding/employees/', {'page_size': 2, 'ordering': '-employee_number'})
+        self.assertEqual(response.status_code, 200)
+        numbers = [employee['employee_number'] for employee in response.data['results']]
+        response = self.client.get(response.data['next'])
+        numbers += [employee['employee_number'] for employee in response.data['results']]
+        self.assertEqual(numbers, sorted(Employee.objects.values_list('employee_number', flat=True), reverse=True))
+
+
+class MetricsTest(EmployeeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def get_sample(self, text, name):
+        [line] = [line for line in text.splitlines() if line.startswith(name)]
+        return float(line.rsplit(' ', 1)[1])
+
+    def test_requests_are_recorded_by_action(self):
+        self.create_employee(1)
+        self.client.get('/onboarding/employees/')
+        self.client.get('/onboarding/employees/')
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        labels = '{view="EmployeeViewSet.list",method="GET",status="200"}'
+        self.assertEqual(self.get_sample(text, f'http_requests_total{labels}'), 2)
+        self.assertEqual(self.get_sample(text, f'http_request_duration_seconds_count{labels}'), 2)
+        self.assertGreater(self.get_sample(text, f'http_request_db_queries_total{labels}'), 0)
+        self.assertGreater(self.get_sample(text, f'http_request_serialization_duration_seconds_total{labels}'), 0)
+
+    def test_metrics_are_admin_only(self):
+        user = User.objects.create_user(email='hr@email.com', is_active=True)
+        user.groups.add(self.hr_group)
+        self.client.force_authenticate(user=user)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    @override_settings(METRICS_SLOW_REQUEST_THRESHOLD=0, METRICS_SLOW_REQUEST_QUERIES=1)
+    def test_slow_requests_are_logged_with_their_queries(self):
+        with self.assertLogs('core.metrics', 'WARNING') as logs:
+            self.client.get(f'/onboarding/employees/{self.create_employee(1).employee_number}/')
+        [message] = logs.output
+        self.assertIn('EmployeeViewSet.retrieve', message)
+        self.assertEqual(message.count(' ms: SELECT'), 1)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_metrics_can_be_disabled(self):
+        self.client.get('/onboarding/employees/')
+        self.assertNotIn('EmployeeViewSet.list', registry.render())
+
+
+class EmployeeExportTest(EmployeeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for index in range(3):
+            self.create_employee(index)
+
+    def test_csv_export(self):
+        response = self.client.get('/onboarding/employees/export/', {'format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'employee_number,first_name,middle_name,last_name,job,department,email')
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].endswith(',John,James,Doe,Engineer,ENG,employee0@email.com'))
+
+    def test_jsonl_export(self):
+        response = self.client.get('/onboarding/employees/export/', {'format': 'jsonl'})
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['email'] for row in rows], [f'employee{index}@email.com' for index in range(3)])
+
+    def test_export_requires_hr_or_admin(self):
+        self.client.force_authenticate(user=User.objects.create_user(email='user@email.com', is_active=True))
+        response = self.client.get('/onboarding/employees/export/', {'format': 'jsonl'})
+        self.assertEqual(response.status_code, 403)
+
+
+class EmployeeFilterTest(EmployeeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.sales = Department.objects.create(name='Sales', code='SAL')
+        self.create_employee(0, first_name='ada', last_name='lovelace', employment_date=date(2020, 5, 1))
+        self.create_employee(1, first_name='alan', last_name='turing', department=self.sales)
+        self.create_employee(2, first_name='grace', last_name='hopper', is_active=False)
+
+    def list_first_names(self, **params):
+        response = self.client.get('/onboarding/employees/', params)
+        self.assertEqual(response.status_code, 200)
+        return [employee['first_name'] for employee in response.data['results']]
+
+    def test_filters(self):
+        self.assertEqual(self.list_first_names(department='SAL'), ['Alan'])
+        self.assertEqual(self.list_first_names(department='ENG', is_active='true'), ['Ada'])
+        self.assertEqual(self.list_first_names(is_active='false'), ['Grace'])
+        self.assertEqual(self.list_first_names(employment_date_before='2021-01-01'), ['Ada'])
+        self.assertEqual(self.list_first_names(job='Engineer', is_leave='false'), ['Ada', 'Alan', 'Grace'])
+
+    def test_search(self):
+        self.assertEqual(self.list_first_names(search='a'), ['Ada', 'Alan'])
+        self.assertEqual(self.list_first_names(search='TUR'), ['Alan'])
+        self.assertEqual(self.list_first_names(search='grace hop'), ['Grace'])
+        number = Employee.objects.get(first_name='Ada').employee_number
+        self.assertEqual(self.list_first_names(search=number.lower()), ['Ada'])
+
+    def test_ordering(self):
+        self.assertEqual(self.list_first_names(ordering='-last_name'), ['Alan', 'Ada', 'Grace'])
+
+    def test_paging_across_ties(self):
+        for index in range(3, 9):
+            self.create_employee(index, employment_date=date(2020, 5, 1))
+        expected = list(
+            Employee.objects.order_by('-employment_date', '-pk').values_list('employee_number', flat=True)
+        )
+        numbers = []
+        url, params = '/onboarding/employees/', {'ordering': '-employment_date', 'page_size': 2}
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, params)
+            page_query = next(query['sql'] for query in context.captured_queries if 'ORDER BY' in query['sql'])
+            self.assertIn('"onboarding_employee"."id" DESC', page_query)
+            numbers += [employee['employee_number'] for employee in response.data['results']]
+            url, params = response.data['next'], None
+        self.assertEqual(numbers, expected)
+
+    def test_invalid_parameter(self):
+        response = self.client.get('/onboarding/employees/', {'employment_date_after': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CachedResponseTest(EmployeeTestMixin, TestCase):
+    def test_cache_hit_skips_database(self):
+        response = self.client.get('/onboarding/departments/')
+        self.assertEqual(response.status_code, 200)
+        with CaptureQueriesContext(connection) as context:
+            cached = self.client.get('/onboarding/departments/')
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertEqual(cached.json(), response.json())
+        self.assertEqual(cached['ETag'], response['ETag'])
+
+    def test_not_modified(self):
+        etag = self.client.get('/onboarding/jobs/Engineer/')['ETag']
+        response = self.client.get('/onboarding/jobs/Engineer/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_write_invalidates(self):
+        etag = self.client.get('/onboarding/departments/')['ETag']
+        self.client.post('/onboarding/departments/', {'name': 'Finance', 'code': 'FIN', 'head': None}, format='json')
+        response = self.client.get('/onboarding/departments/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('FIN', [department['code'] for department in response.data['results']])
+
+    def test_employee_write_invalidates_departments(self):
+        # Departments render their head's employee number
+        etag = self.client.get('/onboarding/departments/ENG/')['ETag']
+        self.create_employee(1)
+        response = self.client.get('/onboarding/departments/ENG/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(LOCAL_CACHE=True, RESPONSE_CACHE_TIMEOUT=60)
+    def test_local_cache_expires_versions(self):
+        # Writes of other processes never bump the versions of a local cache
+        etag = self.client.get('/onboarding/departments/ENG/')['ETag']
+        later = time.time() + 61
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            response = self.client.get('/onboarding/departments/ENG/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+class EmployeeConditionalGetTest(EmployeeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee = self.create_employee(1)
+        self.url = f'/onboarding/employees/{self.employee.employee_number}/'
+
+    def test_not_modified(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        # The validators come from the loaded record
+        self.assertEqual(len(context.captured_queries), 2)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Later polls read the group names from the cache
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_if_modified_since(self):
+        # Deactivating the user leaves every updated_at unchanged
+        response = self.client.get(self.url)
+        self.assertNotIn('Last-Modified', response)
+        User.objects.filter(pk=self.employee.user_id).update(is_active=False)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, 200)
+
+    def test_employee_update(self):
+        etag = self.client.get(self.url)['ETag']
+        self.employee.address = '2 Main Street'
+        self.employee.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['address'], '2 Main Street')
+
+    def test_user_change(self):
+        etag = self.client.get(self.url)['ETag']
+        self.employee.user.groups.add(self.hr_group)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_signed_urls_expire(self):
+        storage = CachedS3Storage(bucket_name='test', access_key='test', secret_key='test', region_name='us-east-1')
+        with mock.patch.object(Employee._meta.get_field('profile_picture'), 'storage', storage):
+            etag = self.client.get(self.url)['ETag']
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            # Past the period, the URLs served with the ETag may have expired
+            later = time.time() + storage.querystring_expire // 2
+            with mock.patch('onboarding.caching.time.time', return_value=later):
+                response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_own_employee(self):
+        self.client.force_authenticate(user=self.employee.user)
+        response = self.client.get('/onboarding/employees/employee/')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/onboarding/employees/employee/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_employee(self):
+        response = self.client.get('/onboarding/employees/employee/')
+        self.assertEqual(response.status_code, 404)
+
+
+class EmployeeIndexTest(TestCase):
+    """Checks the query plans of employee filters use the Employee indexes."""
+
+    def assertUsesIndex(self, queryset, index_name):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Small test tables are otherwise read with sequential scans.
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_department_filter(self):
+        self.assertUsesIndex(
+            Employee.objects.filter(department_id=1, is_active=True), 'employee_department_active_idx'
+        )
+
+    def test_employment_date_range(self):
+        self.assertUsesIndex(
+            Employee.objects.filter(employment_date__gte=date(2020, 1, 1), employment_date__lte=date(2021, 1, 1)),
+            'employee_employment_date_idx',
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'Prefix index operator classes are PostgreSQL-only.')
+    def test_name_search(self):
+        self.assertUsesIndex(Employee.objects.filter(last_name__startswith='Tur'), 'employee_last_name_prefix_idx')
+
+    @skipUnless(connection.vendor == 'postgresql', 'Prefix index operator classes are PostgreSQL-only.')
+    def test_department_subtree(self):
+        department = Department(path='/1/')
+        self.assertUsesIndex(Department.objects.subtree(department), 'department_path_prefix_idx')
+
+
+class OrgChartTest(EmployeeTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.platform = Department.objects.create(name='Platform', code='PLT', parent=self.department)
+        self.data = Department.objects.create(name='Data', code='DATA', parent=self.platform)
+        self.finance = Department.objects.create(name='Finance', code='FIN')
+        self.head = self.create_employee(1, department=self.platform)
+        self.platform.head = self.head
+        self.platform.save()
+        self.create_employee(2, department=self.data)
+        self.create_employee(3, department=self.data)
+        self.create_employee(4, department=self.finance, is_active=False)
+
+    def test_paths(self):
+        self.data.refresh_from_db()
+        self.assertEqual(self.data.path, f'/{self.department.pk}/{self.platform.pk}/{self.data.pk}/')
+        self.assertEqual(
+            set(Department.objects.subtree(self.platform).values_list('code', flat=True)), {'PLT', 'DATA'}
+        )
+
+    def test_move_updates_subtree(self):
+        response = self.client.patch('/onboarding/departments/PLT/', {'parent': 'FIN'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.data.refresh_from_db()
+        self.assertEqual(self.data.path, f'/{self.finance.pk}/{self.platform.pk}/{self.data.pk}/')
+        self.assertEqual(
+            set(Department.objects.subtree(self.department).values_list('code', flat=True)), {'ENG'}
+        )
+
+    def test_paths_stored_before_the_column_are_rebuilt(self):
+        expected = dict(Department.objects.values_list('code', 'path'))
+        Department.objects.update(path='')
+        platform = Department.objects.get(code='PLT')
+        self.assertEqual(set(Department.objects.subtree(platform).values_list('code', flat=True)), {'PLT', 'DATA'})
+        self.assertEqual(dict(Department.objects.values_list('code', 'path')), expected)
+
+        Department.objects.update(path='')
+        child = Department.objects.create(name='Payroll', code='PAY', parent=self.finance)
+        self.assertEqual(child.path, f'/{self.finance.pk}/{child.pk}/')
+        Department.objects.update(path='')
+        response = self.client.patch('/onboarding/departments/ENG/', {'parent': 'DATA'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        Department.objects.update(path='')
+        response = self.client.get('/onboarding/departments/org-chart/')
+        self.assertEqual(response.data[0]['children'][0]['code'], 'PLT')
+
+        stdout = StringIO()
+        call_command('rebuilddepartmentpaths', stdout=stdout)
+        self.assertIn('5 department paths rebuilt.', stdout.getvalue())
+
+    def test_cycles_are_rejected(self):
+        for parent in ('ENG', 'DATA'):
+            response = self.client.patch('/onboarding/departments/ENG/', {'parent': parent}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('parent', response.data)
+
+    def test_org_chart(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/onboarding/departments/org-chart/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([node['code'] for node in response.data], ['ENG', 'FIN'])
+        engineering, finance = response.data
+        self.assertEqual((engineering['members'], engineering['total_members']), (0, 3))
+        self.assertEqual((finance['members'], finance['total_members']), (0, 0))
+        platform = engineering['children'][0]
+        self.assertEqual(platform['head']['employee_number'], self.head.employee_number)
+        self.assertEqual((platform['members'], platform['total_members']), (1, 3))
+        self.assertEqual(platform['children'][0]['code'], 'DATA')
+
+    def test_org_chart_subtree(self):
+        response = self.client.get('/onboarding/departments/org-chart/', {'root': 'PLT'})
+        self.assertEqual([node['code'] for node in response.data], ['PLT'])
+        self.assertEqual(response.data[0]['total_members'], 3)
+        response = self.client.get('/onboarding/departments/org-chart/', {'root': 'NONE'})
+        self.assertEqual(response.status_code, 404)
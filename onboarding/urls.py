@@ -1,6 +1,8 @@
-# from django.urls import path
+from django.conf import settings
+from django.urls import path
 from rest_framework import routers
-from .views import EmployeeViewSet, JobViewSet, DepartmentViewSet, EmployeeTypeViewSet
+from . import async_views
+from .views import EmployeeViewSet, JobViewSet, DepartmentViewSet, EmployeeTypeViewSet, InvitationViewSet, AnalyticsViewSet
 
 
 router = routers.SimpleRouter()
@@ -8,5 +10,11 @@ router.register(r'employees', EmployeeViewSet)
 router.register(r'jobs', JobViewSet)
 router.register(r'departments', DepartmentViewSet)
 router.register(r'employee_types', EmployeeTypeViewSet)
+router.register(r'invitations', InvitationViewSet)
+router.register(r'analytics', AnalyticsViewSet, basename='analytics')
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = router.urls
+
+if settings.ASYNC_VIEWS:
+    # Ahead of the router's route to EmployeeViewSet.invite
+    urlpatterns.insert(0, path('employees/invite/', async_views.invite, name='employee-invite'))
\ No newline at end of file
@@ -1,31 +1,91 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from rest_framework import viewsets, status
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from rest_framework import viewsets, status, filters
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework.decorators import action
-from .models import Employee, Job, Department, EmployeeType
-from .serializers import EmployeeSerializer, CreateEmployeeSerializer, JobSerializer, DepartmentSerializer, EmployeeTypeSerializer, SendInviteSerializer
+from rest_framework.exceptions import NotFound
+from rest_framework.parsers import MultiPartParser
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from .models import Employee, Job, Department, EmployeeType, Invitation, parse_employee_number
+from .serializers import EmployeeSerializer, CreateEmployeeSerializer, EmployeeImportSerializer, BulkReassignSerializer, BulkDeactivateSerializer, ProfilePictureUploadSerializer, ProfilePictureFileSerializer, ProfilePictureConfirmSerializer, JobSerializer, DepartmentSerializer, EmployeeTypeSerializer, SendInviteSerializer, InvitationSerializer, HeadcountSerializer, EmployeeValuesSerializer, JobValuesSerializer, DepartmentValuesSerializer, EmployeeTypeValuesSerializer, OrgChartSerializer
 from .signals import send_invite_mail, deactivate_employee_user
 from accounts.permissions import IsHRorAdmin, IsEmployeeorAdmin
+from accounts.throttling import InviteRateThrottle
+from accounts.values import ValuesListMixin
+from core.metrics import MetricsMixin
+from .analytics import get_headcount
+from .bulk import import_employees, reassign_employees, deactivate_employees
+from .caching import CachedResponseMixin, get_employee_etag, get_instance_etag
+from .filters import EmployeeFilter
+from .orgchart import get_org_chart
+from .pictures import create_upload, save_upload, confirm_upload, get_storage
+from .renderers import CSVRenderer, JSONLinesRenderer
 
 
 
-class EmployeeViewSet(viewsets.ModelViewSet):
+class EmployeeViewSet(MetricsMixin, ValuesListMixin, viewsets.ModelViewSet):
     permission_classes = [IsHRorAdmin]
     queryset = Employee.objects.all()
     serializer_class = EmployeeSerializer
+    values_serializer_class = EmployeeValuesSerializer
     lookup_field = 'employee_number'
+    filter_backends = [EmployeeFilter, filters.OrderingFilter]
+    ordering_fields = ['employee_number', 'employment_date', 'first_name', 'last_name']
+    ordering = 'employee_number'
+    # Export columns and the values() lookups they are read from
+    export_fields = {
+        'employee_number': 'employee_number',
+        'first_name': 'first_name',
+        'middle_name': 'middle_name',
+        'last_name': 'last_name',
+        'job': 'job__title',
+        'department': 'department__code',
+        'email': 'user__email',
+    }
 
     def get_permissions(self):
         if self.action == 'employee':
             self.permission_classes = [IsEmployeeorAdmin]
+        elif self.action in ('picture', 'picture_upload', 'picture_confirm'):
+            # Employees manage their own profile picture
+            self.permission_classes = [IsHRorAdmin | IsEmployeeorAdmin]
         return super().get_permissions()
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return queryset.for_serializer(self.get_serializer_class())
+
+    def get_object(self):
+        # Resolves the employee number to its primary key, see
+        # EmployeeQuerySet.get_by_numbers
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            obj = queryset.get_by_number(self.kwargs[self.lookup_field])
+        except Employee.DoesNotExist:
+            raise Http404("No Employee matches the given query.")
+        self.check_object_permissions(self.request, obj)
+        return obj
 
     def get_serializer_class(self):
         if self.action == 'create':
             return CreateEmployeeSerializer
         elif self.action == 'invite':
             return SendInviteSerializer
+        elif self.action == 'bulk':
+            return EmployeeImportSerializer
+        elif self.action == 'reassign':
+            return BulkReassignSerializer
+        elif self.action == 'deactivate':
+            return BulkDeactivateSerializer
+        elif self.action == 'picture':
+            return ProfilePictureUploadSerializer
+        elif self.action == 'picture_upload':
+            return ProfilePictureFileSerializer
+        elif self.action == 'picture_confirm':
+            return ProfilePictureConfirmSerializer
             
         return self.serializer_class
 
@@ -45,19 +105,43 @@ class EmployeeViewSet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+    def conditional_response(self, get_instance, **lookup):
+        """
+        Serializes the employee returned by `get_instance` with an ETag header.
+        Conditional requests are checked against the employee matching
+        `lookup` first, and answered with 304 Not Modified without loading
+        the record when it has not changed.
+        """
+        request = self.request
+        if 'HTTP_IF_NONE_MATCH' in request.META:
+            etag = get_employee_etag(**lookup)
+            if etag is not None:
+                not_modified = get_conditional_response(request, etag=etag)
+                if not_modified is not None:
+                    return not_modified
+
+        instance = get_instance()
+        response = Response(self.get_serializer(instance).data)
+        response['ETag'] = get_instance_etag(instance)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        number = self.kwargs[self.lookup_field]
+        return self.conditional_response(self.get_object, pk=parse_employee_number(number), employee_number=number)
+
     @action(detail=False, methods=["get"])
     def employee(self, request, *args, **kwargs):
         """Returns the employee record of the request user"""
-        user = request.user
+        return self.conditional_response(self.get_employee, user_id=request.user.pk)
+
+    def get_employee(self):
         try:
-        	employee = Employee.objects.get(user=user)
+            return self.get_queryset().get(user_id=self.request.user.pk)
         except Employee.DoesNotExist:
-            return Response({"detail": "User has no employee attached with it"}, status=status.HTTP_404_NOT_FOUND)
-        serializer = EmployeeSerializer(employee)
-        return Response(serializer.data)
+            raise NotFound("User has no employee attached with it")
     
 
-    @action(detail=False, methods=["post"])
+    @action(detail=False, methods=["post"], throttle_classes=[InviteRateThrottle])
     def invite(self, request, *args, **kwargs):
         """Send an invitation email to the employee"""
         serializer = self.get_serializer(data=request.data)
@@ -65,41 +149,191 @@ class EmployeeViewSet(viewsets.ModelViewSet):
         user = serializer.get_user()
 
         if not user.is_active:
-            response = send_invite_mail.send(sender=self.__class__, user=user, request=self.request)
-            if response:
-                return Response(data={'message':'Invitation successfully sent'}, status=status.HTTP_200_OK)
-            else:
-                return Response(data={'message':'Failed to send invitation'}, status=status.HTTP_400_BAD_REQUEST)
+            [(receiver, invitation)] = send_invite_mail.send(sender=self.__class__, user=user, request=self.request)
+            return Response(
+                data={'message':'Invitation queued for delivery', 'invitation': invitation.pk},
+                status=status.HTTP_202_ACCEPTED
+            )
         else:
             return Response(data={'message':'User is already active'}, status=status.HTTP_400_BAD_REQUEST)
 
 
+    @action(detail=False, methods=["post"], parser_classes=[MultiPartParser])
+    def bulk(self, request, *args, **kwargs):
+        """Creates employees from an uploaded CSV or JSON Lines file"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data['file']
+        send_invite = serializer.validated_data['send_invite']
+
+        report = import_employees(upload, request=request if send_invite else None)
+        return Response(data=report, status=status.HTTP_200_OK)
+
+
+    @action(detail=False, methods=["post"])
+    def reassign(self, request, *args, **kwargs):
+        """Moves the listed employees to another job, department and/or employee type"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        relations = dict(serializer.validated_data)
+        employees = relations.pop('employee_numbers')
+
+        updated = reassign_employees(employees, request.user, **relations)
+        return Response(data={'updated': updated}, status=status.HTTP_200_OK)
+
+
+    @action(detail=False, methods=["post"])
+    def deactivate(self, request, *args, **kwargs):
+        """Deactivates the listed employees and their users"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        updated = deactivate_employees(
+            serializer.validated_data['employee_numbers'],
+            request.user,
+            serializer.validated_data['resignation_date'],
+        )
+        return Response(data={'updated': updated}, status=status.HTTP_200_OK)
+
+
+    @action(detail=True, methods=["post"])
+    def picture(self, request, *args, **kwargs):
+        """Reserves an upload of a new profile picture, to be posted with its fields to the returned url"""
+        employee = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        upload = create_upload(employee, **serializer.validated_data)
+        if upload['url'] is None:
+            # The storage cannot presign, the file goes through the API
+            upload['url'] = request.build_absolute_uri(
+                reverse('employee-picture-upload', kwargs={self.lookup_field: employee.employee_number})
+            )
+            upload['fields'] = {'token': upload['token']}
+        return Response(data=upload, status=status.HTTP_201_CREATED)
+
+
+    @action(detail=True, methods=["post"], url_path='picture/upload', parser_classes=[MultiPartParser])
+    def picture_upload(self, request, *args, **kwargs):
+        """Stores a profile picture reserved with the picture action, for storages that cannot presign"""
+        employee = self.get_object()
+        serializer = self.get_serializer(employee, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        key, content_type = serializer.validated_data['token']
+
+        save_upload(key, serializer.validated_data['file'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+    @action(detail=True, methods=["post"], url_path='picture/confirm')
+    def picture_confirm(self, request, *args, **kwargs):
+        """Sets an uploaded file as the employee's profile picture"""
+        employee = self.get_object()
+        serializer = self.get_serializer(employee, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        key, content_type = serializer.validated_data['token']
+
+        storage = get_storage()
+        if not storage.exists(key):
+            return Response(data={'token': ['The file has not been uploaded.']}, status=status.HTTP_400_BAD_REQUEST)
+        confirm_upload(employee, key)
+        return Response(data=EmployeeSerializer(employee, context=self.get_serializer_context()).data)
+
 
-class JobViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=["get"], renderer_classes=[CSVRenderer, JSONLinesRenderer])
+    def export(self, request, *args, **kwargs):
+        """Streams the employee roster as CSV (?format=csv) or JSON Lines (?format=jsonl)"""
+        queryset = self.filter_queryset(Employee.objects.all())
+        rows = queryset.values_list(*self.export_fields.values()).iterator(
+            chunk_size=settings.EMPLOYEE_EXPORT_CHUNK_SIZE
+        )
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(list(self.export_fields), rows),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
+        )
+        response['Content-Disposition'] = f'attachment; filename="employees.{renderer.format}"'
+        return response
+
+
+
+class JobViewSet(MetricsMixin, CachedResponseMixin, ValuesListMixin, viewsets.ModelViewSet):
     permission_classes = [IsHRorAdmin]
     queryset = Job.objects.all()
     serializer_class = JobSerializer
+    values_serializer_class = JobValuesSerializer
     lookup_field = 'title'
+    ordering = 'title'
 
     def perform_destroy(self, instance):
-        instance.save(is_active=False)
+        instance.is_active = False
+        instance.save()
 
 
-class DepartmentViewSet(viewsets.ModelViewSet):
+class DepartmentViewSet(MetricsMixin, CachedResponseMixin, ValuesListMixin, viewsets.ModelViewSet):
     permission_classes = [IsHRorAdmin]
     queryset = Department.objects.all()
     serializer_class = DepartmentSerializer
+    values_serializer_class = DepartmentValuesSerializer
     lookup_field = 'code'
+    ordering = 'code'
+    # Department heads are rendered by their employee number
+    cache_models = [Department, Employee]
 
     def perform_destroy(self, instance):
-        instance.save(is_active=False)
+        instance.is_active = False
+        instance.save()
+
+    @extend_schema(
+        parameters=[OpenApiParameter('root', str, description="Code of the department to chart the subtree of.")],
+        responses=OrgChartSerializer(many=True),
+    )
+    @action(detail=False, methods=["get"], url_path='org-chart')
+    def org_chart(self, request, *args, **kwargs):
+        """Returns the department tree with the heads and member counts of each department"""
+        return self.cached_response(request, self.get_org_chart)
 
+    def get_org_chart(self, request):
+        root = None
+        code = request.query_params.get('root')
+        if code:
+            try:
+                root = Department.objects.get(code=code)
+            except Department.DoesNotExist:
+                raise NotFound(f"Department {code} does not exist.")
+        return Response(get_org_chart(root))
 
-class EmployeeTypeViewSet(viewsets.ModelViewSet):
+
+class EmployeeTypeViewSet(MetricsMixin, CachedResponseMixin, ValuesListMixin, viewsets.ModelViewSet):
     permission_classes = [IsHRorAdmin]
     queryset = EmployeeType.objects.all()
     serializer_class = EmployeeTypeSerializer
+    values_serializer_class = EmployeeTypeValuesSerializer
     lookup_field = 'code'
+    ordering = 'code'
 
     def perform_destroy(self, instance):
-        instance.save(is_active=False)
+        instance.is_active = False
+        instance.save()
+
+
+class InvitationViewSet(MetricsMixin, viewsets.ReadOnlyModelViewSet):
+    """Reports the delivery status of queued invitations."""
+    permission_classes = [IsHRorAdmin]
+    queryset = Invitation.objects.select_related('user')
+    serializer_class = InvitationSerializer
+    ordering = '-id'
+
+
+class AnalyticsViewSet(MetricsMixin, viewsets.ViewSet):
+    permission_classes = [IsHRorAdmin]
+
+    @extend_schema(
+        parameters=[OpenApiParameter('live', bool, description="Count from the employees table instead of the summaries.")],
+        responses=HeadcountSerializer,
+    )
+    def list(self, request, *args, **kwargs):
+        """Returns the headcount and its distribution, read from the headcount summaries"""
+        live = request.query_params.get('live', '').lower() in ('1', 'true')
+        serializer = HeadcountSerializer(get_headcount(live=live))
+        return Response(serializer.data)